@@ -0,0 +1,318 @@
+"""
+批量身份组操作的离线基准测试
+
+在进程内的 Discord 替身 (benchmarks.fakes) 上运行批量分配、过期替换、跨服务器同步、
+用户视图重建以及 role_members 的批量操作，输出 JSON 格式的结果以便在版本之间比较:
+
+    python -m benchmarks.bulk_ops --sizes 1000,10000 --output bench.json
+
+所有网络延迟、速率限制等待和代码中的 asyncio.sleep 都按 --time-scale 缩放后真实等待，
+结果中的 api_wait_seconds / sleep_seconds 为缩放前的模拟秒数；
+峰值内存在另一次不计时的运行中测量 (tracemalloc 会显著拖慢被测代码)
+"""
+import os
+import time
+from array import array
+import asyncio
+import logging
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List
+from unittest import mock
+
+from benchmarks.fakes import FakeDiscord, DEFAULT_LATENCY_SECONDS, snowflake
+from benchmarks.results import write_report
+from cogs.tasks.resource_sampler import percentile
+
+logger = logging.getLogger('discord_bot.benchmarks.bulk_ops')
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_TIME_SCALE = 0.001
+# 事件循环延迟探针的唤醒间隔 (秒，不缩放)
+LAG_PROBE_INTERVAL_SECONDS = 0.01
+# 批量分配与过期替换中不在服务器内的用户比例
+MISSING_USER_RATIO = 0.01
+
+Scenario = Callable[[FakeDiscord, int, contextlib.ExitStack], Callable[[], Awaitable]]
+
+
+def _split_missing(user_ids: List[int]) -> int:
+    return max(1, int(len(user_ids) * MISSING_USER_RATIO))
+
+
+def prepare_assign_roles(fake: FakeDiscord, size: int, stack: contextlib.ExitStack):
+    from cogs.mod import role_assigner_logic
+    user_ids = [snowflake() for _ in range(size)]
+    guild = fake.add_guild("基准服务器", user_ids[_split_missing(user_ids):])
+    role = guild.add_role("活动身份组")
+    stack.enter_context(mock.patch.object(role_assigner_logic, 'GUILD_IDS', [guild.id]))
+    interaction = fake.interaction(guild)
+    return lambda: role_assigner_logic.handle_assign_roles(interaction, role_id_str=str(role.id), user_ids_str=" ".join(map(str, user_ids)))
+
+
+def prepare_role_expiry(fake: FakeDiscord, size: int, stack: contextlib.ExitStack):
+    import config
+    from cogs.mod.role_assigner_logic import _save_assignment_log
+    from cogs.tasks.role_expiry import RoleExpiryTask
+    user_ids = [snowflake() for _ in range(size)]
+    guild = fake.add_guild("基准服务器", user_ids[_split_missing(user_ids):])
+    old_role = guild.add_role("活动身份组")
+    replacement_role = guild.add_role("纪念身份组")
+    guild.grant(old_role, user_ids[_split_missing(user_ids):])
+    expired_at = int(time.time()) - 91 * 24 * 60 * 60
+    _save_assignment_log([["1000", {
+        "operation_id": "1000",
+        "fade": False,
+        "outtime": 90,
+        "timestamp": expired_at,
+        "data": [{
+            "guild_id": guild.id,
+            "guild_name": guild.name,
+            "role_ids": [old_role.id],
+            "role_names": [old_role.name],
+            "timestamp": datetime.fromtimestamp(expired_at).isoformat(),
+            "assigned_user_ids": user_ids,
+            "operation_id": "1000",
+        }],
+    }]])
+    stack.enter_context(mock.patch.object(config, 'REPLACEMENT_ROLES', {guild.id: replacement_role.id}))
+    # __init__ 会启动定时任务，这里只需要一次检查
+    task = RoleExpiryTask.__new__(RoleExpiryTask)
+    task.bot = fake.client
+    return task._check_expired_roles
+
+
+def prepare_sync_role(fake: FakeDiscord, size: int, stack: contextlib.ExitStack):
+    from cogs.mod.role_sync_logic import handle_sync_role
+    user_ids = [snowflake() for _ in range(size)]
+    local = fake.add_guild("本地服务器", user_ids)
+    remote = fake.add_guild("远端服务器", user_ids)
+    local_role = local.add_role("本地身份组")
+    remote_role = remote.add_role("远端身份组")
+    # 两端各有四分之一的成员需要同步
+    quarter = size // 4
+    local.grant(local_role, user_ids[:size - quarter])
+    remote.grant(remote_role, user_ids[quarter:])
+    interaction = fake.interaction(local)
+    return lambda: handle_sync_role(interaction, str(local_role.id), str(remote.id), str(remote_role.id), "bidirectional")
+
+
+def prepare_format_role_assignments(fake: FakeDiscord, size: int, stack: contextlib.ExitStack):
+    from cogs.tasks.user_role_formatter import format_role_assignments
+    user_ids = [snowflake() for _ in range(size)]
+    guild_ids = [snowflake() for _ in range(3)]
+    # 每个操作 1000 人，跨 3 个服务器，相邻操作有一半成员重叠
+    log = []
+    for index, start in enumerate(range(0, size, 500)):
+        operation_id = str(1000 + index)
+        assigned = user_ids[start:start + 1000]
+        log.append([operation_id, {
+            "operation_id": operation_id,
+            "fade": False,
+            "outtime": 90,
+            "timestamp": int(time.time()),
+            "data": [
+                {"guild_id": guild_id, "role_ids": [snowflake()], "assigned_user_ids": assigned, "operation_id": operation_id}
+                for guild_id in guild_ids
+            ],
+        }])
+
+    async def run():
+        format_role_assignments(log)
+    return run
+
+
+def _prepare_role_members(fake: FakeDiscord, size: int):
+    from cogs.mod.role_members import RoleActionSelect, RoleActionView
+    user_ids = [snowflake() for _ in range(size)]
+    guild = fake.add_guild("基准服务器", user_ids)
+    role = guild.add_role("活动身份组")
+    guild.grant(role, user_ids)
+    view = RoleActionView(role.id, array('Q', (member.id for member in role.members)))
+    select = next(item for item in view.children if isinstance(item, RoleActionSelect))
+    return guild, role, select
+
+
+def prepare_role_members_export(fake: FakeDiscord, size: int, stack: contextlib.ExitStack):
+    guild, role, select = _prepare_role_members(fake, size)
+    interaction = fake.interaction(guild)
+    return lambda: select.handle_export_action(interaction, select.resolve_members(guild), "csv", False)
+
+
+def prepare_role_members_remove(fake: FakeDiscord, size: int, stack: contextlib.ExitStack):
+    guild, role, select = _prepare_role_members(fake, size)
+    interaction = fake.interaction(guild)
+    return lambda: select.handle_remove_action(interaction, role, select.resolve_members(guild))
+
+
+def prepare_role_members_replace(fake: FakeDiscord, size: int, stack: contextlib.ExitStack):
+    guild, role, select = _prepare_role_members(fake, size)
+    new_role = guild.add_role("新身份组")
+    fake.modal_answers["新身份组ID"] = str(new_role.id)
+    interaction = fake.interaction(guild)
+    return lambda: select.handle_replace_action(interaction, role, select.resolve_members(guild))
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "assign_roles": prepare_assign_roles,
+    "role_expiry": prepare_role_expiry,
+    "sync_role": prepare_sync_role,
+    "format_role_assignments": prepare_format_role_assignments,
+    "role_members_export": prepare_role_members_export,
+    "role_members_remove": prepare_role_members_remove,
+    "role_members_replace": prepare_role_members_replace,
+}
+
+
+class LagProbe:
+    """以固定间隔休眠，记录每次实际唤醒比预期晚了多久"""
+
+    def __init__(self, sleep):
+        self._sleep = sleep
+        self.samples: List[float] = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LAG_PROBE_INTERVAL_SECONDS
+            await self._sleep(LAG_PROBE_INTERVAL_SECONDS)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+
+@contextlib.contextmanager
+def _respect_log_level():
+    """
+    部分被测模块在导入时把自己的日志级别设为 DEBUG (例如 role_expiry)，会绕过 --log-level，
+    逐用户的调试日志会显著拖慢计时；场景期间把这些日志记录器提高到根日志级别
+    """
+    root_level = logging.getLogger().level
+    overridden = {}
+    for name, item in logging.Logger.manager.loggerDict.items():
+        if isinstance(item, logging.Logger) and item.level and item.level < root_level and not name.startswith(logger.name):
+            overridden[item] = item.level
+            item.setLevel(root_level)
+    try:
+        yield
+    finally:
+        for item, level in overridden.items():
+            item.setLevel(level)
+
+
+async def _run_once(name: str, size: int, latency: float, time_scale: float, trace_memory: bool) -> dict:
+    """
+    在临时工作目录中执行一次场景
+    trace_memory 为 True 时只测量峰值内存 (tracemalloc 会显著拖慢被测代码，计时结果不可用)
+    """
+    fake = FakeDiscord(latency=latency, time_scale=time_scale)
+    real_sleep = asyncio.sleep
+    slept = [0.0]
+
+    async def scaled_sleep(delay, result=None):
+        await real_sleep(delay * time_scale)
+        slept[0] += delay
+        return result
+
+    with contextlib.ExitStack() as stack:
+        start_operation = SCENARIOS[name](fake, size, stack)
+        stack.enter_context(_respect_log_level())
+        stack.enter_context(mock.patch.object(asyncio, 'sleep', scaled_sleep))
+        probe = LagProbe(real_sleep)
+        probe_task = asyncio.create_task(probe.run())
+        await real_sleep(0)
+
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            memory_before = tracemalloc.get_traced_memory()[0]
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            await start_operation()
+            await fake.drain()
+            wall_seconds = time.perf_counter() - wall_start
+            cpu_seconds = time.process_time() - cpu_start
+            peak_memory = tracemalloc.get_traced_memory()[1] - memory_before
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+        # 同步执行的场景期间探针无法唤醒，让它补记最后一次延迟
+        await real_sleep(LAG_PROBE_INTERVAL_SECONDS)
+        probe_task.cancel()
+
+    lag_ms = [lag * 1000 for lag in probe.samples]
+    return {
+        "scenario": name,
+        "users": size,
+        "wall_seconds": round(wall_seconds, 4),
+        "cpu_seconds": round(cpu_seconds, 4),
+        "api_calls": fake.http.total_calls,
+        "api_calls_by_route": dict(fake.http.calls.most_common()),
+        "rate_limited": sum(count for route, count in fake.http.rate_limited.items() if route != 'global'),
+        "global_rate_limited": fake.http.rate_limited['global'],
+        "api_wait_seconds": round(fake.http.wait_seconds, 2),
+        "sleep_seconds": round(slept[0], 2),
+        "peak_memory_bytes": peak_memory,
+        "loop_lag_max_ms": round(max(lag_ms, default=0.0), 3),
+        "loop_lag_p95_ms": round(percentile(lag_ms, 95), 3),
+    }
+
+
+async def _run_in_workdir(*args) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            return await _run_once(*args)
+        finally:
+            os.chdir(cwd)
+
+
+async def run_scenario(name: str, size: int, latency: float, time_scale: float) -> dict:
+    """
+    运行一个场景，返回一条结果记录
+    计时与峰值内存分两次在各自的临时工作目录中测量，计时那次不启用 tracemalloc
+    """
+    result = await _run_in_workdir(name, size, latency, time_scale, False)
+    memory = await _run_in_workdir(name, size, latency, time_scale, True)
+    result["peak_memory_bytes"] = memory["peak_memory_bytes"]
+    return result
+
+
+async def run_all(scenarios: List[str], sizes: List[int], latency: float, time_scale: float) -> List[dict]:
+    results = []
+    for size in sizes:
+        for name in scenarios:
+            logger.info(f"运行 {name} ({size} 名用户)...")
+            result = await run_scenario(name, size, latency, time_scale)
+            logger.info(f"{name} ({size}): {result['wall_seconds']} 秒, {result['api_calls']} 次请求, 峰值内存 {result['peak_memory_bytes'] / 1024 / 1024:.1f} MB")
+            results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量身份组操作的离线基准测试")
+    parser.add_argument('--sizes', default=",".join(map(str, DEFAULT_SIZES)), help="逗号分隔的用户数量")
+    parser.add_argument('--scenarios', default=",".join(SCENARIOS), help=f"逗号分隔的场景，可选: {', '.join(SCENARIOS)}")
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY_SECONDS, help="模拟的 REST 往返延迟 (秒)")
+    parser.add_argument('--time-scale', type=float, default=DEFAULT_TIME_SCALE, help="模拟等待的缩放比例")
+    parser.add_argument('--output', help="结果写入的文件，默认输出到标准输出")
+    parser.add_argument('--log-level', default='WARNING', help="被测代码的日志级别")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+    logger.setLevel(logging.INFO)
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知的场景: {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    results = asyncio.run(run_all(scenarios, sizes, args.latency, args.time_scale))
+
+    write_report("bulk_ops", {"latency_seconds": args.latency, "time_scale": args.time_scale}, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
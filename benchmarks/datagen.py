@@ -0,0 +1,282 @@
+"""
+生成规模可配置的合成 data/ 数据集
+
+生成的内容与机器人运行时写入的格式一致 (由各模块自己的保存函数写入):
+
+    python -m benchmarks.datagen --output-dir /tmp/bot --operations 500 --users-per-operation 2000
+
+会在 /tmp/bot/data/ 下写出全部数据文件，可直接作为机器人的工作目录使用
+"""
+import os
+import json
+import random
+import logging
+import argparse
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger('discord_bot.benchmarks.datagen')
+
+# 雪花ID时间戳的取值范围 (相对 Discord 纪元 2015-01-01 的毫秒数，约 2020 年至 2026 年)
+SNOWFLAKE_MS_RANGE = (160_000_000_000, 360_000_000_000)
+# 每个服务器可供分配的身份组数量
+ROLES_PER_GUILD = 50
+# 平均每个用户出现在多少个操作中 (决定用户池大小)
+OPERATIONS_PER_USER = 2
+
+
+def random_snowflake(rng: random.Random) -> int:
+    return (rng.randrange(*SNOWFLAKE_MS_RANGE) << 22) | rng.getrandbits(22)
+
+
+class DatasetProfile:
+    """数据集规模参数"""
+    __slots__ = (
+        'operations', 'users_per_operation', 'guilds', 'removal_lists', 'removed_per_list',
+        'panels', 'mapping_groups', 'roles_per_group', 'distributors', 'topology_pairs', 'forums',
+    )
+
+    def __init__(self, operations: int = 20, users_per_operation: int = 500, guilds: int = 3,
+                 removal_lists: int = 20, removed_per_list: int = 200, panels: int = 50,
+                 mapping_groups: int = 10, roles_per_group: int = 25, distributors: int = 20,
+                 topology_pairs: int = 10, forums: int = 10):
+        self.operations = operations
+        self.users_per_operation = users_per_operation
+        self.guilds = guilds
+        self.removal_lists = removal_lists
+        self.removed_per_list = removed_per_list
+        self.panels = panels
+        self.mapping_groups = mapping_groups
+        self.roles_per_group = roles_per_group
+        self.distributors = distributors
+        self.topology_pairs = topology_pairs
+        self.forums = forums
+
+    def scaled(self, factor: int) -> "DatasetProfile":
+        """按倍数放大各类条目的数量；每个条目自身的大小 (每次操作人数、每份名单人数等) 不变"""
+        return DatasetProfile(
+            operations=self.operations * factor,
+            users_per_operation=self.users_per_operation,
+            guilds=self.guilds,
+            removal_lists=self.removal_lists * factor,
+            removed_per_list=self.removed_per_list,
+            panels=self.panels * factor,
+            mapping_groups=self.mapping_groups * factor,
+            roles_per_group=self.roles_per_group,
+            distributors=self.distributors * factor,
+            topology_pairs=self.topology_pairs * factor,
+            forums=self.forums * factor,
+        )
+
+    def as_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Dataset:
+    """一份合成数据集，各字段的结构与对应数据文件的内容相同"""
+    __slots__ = (
+        'profile', 'guild_ids', 'guild_roles', 'assignment_log', 'removal_lists',
+        'role_mapping', 'panels', 'distributors', 'topology', 'forums',
+    )
+
+    def __init__(self, profile: DatasetProfile):
+        self.profile = profile
+        self.guild_ids: List[int] = []
+        # guild_id -> 可分配的身份组ID
+        self.guild_roles: Dict[int, List[int]] = {}
+        self.assignment_log: List = []
+        # (guild_id, role_id) -> 主动移除过该身份组的用户
+        self.removal_lists: Dict[Tuple[int, int], List[int]] = {}
+        self.role_mapping: Dict[str, Dict] = {}
+        self.panels: Dict[str, Dict] = {}
+        self.distributors: Dict[str, Dict] = {}
+        self.topology: List[Dict] = []
+        self.forums: Dict[str, Dict[str, Dict]] = {}
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "operations": len(self.assignment_log),
+            "assignments": sum(len(entry['assigned_user_ids']) for _, details in self.assignment_log for entry in details['data']),
+            "removal_entries": sum(map(len, self.removal_lists.values())),
+            "panels": len(self.panels),
+            "mapped_roles": sum(len(group['data']) for group in self.role_mapping.values()),
+            "distributors": len(self.distributors),
+            "topology_pairs": len(self.topology),
+            "forum_rules": sum(map(len, self.forums.values())),
+        }
+
+
+def generate(profile: DatasetProfile, seed: int = 0) -> Dataset:
+    """按给定规模生成数据集，相同的 seed 总是生成相同的数据"""
+    rng = random.Random(seed)
+    dataset = Dataset(profile)
+    now = int(datetime.now().timestamp())
+
+    dataset.guild_ids = [random_snowflake(rng) for _ in range(max(1, profile.guilds))]
+    for guild_id in dataset.guild_ids:
+        dataset.guild_roles[guild_id] = [random_snowflake(rng) for _ in range(ROLES_PER_GUILD)]
+    all_roles = [(guild_id, role_id) for guild_id, role_ids in dataset.guild_roles.items() for role_id in role_ids]
+
+    pool_size = max(profile.users_per_operation, profile.operations * profile.users_per_operation // OPERATIONS_PER_USER)
+    users = [random_snowflake(rng) for _ in range(pool_size)]
+
+    # 分配日志：与 handle_assign_roles 写入的结构相同，同一批用户被分配到若干个服务器
+    for index in range(profile.operations):
+        operation_id = str(1000 + index)
+        timestamp = now - rng.randrange(0, 180 * 24 * 60 * 60)
+        assigned = rng.sample(users, min(profile.users_per_operation, len(users)))
+        entries = []
+        for guild_id in rng.sample(dataset.guild_ids, rng.randint(1, len(dataset.guild_ids))):
+            role_ids = rng.sample(dataset.guild_roles[guild_id], rng.randint(1, 3))
+            entries.append({
+                "guild_id": guild_id,
+                "guild_name": f"服务器 {guild_id % 10000}",
+                "role_ids": role_ids,
+                "role_names": [f"身份组 {role_id % 10000}" for role_id in role_ids],
+                "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+                "assigned_user_ids": assigned,
+                "operation_id": operation_id,
+            })
+        dataset.assignment_log.append([operation_id, {
+            "operation_id": operation_id,
+            "fade": rng.random() < 0.1,
+            "outtime": rng.choice((30, 90, 180)),
+            "timestamp": timestamp,
+            "data": entries,
+        }])
+
+    for guild_id, role_id in rng.sample(all_roles, min(profile.removal_lists, len(all_roles))):
+        dataset.removal_lists[(guild_id, role_id)] = rng.sample(users, min(profile.removed_per_list, len(users)))
+
+    for index in range(profile.mapping_groups):
+        dataset.role_mapping[str(random_snowflake(rng))] = {
+            "name": f"映射组 {index}",
+            "data": {str(random_snowflake(rng)): f"身份组 {index}-{j}" for j in range(profile.roles_per_group)},
+        }
+
+    for _ in range(profile.panels):
+        dataset.panels[str(random_snowflake(rng))] = {
+            "role_ids": [role_id for _, role_id in rng.sample(all_roles, rng.randint(1, 10))],
+            "persist_list": rng.random() < 0.5,
+            "channel_id": random_snowflake(rng),
+        }
+
+    for index in range(profile.distributors):
+        dataset.distributors[str(random_snowflake(rng))] = {
+            "message_id": random_snowflake(rng),
+            "role_id": rng.choice(all_roles)[1],
+            "title": f"领取身份组 {index}",
+            "content": "点击下方按钮领取或移除身份组",
+            "name": f"分发器 {index}",
+        }
+
+    for _ in range(profile.topology_pairs):
+        (guild_1, role_1), (guild_2, role_2) = rng.sample(all_roles, 2)
+        dataset.topology.append({
+            "guild_1": guild_1,
+            "role_1": role_1,
+            "guild_2": guild_2,
+            "role_2": role_2,
+            "direction": rng.choice(("bidirectional", "push", "pull")),
+            "mirror": rng.random() < 0.3,
+        })
+
+    for _ in range(profile.forums):
+        dataset.forums[str(random_snowflake(rng))] = {
+            str(role_id): {"threshold": rng.randint(5, 100), "auto_grant": rng.random() < 0.5}
+            for _, role_id in rng.sample(all_roles, rng.randint(1, 3))
+        }
+
+    return dataset
+
+
+def write_legacy_removed(dataset: Dataset):
+    """以旧版格式写出 data/removed/<role_id>.json (用于测试向 removal_exclusions.log 的迁移)"""
+    from cogs.logic.removal_exclusion_logic import LEGACY_REMOVED_DIR
+    os.makedirs(LEGACY_REMOVED_DIR, exist_ok=True)
+    for (_, role_id), user_ids in dataset.removal_lists.items():
+        with open(os.path.join(LEGACY_REMOVED_DIR, f"{role_id}.json"), 'w', encoding='utf-8') as f:
+            json.dump({"data": user_ids}, f)
+
+
+def exclusion_records(dataset: Dataset) -> List[bytes]:
+    """退出名单对应的 removal_exclusions.log 二进制记录"""
+    from cogs.logic.removal_exclusion_logic import _RECORD, OP_ADD
+    return [
+        _RECORD.pack(OP_ADD, guild_id, role_id, user_id)
+        for (guild_id, role_id), user_ids in dataset.removal_lists.items()
+        for user_id in user_ids
+    ]
+
+
+def write_dataset(dataset: Dataset, legacy_removed: bool = False):
+    """通过各模块自己的保存函数把数据集写入当前工作目录下的 data/"""
+    from cogs.mod.role_assigner_logic import _save_assignment_log
+    from cogs.mod.remove_role_state import _write_snapshot
+    from cogs.mod.role_sync_topology import save_topology
+    from cogs.tasks.user_role_formatter import format_role_assignments
+    from cogs.tasks.user_role_store import save_all_user_roles
+    from cogs.tasks.forum_auto_grant import ForumAutoGrant
+    from cogs.logic.role_mapping_logic import RoleMappingLogic
+    from cogs.logic.role_distributor_logic import RoleDistributorLogic
+    from cogs.logic.removal_exclusion_logic import RemovalExclusionLogic
+
+    os.makedirs('data', exist_ok=True)
+    _save_assignment_log(dataset.assignment_log)
+    save_all_user_roles(format_role_assignments(dataset.assignment_log))
+
+    mapping = RoleMappingLogic(None)
+    mapping.mappings = dataset.role_mapping
+    mapping.save_mappings()
+
+    # 与 flush_panel_states 的序列化方式相同
+    _write_snapshot(json.dumps(dataset.panels, indent=2, ensure_ascii=False))
+
+    distributors = RoleDistributorLogic(None)
+    distributors.distributors = dataset.distributors
+    distributors.save_distributors()
+
+    save_topology(dataset.topology)
+
+    forums = ForumAutoGrant(None)
+    forums.forums = dataset.forums
+    forums.save_config()
+
+    RemovalExclusionLogic(None)._append_records(exclusion_records(dataset))
+    if legacy_removed:
+        write_legacy_removed(dataset)
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """为命令行添加数据集规模参数 (默认值取自 DatasetProfile)"""
+    defaults = DatasetProfile()
+    for name in DatasetProfile.__slots__:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=getattr(defaults, name))
+
+
+def profile_from_args(args: argparse.Namespace) -> DatasetProfile:
+    return DatasetProfile(**{name: getattr(args, name) for name in DatasetProfile.__slots__})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成合成的 data/ 数据集")
+    parser.add_argument('--output-dir', required=True, help="数据集写入的工作目录 (将在其中创建 data/)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--legacy-removed', action='store_true', help="同时写出旧版 data/removed/*.json")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+    dataset = generate(profile_from_args(args), args.seed)
+    os.makedirs(args.output_dir, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(args.output_dir)
+    try:
+        write_dataset(dataset, args.legacy_removed)
+    finally:
+        os.chdir(cwd)
+    print(json.dumps(dataset.counts(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
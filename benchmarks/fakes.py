@@ -0,0 +1,430 @@
+import asyncio
+import itertools
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Tuple
+import discord
+from utils.metrics import route_label
+
+# 模拟的 REST 往返延迟 (秒，按 time_scale 缩放前)
+DEFAULT_LATENCY_SECONDS = 0.05
+# 全局速率限制：每个机器人每秒 50 个请求
+GLOBAL_LIMIT = (50, 1.0)
+# 各路由的速率限制 (次数, 窗口秒数)，按路由中的第一个ID (频道、服务器或 webhook) 分桶；
+# 数值是对实际响应头的近似，未列出的路由使用 DEFAULT_ROUTE_LIMIT
+ROUTE_LIMITS: Dict[str, Tuple[int, float]] = {
+    'GET /guilds/{id}/members/{id}': (10, 1.0),
+    'PUT /guilds/{id}/members/{id}/roles/{id}': (10, 1.0),
+    'DELETE /guilds/{id}/members/{id}/roles/{id}': (10, 1.0),
+    'GET /users/{id}': (30, 1.0),
+    'POST /channels/{id}/messages': (5, 5.0),
+    'PATCH /channels/{id}/messages/{id}': (5, 5.0),
+    'DELETE /channels/{id}/messages/{id}': (5, 1.0),
+    'PATCH /webhooks/{id}/{token}/messages/{id}': (5, 5.0),
+    'PATCH /webhooks/{id}/{token}/messages/@original': (5, 5.0),
+}
+DEFAULT_ROUTE_LIMIT = (50, 1.0)
+# 自动点击的确认按钮标签前缀
+CONFIRM_LABEL = "确认"
+
+# 基准测试会缩放全局的 asyncio.sleep，模拟 REST 层的等待已自行缩放，需使用原始函数
+_sleep = asyncio.sleep
+
+# 进程内唯一的雪花ID，保证多次运行之间不会命中 user_resolver 等模块的缓存；
+# 每个ID占用一个独立的毫秒时间戳，使按时间戳分片的存储 (user_role_store) 分布均匀
+_snowflakes = itertools.count((10 ** 17 >> 22) + 1)
+
+
+def snowflake() -> int:
+    return next(_snowflakes) << 22
+
+
+def _error(cls, status: int, reason: str, message: str):
+    return cls(SimpleNamespace(status=status, reason=reason), message)
+
+
+class RouteBucket:
+    """单个速率限制桶"""
+    __slots__ = ('limit', 'per', 'remaining', 'reset_at')
+
+    def __init__(self, limit: int, per: float):
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+
+
+class FakeHTTP:
+    """
+    模拟的 REST 层
+
+    请求按路由计数，先经过全局桶再经过路由桶；桶耗尽时和 discord.py 一样在本地等待到重置时间，
+    之后再加上一次往返延迟。所有等待都按 time_scale 缩放，统计中记录的是缩放前的模拟秒数
+    """
+
+    def __init__(self, latency: float = DEFAULT_LATENCY_SECONDS, time_scale: float = 0.001):
+        self.latency = latency
+        self.time_scale = time_scale
+        self.calls: Counter = Counter()
+        self.rate_limited: Counter = Counter()
+        # 缩放前的模拟等待总秒数 (往返延迟 + 速率限制等待)
+        self.wait_seconds = 0.0
+        self._global = RouteBucket(*GLOBAL_LIMIT)
+        self._buckets: Dict[Tuple[str, str], RouteBucket] = {}
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time() / self.time_scale
+
+    async def _acquire(self, bucket: RouteBucket, route: str):
+        while True:
+            now = self._now()
+            if now >= bucket.reset_at:
+                bucket.remaining = bucket.limit
+                bucket.reset_at = now + bucket.per
+            if bucket.remaining > 0:
+                bucket.remaining -= 1
+                return
+            self.rate_limited[route] += 1
+            delay = bucket.reset_at - now
+            self.wait_seconds += delay
+            await _sleep(delay * self.time_scale)
+
+    async def request(self, method: str, path: str):
+        route = route_label(method, path)
+        self.calls[route] += 1
+        major = path.split('/')[2] if path.count('/') >= 2 else ''
+        bucket = self._buckets.get((route, major))
+        if bucket is None:
+            bucket = self._buckets[(route, major)] = RouteBucket(*ROUTE_LIMITS.get(route, DEFAULT_ROUTE_LIMIT))
+        await self._acquire(self._global, 'global')
+        await self._acquire(bucket, route)
+        self.wait_seconds += self.latency
+        await _sleep(self.latency * self.time_scale)
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+
+class FakeRole:
+    __slots__ = ('id', 'name', 'position', 'guild')
+
+    def __init__(self, guild: "FakeGuild", name: str, position: int, role_id: Optional[int] = None):
+        self.id = role_id or snowflake()
+        self.name = name
+        self.position = position
+        self.guild = guild
+
+    def __le__(self, other: "FakeRole") -> bool:
+        return (self.position, self.id) <= (other.position, other.id)
+
+    def __lt__(self, other: "FakeRole") -> bool:
+        return (self.position, self.id) < (other.position, other.id)
+
+    def __repr__(self):
+        return f"<FakeRole id={self.id} name={self.name!r}>"
+
+    def is_default(self) -> bool:
+        return self.id == self.guild.id
+
+    @property
+    def mention(self) -> str:
+        return f"<@&{self.id}>"
+
+    @property
+    def members(self) -> List["FakeMember"]:
+        # 与 discord.py 相同，每次访问都遍历服务器成员缓存
+        if self.is_default():
+            return list(self.guild._members.values())
+        return [member for member in self.guild._members.values() if self.id in member._roles]
+
+
+class FakeMember:
+    __slots__ = ('id', 'name', 'guild', '_roles')
+    discriminator = "0"
+    guild_permissions = SimpleNamespace(manage_roles=True)
+
+    def __init__(self, guild: "FakeGuild", user_id: int, role_ids: Iterable[int] = ()):
+        self.id = user_id
+        self.name = f"user{user_id % 1000000}"
+        self.guild = guild
+        self._roles = set(role_ids)
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def display_name(self) -> str:
+        return self.name
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+    @property
+    def roles(self) -> List[FakeRole]:
+        roles = [self.guild.default_role]
+        roles.extend(sorted(role for role in map(self.guild.get_role, self._roles) if role is not None))
+        return roles
+
+    @property
+    def top_role(self) -> FakeRole:
+        return self.roles[-1]
+
+    async def add_roles(self, *roles: FakeRole, reason: Optional[str] = None, atomic: bool = True):
+        # 与 discord.py 的 atomic 模式相同，每个身份组一次请求
+        for role in roles:
+            await self.guild.http.request('PUT', f"/guilds/{self.guild.id}/members/{self.id}/roles/{role.id}")
+            self._roles.add(role.id)
+
+    async def remove_roles(self, *roles: FakeRole, reason: Optional[str] = None, atomic: bool = True):
+        for role in roles:
+            await self.guild.http.request('DELETE', f"/guilds/{self.guild.id}/members/{self.id}/roles/{role.id}")
+            self._roles.discard(role.id)
+
+
+class FakeGuild:
+    filesize_limit = 25 * 1024 * 1024
+    chunked = True
+
+    def __init__(self, http: FakeHTTP, name: str):
+        self.id = snowflake()
+        self.name = name
+        self.http = http
+        self._members: Dict[int, FakeMember] = {}
+        self._roles: Dict[int, FakeRole] = {}
+        self.default_role = self.add_role("@everyone", role_id=self.id)
+
+    def add_role(self, name: str, role_id: Optional[int] = None) -> FakeRole:
+        role = FakeRole(self, name, len(self._roles), role_id)
+        self._roles[role.id] = role
+        return role
+
+    def add_members(self, user_ids: Iterable[int], roles: Iterable[FakeRole] = ()) -> List[FakeMember]:
+        role_ids = [role.id for role in roles]
+        members = [FakeMember(self, user_id, role_ids) for user_id in user_ids]
+        self._members.update((member.id, member) for member in members)
+        return members
+
+    def grant(self, role: FakeRole, user_ids: Iterable[int]):
+        """直接在缓存中为已有成员添加身份组 (不经过模拟 REST 层)"""
+        for user_id in user_ids:
+            self._members[user_id]._roles.add(role.id)
+
+    @property
+    def members(self) -> List[FakeMember]:
+        return list(self._members.values())
+
+    @property
+    def roles(self) -> List[FakeRole]:
+        return sorted(self._roles.values())
+
+    @property
+    def member_count(self) -> int:
+        return len(self._members)
+
+    def get_member(self, user_id: int) -> Optional[FakeMember]:
+        return self._members.get(user_id)
+
+    def get_role(self, role_id: int) -> Optional[FakeRole]:
+        return self._roles.get(role_id)
+
+    async def fetch_member(self, user_id: int) -> FakeMember:
+        await self.http.request('GET', f"/guilds/{self.id}/members/{user_id}")
+        member = self._members.get(user_id)
+        if member is None:
+            raise _error(discord.NotFound, 404, 'Not Found', 'Unknown Member')
+        return member
+
+
+class FakeMessage:
+    __slots__ = ('id', 'path', 'http')
+
+    def __init__(self, http: FakeHTTP, path: str):
+        self.id = snowflake()
+        self.path = f"{path}/{self.id}"
+        self.http = http
+
+    async def edit(self, **kwargs):
+        await self.http.request('PATCH', self.path)
+        return self
+
+    async def delete(self, **kwargs):
+        await self.http.request('DELETE', self.path)
+
+
+class FakeChannel:
+    def __init__(self, fake: "FakeDiscord"):
+        self.id = snowflake()
+        self._fake = fake
+
+    async def send(self, content: Optional[str] = None, *, view: Optional[discord.ui.View] = None, **kwargs) -> FakeMessage:
+        path = f"/channels/{self.id}/messages"
+        await self._fake.http.request('POST', path)
+        if view is not None:
+            self._fake.click_confirm(view)
+        return FakeMessage(self._fake.http, path)
+
+
+class FakeResponse:
+    """interaction.response 的替身，发送带确认按钮的视图时自动点击确认"""
+
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _callback(self):
+        if self._done:
+            raise discord.InteractionResponded(self._interaction)
+        await self._interaction.http.request('POST', f"/interactions/{self._interaction.id}/token/callback")
+        self._done = True
+
+    async def send_message(self, content: Optional[str] = None, *, view: Optional[discord.ui.View] = None, **kwargs):
+        await self._callback()
+        if view is not None:
+            self._interaction.fake.click_confirm(view, self._interaction.guild)
+
+    async def defer(self, **kwargs):
+        await self._callback()
+
+    async def edit_message(self, **kwargs):
+        await self._callback()
+
+    async def send_modal(self, modal: discord.ui.Modal):
+        await self._callback()
+        self._interaction.fake.submit_modal(modal, self._interaction.guild)
+
+
+class FakeWebhook:
+    """interaction.followup 的替身"""
+
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+
+    async def send(self, content: Optional[str] = None, *, view: Optional[discord.ui.View] = None, wait: bool = False, **kwargs) -> FakeMessage:
+        path = f"/webhooks/{self._interaction.application_id}/token"
+        await self._interaction.http.request('POST', path)
+        if view is not None:
+            self._interaction.fake.click_confirm(view, self._interaction.guild)
+        return FakeMessage(self._interaction.http, f"{path}/messages")
+
+
+class FakeInteraction:
+    def __init__(self, fake: "FakeDiscord", guild: Optional[FakeGuild], user):
+        self.fake = fake
+        self.id = snowflake()
+        self.application_id = fake.client.user.id
+        self.guild = guild
+        self.guild_id = guild.id if guild else None
+        self.user = user
+        self.client = fake.client
+        self.channel = fake.channel
+        self.data: Dict = {}
+        self.created_at = discord.utils.utcnow()
+        self.response = FakeResponse(self)
+        self.followup = FakeWebhook(self)
+
+    @property
+    def http(self) -> FakeHTTP:
+        return self.fake.http
+
+    async def edit_original_response(self, **kwargs) -> FakeMessage:
+        path = f"/webhooks/{self.application_id}/token/messages/@original"
+        await self.http.request('PATCH', path)
+        return FakeMessage(self.http, path)
+
+    async def original_response(self) -> FakeMessage:
+        return FakeMessage(self.http, f"/webhooks/{self.application_id}/token/messages/@original")
+
+
+class FakeClient:
+    def __init__(self, fake: "FakeDiscord"):
+        self._fake = fake
+        self.user = SimpleNamespace(id=snowflake(), name="bot")
+        self.guilds: List[FakeGuild] = []
+        # handle_replace_action 通过 client.loop.create_task 在后台执行替换
+        self.loop = SimpleNamespace(create_task=fake.spawn)
+        self.latency = fake.http.latency
+
+    async def wait_until_ready(self):
+        return
+
+    def get_guild(self, guild_id: int) -> Optional[FakeGuild]:
+        return next((guild for guild in self.guilds if guild.id == guild_id), None)
+
+    def get_user(self, user_id: int):
+        return None
+
+    def get_channel(self, channel_id: int):
+        return None
+
+    def get_cog(self, name: str):
+        return None
+
+    async def fetch_user(self, user_id: int):
+        await self._fake.http.request('GET', f"/users/{user_id}")
+        for guild in self.guilds:
+            member = guild.get_member(user_id)
+            if member is not None:
+                return member
+        raise _error(discord.NotFound, 404, 'Not Found', 'Unknown User')
+
+
+class FakeDiscord:
+    """
+    一个进程内的 Discord 替身：服务器、成员、身份组、交互和模拟 REST 层
+
+    发送带有确认按钮的视图时会以原交互发起者的身份自动点击确认，弹出的模态框按 modal_answers
+    中的 {标签: 值} 自动填写并提交；由此产生的后台任务需通过 drain() 等待完成
+    """
+
+    def __init__(self, latency: float = DEFAULT_LATENCY_SECONDS, time_scale: float = 0.001):
+        self.http = FakeHTTP(latency, time_scale)
+        self.client = FakeClient(self)
+        self.channel = FakeChannel(self)
+        self.admin = SimpleNamespace(id=snowflake(), name="admin")
+        self.modal_answers: Dict[str, str] = {}
+        self._pending: set = set()
+
+    def add_guild(self, name: str, user_ids: Iterable[int] = ()) -> FakeGuild:
+        """创建服务器，机器人成员持有位置最高的身份组"""
+        guild = FakeGuild(self.http, name)
+        bot_role = guild.add_role("机器人")
+        bot_role.position = 10 ** 6
+        guild.add_members([self.client.user.id], [bot_role])
+        guild.add_members(user_ids)
+        self.client.guilds.append(guild)
+        return guild
+
+    def interaction(self, guild: Optional[FakeGuild]) -> FakeInteraction:
+        return FakeInteraction(self, guild, self.admin)
+
+    def spawn(self, coro) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    def click_confirm(self, view: discord.ui.View, guild: Optional[FakeGuild] = None):
+        button = next(
+            (item for item in view.children if isinstance(item, discord.ui.Button) and (item.label or "").startswith(CONFIRM_LABEL)),
+            None
+        )
+        if button is not None:
+            # 在发送调用返回之后才点击，调用方可能要先保存返回的消息对象
+            self.spawn(button.callback(self.interaction(guild)))
+
+    def submit_modal(self, modal: discord.ui.Modal, guild: Optional[FakeGuild] = None):
+        for item in modal.children:
+            if isinstance(item, discord.ui.TextInput):
+                # 与网关下发的提交数据一样直接写入输入值
+                item._value = self.modal_answers.get(item.label, "")
+        self.spawn(modal.on_submit(self.interaction(guild)))
+
+    async def drain(self):
+        """等待所有自动点击、模态框提交及其派生的后台任务完成"""
+        while self._pending:
+            await asyncio.gather(*list(self._pending))
@@ -0,0 +1,32 @@
+import sys
+import json
+import platform
+import subprocess
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+def git_revision() -> Optional[str]:
+    """当前提交的短哈希，不在 git 仓库中时返回 None"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_report(benchmark: str, parameters: Dict, results: List[Dict], output: Optional[str] = None):
+    """以 JSON 写出基准测试结果，附带版本与运行参数以便在不同版本之间比较"""
+    report = {
+        "benchmark": benchmark,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "parameters": parameters,
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2) + "\n"
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
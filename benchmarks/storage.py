@@ -0,0 +1,240 @@
+"""
+data/ 存储层的微基准测试
+
+用 benchmarks.datagen 按多个规模倍数生成数据集，对代码中的每个加载/保存函数分别计时，
+输出各文件在不同规模下的延迟、文件大小和峰值内存:
+
+    python -m benchmarks.storage --scales 1,10,50 --output storage.json
+
+计时与峰值内存分开测量 (tracemalloc 会显著拖慢被测代码)；每项计时重复 --repeats 次，取中位数
+"""
+import os
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import itertools
+import statistics
+import tempfile
+import tracemalloc
+from typing import Callable, List, Optional
+
+from benchmarks.datagen import (
+    Dataset, add_profile_arguments, exclusion_records, generate, profile_from_args, write_legacy_removed,
+)
+from benchmarks.fakes import FakeDiscord
+from benchmarks.results import write_report
+
+logger = logging.getLogger('discord_bot.benchmarks.storage')
+
+DEFAULT_SCALES = (1, 10, 50)
+DEFAULT_REPEATS = 3
+
+
+def _noop():
+    pass
+
+
+class StorageCase:
+    """一个加载或保存函数的基准用例"""
+    __slots__ = ('file', 'op', 'run', 'setup', 'path')
+
+    def __init__(self, file: str, op: str, run: Callable, setup: Callable = _noop, path: Optional[str] = None):
+        self.file = file
+        self.op = op
+        self.run = run
+        # 每次计时前执行 (不计入耗时)，用于重置状态
+        self.setup = setup
+        # 用于统计大小的文件或目录，默认为 data/<file>
+        self.path = path or os.path.join('data', file)
+
+
+def _path_size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(_path_size(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def build_cases(dataset: Dataset) -> List[StorageCase]:
+    """
+    为当前工作目录下的 data/ 构建全部用例
+
+    每个文件先执行保存用例再执行加载用例，加载读取的就是刚刚由保存函数写出的文件
+    """
+    from cogs.mod import remove_role_state
+    from cogs.mod.role_assigner_logic import _load_assignment_log, _save_assignment_log
+    from cogs.mod.role_sync_topology import load_topology, save_topology
+    from cogs.tasks import user_role_store
+    from cogs.tasks.user_role_formatter import format_role_assignments
+    from cogs.tasks.forum_auto_grant import ForumAutoGrant
+    from cogs.logic.role_mapping_logic import RoleMappingLogic
+    from cogs.logic.role_distributor_logic import RoleDistributorLogic
+    from cogs.logic.removal_exclusion_logic import RemovalExclusionLogic, EXCLUSION_LOG_FILE, FLUSH_THRESHOLD
+
+    os.makedirs('data', exist_ok=True)
+    cases = [
+        StorageCase('role_assignments.json', 'write', lambda: _save_assignment_log(dataset.assignment_log)),
+        StorageCase('role_assignments.json', 'read', _load_assignment_log),
+    ]
+
+    # 以用户为中心的分片存储：全量重建、内容未变化时的全量比较、单个操作的增量写入和单个用户的读取
+    user_view = format_role_assignments(dataset.assignment_log)
+    first_operation = dataset.assignment_log[0][1]['data'][0] if dataset.assignment_log else None
+    new_role_ids = itertools.count(1)
+    sample_user = next(iter(user_view), 0)
+    cases += [
+        StorageCase('user_role_assignments', 'write_all', lambda: user_role_store.save_all_user_roles(user_view),
+                    setup=lambda: shutil.rmtree(user_role_store.STORE_DIR, ignore_errors=True), path=user_role_store.STORE_DIR),
+        StorageCase('user_role_assignments', 'write_all_unchanged', lambda: user_role_store.save_all_user_roles(user_view),
+                    path=user_role_store.STORE_DIR),
+        StorageCase('user_role_assignments', 'read_user', lambda: user_role_store.load_user_roles(sample_user),
+                    path=user_role_store.STORE_DIR),
+    ]
+    if first_operation:
+        # 每次追加一个新的身份组，保证所有受影响的分片都会被重写
+        cases.append(StorageCase(
+            'user_role_assignments', 'add_operation',
+            lambda: user_role_store.add_user_roles(first_operation['guild_id'], [next(new_role_ids)], first_operation['assigned_user_ids']),
+            path=user_role_store.STORE_DIR,
+        ))
+
+    mapping = RoleMappingLogic(None)
+    mapping.mappings = dataset.role_mapping
+    cases += [
+        StorageCase('role_mapping.json', 'write', mapping.save_mappings),
+        StorageCase('role_mapping.json', 'read', mapping.load_mappings),
+    ]
+
+    # 面板状态：启动时加载全部面板；在事件循环外保存一个面板会同步重写整个文件
+    panel_ids = itertools.count(1)
+    remove_role_state._write_snapshot(json.dumps(dataset.panels, indent=2, ensure_ascii=False))
+    remove_role_state.load_panel_registry()
+    cases += [
+        StorageCase('remove_role_panels.json', 'write_one', lambda: remove_role_state.save_panel_state(next(panel_ids), [1, 2, 3], True, channel_id=1)),
+        StorageCase('remove_role_panels.json', 'read', remove_role_state.load_panel_registry),
+    ]
+
+    distributors = RoleDistributorLogic(None)
+    distributors.distributors = dataset.distributors
+    cases += [
+        StorageCase('role_distributors.json', 'write', distributors.save_distributors),
+        StorageCase('role_distributors.json', 'read', distributors.load_distributors),
+    ]
+
+    cases += [
+        StorageCase('role_sync_topology.json', 'write', lambda: save_topology(dataset.topology)),
+        StorageCase('role_sync_topology.json', 'read', load_topology),
+    ]
+
+    forums = ForumAutoGrant(None)
+    forums.forums = dataset.forums
+    cases += [
+        StorageCase('role_auto_apply.json', 'write', forums.save_config),
+        StorageCase('role_auto_apply.json', 'read', forums.load_config),
+    ]
+
+    # 退出名单：从旧版 removed/*.json 迁移、重放追加日志、压缩和一次批量追加
+    fake = FakeDiscord()
+    for guild_id in dataset.guild_ids:
+        guild = fake.add_guild(str(guild_id))
+        for role_id in dataset.guild_roles[guild_id]:
+            guild.add_role(str(role_id), role_id=role_id)
+    write_legacy_removed(dataset)
+    records = exclusion_records(dataset)
+    batch = records[:FLUSH_THRESHOLD]
+    exclusions = [RemovalExclusionLogic(fake.client)]
+
+    def reset_exclusions(remove_log: bool = False):
+        if remove_log and os.path.exists(EXCLUSION_LOG_FILE):
+            os.remove(EXCLUSION_LOG_FILE)
+        exclusions[0] = RemovalExclusionLogic(fake.client)
+
+    cases += [
+        StorageCase('removal_exclusions.log', 'migrate_legacy', lambda: asyncio.run(exclusions[0]._migrate_legacy_stores()),
+                    setup=lambda: reset_exclusions(remove_log=True)),
+        StorageCase('removal_exclusions.log', 'read', lambda: exclusions[0]._load_log(), setup=reset_exclusions),
+        StorageCase('removal_exclusions.log', 'compact', lambda: exclusions[0]._compact()),
+        StorageCase('removal_exclusions.log', 'append_batch', lambda: exclusions[0]._append_records(batch)),
+    ]
+    logger.debug(f"已构建 {len(cases)} 个用例，退出名单共 {len(records)} 条记录")
+    return cases
+
+
+def measure(case: StorageCase, repeats: int) -> dict:
+    timings = []
+    for _ in range(repeats):
+        case.setup()
+        start = time.perf_counter()
+        case.run()
+        timings.append(time.perf_counter() - start)
+
+    case.setup()
+    tracemalloc.start()
+    try:
+        case.run()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "file": case.file,
+        "op": case.op,
+        "file_bytes": _path_size(case.path),
+        "median_seconds": round(statistics.median(timings), 6),
+        "min_seconds": round(min(timings), 6),
+        "max_seconds": round(max(timings), 6),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def run_scale(dataset: Dataset, scale: int, repeats: int, only: Optional[List[str]] = None) -> List[dict]:
+    """在临时工作目录中对一个数据集运行全部用例"""
+    results = []
+    counts = dataset.counts()
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for case in build_cases(dataset):
+                if only and case.file not in only:
+                    continue
+                result = measure(case, repeats)
+                result = {"scale": scale, **result, "entries": counts}
+                logger.info(
+                    f"x{scale} {case.file} {case.op}: {result['median_seconds'] * 1000:.2f} ms, "
+                    f"{result['file_bytes'] / 1024:.0f} KB, 峰值内存 {result['peak_memory_bytes'] / 1024 / 1024:.1f} MB"
+                )
+                results.append(result)
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="data/ 存储层的微基准测试")
+    parser.add_argument('--scales', default=",".join(map(str, DEFAULT_SCALES)), help="逗号分隔的规模倍数 (相对下面的基础规模)")
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS, help="每个用例的计时次数")
+    parser.add_argument('--files', help="只测试这些文件 (逗号分隔)，默认全部")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="结果写入的文件，默认输出到标准输出")
+    parser.add_argument('--log-level', default='WARNING', help="被测代码的日志级别")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+    logger.setLevel(logging.INFO)
+    base = profile_from_args(args)
+    only = [name.strip() for name in args.files.split(',')] if args.files else None
+
+    results = []
+    for scale in [int(scale) for scale in args.scales.split(',') if scale.strip()]:
+        dataset = generate(base.scaled(scale), args.seed)
+        results.extend(run_scale(dataset, scale, max(1, args.repeats), only))
+
+    write_report("storage", {"base_profile": base.as_dict(), "repeats": args.repeats, "seed": args.seed}, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
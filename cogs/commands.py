@@ -3,6 +3,7 @@ from discord.ext import commands
 from discord import app_commands, Interaction
 from typing import TYPE_CHECKING
 import logging
+import functools
 import config
 import os
 from .mod.role_assigner_logic import handle_assign_roles
@@ -11,8 +12,12 @@ if TYPE_CHECKING:
 from .mod import status_utils 
 from .mod.role_members_logic import handle_list_role_members
 from .mod.role_sync_logic import handle_sync_role
+from .mod.role_sync_topology import handle_sync_topology
+from .mod.role_matrix_logic import handle_export_role_matrix
 from utils.auth_utils import is_authorized
-from .mod.remove_role_logic import handle_remove_role
+from utils.interaction_guard import interaction_guard
+from utils.ack_budget import ack_budget
+from .mod.remove_role_logic import handle_remove_role, handle_remove_role_select, parse_remove_role_custom_id, REMOVE_ROLE_SELECT_PREFIX
 from .ui.identity_group_view import IdentityGroupView
 from .ui.role_distributor_view import RoleDistributorView
 from .ui.role_auto_apply_view import RoleAutoApplyView, ApplyModal
@@ -100,6 +105,28 @@ class RoleAssigner(commands.Cog):
         """
         await handle_list_role_members(interaction, role_id_str)
 
+    @app_commands.command(name="export_role_matrix", description="导出整个服务器成员与身份组的对应关系")
+    @app_commands.guilds(*[discord.Object(id=gid) for gid in config.GUILD_IDS])
+    @app_commands.describe(
+        scope="要导出的身份组范围",
+        fmt="导出格式",
+        compress="是否使用 gzip 压缩"
+    )
+    @app_commands.choices(scope=[
+        app_commands.Choice(name="role_mapping.json 中的身份组 (默认)", value="managed"),
+        app_commands.Choice(name="全部身份组", value="all"),
+    ], fmt=[
+        app_commands.Choice(name="稀疏 CSV (默认)", value="sparse"),
+        app_commands.Choice(name="位图", value="bitmap"),
+    ])
+    @is_authorized()
+    async def export_role_matrix(self, interaction: Interaction, scope: str = "managed", fmt: str = "sparse", compress: bool = False):
+        """
+        一次遍历成员缓存，导出成员×身份组矩阵
+        """
+        logger.info(f"开始处理 /export_role_matrix 命令，参数: scope={scope}, fmt={fmt}, compress={compress}")
+        await handle_export_role_matrix(interaction, scope, fmt, compress)
+
     @app_commands.command(name="assign_roles", description="批量为用户分配身份组(可同时分配两个身份组)")
     @app_commands.guilds(*[discord.Object(id=gid) for gid in config.GUILD_IDS])
     @app_commands.describe(
@@ -118,7 +145,10 @@ class RoleAssigner(commands.Cog):
         if fade_flag is not None and str(fade_flag).lower() in ("true", "1", "yes", "y"):
             fade = True
 
-        await handle_assign_roles(interaction, role_id_str, user_ids_str, message_link, role_id_str_1, role_id_str_2, fade=fade, time=time, operation_id=operation_id)
+        # 跨服务器校验身份组与读取历史记录可能较慢，超出首次响应预算时自动延迟响应
+        # (临时消息，确认请求与错误提示仅发起者可见)
+        handler = functools.partial(handle_assign_roles, role_id_str=role_id_str, user_ids_str=user_ids_str, message_link=message_link, role_id_str_1=role_id_str_1, role_id_str_2=role_id_str_2, fade=fade, time=time, operation_id=operation_id)
+        await ack_budget.run(interaction, "assign_roles", handler)
 
     @app_commands.command(name="status", description="显示系统和机器人状态")
     async def status_command(self, interaction: discord.Interaction):
@@ -158,6 +188,35 @@ class RoleAssigner(commands.Cog):
         logger.info(f"开始处理 /sync_role 命令，参数: role_id_1={role_id_1}, server_id={server_id}, role_id_2={role_id_2}, action={action}")
         await handle_sync_role(interaction, role_id_1, server_id, role_id_2, action)
 
+    @app_commands.command(name="sync_topology", description="管理并执行多组身份组的同步拓扑")
+    @app_commands.guilds(*[discord.Object(id=gid) for gid in config.GUILD_IDS])
+    @app_commands.describe(
+        action="选择要执行的操作",
+        role_id_1="本服务器的身份组ID",
+        server_id="远端服务器的ID",
+        role_id_2="远端服务器的身份组ID",
+        direction="同步方向 (仅添加时使用)",
+        mirror="是否实时镜像该身份组对的变化 (仅添加时使用)",
+        index="要删除的身份组对序号 (list 显示的序号，仅删除时使用)"
+    )
+    @app_commands.choices(action=[
+        app_commands.Choice(name="查看拓扑 (list)", value="list"),
+        app_commands.Choice(name="添加身份组对 (add)", value="add"),
+        app_commands.Choice(name="删除身份组对 (remove)", value="remove"),
+        app_commands.Choice(name="执行全部同步 (run)", value="run"),
+    ], direction=[
+        app_commands.Choice(name="双向同步 (默认)", value="bidirectional"),
+        app_commands.Choice(name="仅推送到远端", value="push"),
+        app_commands.Choice(name="仅同步到本地", value="pull"),
+    ])
+    @is_authorized()
+    async def sync_topology(self, interaction: Interaction, action: str, role_id_1: str = None, server_id: str = None, role_id_2: str = None, direction: str = "bidirectional", mirror: bool = False, index: int = None):
+        """
+        持久化的多组身份组同步：一次计算全部差异并并发执行
+        """
+        logger.info(f"开始处理 /sync_topology 命令，参数: action={action}, role_id_1={role_id_1}, server_id={server_id}, role_id_2={role_id_2}, direction={direction}, mirror={mirror}, index={index}")
+        await handle_sync_topology(interaction, action, role_id_1, server_id, role_id_2, direction, mirror, index)
+
     @app_commands.command(name="create_role_distributor", description="在指定频道创建或更新一个身份组分发消息")
     @app_commands.guilds(*[discord.Object(id=gid) for gid in config.GUILD_IDS])
     @app_commands.describe(
@@ -251,6 +310,26 @@ class RoleAssigner(commands.Cog):
             logger.error(f"发送身份组管理器时发生未知错误: {e}", exc_info=True)
             await interaction.followup.send("发送管理面板时发生未知错误，请联系管理员", ephemeral=True)
 
+    @app_commands.command(name="check_user_roles", description="从分配日志全量重建用户身份组视图 (一致性检查)")
+    @app_commands.guilds(*[discord.Object(id=gid) for gid in config.GUILD_IDS])
+    @is_authorized()
+    async def check_user_roles(self, interaction: Interaction):
+        """按需执行以用户为中心视图的全量重建，仅修正内容不一致的分片"""
+        await interaction.response.defer(ephemeral=True)
+
+        formatter_cog = self.bot.get_cog("UserRoleFormatter")
+        if not formatter_cog:
+            await interaction.followup.send("错误：UserRoleFormatter 未加载", ephemeral=True)
+            return
+
+        user_count, changed_shards = await formatter_cog.format_user_roles()
+        embed = discord.Embed(
+            title="✅ 一致性检查完成",
+            description=f"共检查 **{user_count}** 名用户\n修正了 **{changed_shards}** 个不一致的分片",
+            color=discord.Color.green() if changed_shards == 0 else discord.Color.orange()
+        )
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
     @app_commands.command(name="reload", description="重载指定的机器人模块 (Cog)")
     @app_commands.guilds(*[discord.Object(id=gid) for gid in config.GUILD_IDS])
     @app_commands.describe(cog_name="要重载的模块名称")
@@ -304,10 +383,11 @@ class RoleAssigner(commands.Cog):
     @app_commands.describe(
         space="选择一个论坛频道作为申请的作用域",
         role_id="输入当用户满足条件时给予的身份组ID",
-        count="输入帖子需要达到的最高反应数"
+        count="输入帖子需要达到的最高反应数",
+        auto_grant="是否在帖子达到反应数时自动为作者发放身份组 (无需申请)"
     )
     @is_authorized()
-    async def role_auto_apply(self, interaction: discord.Interaction, space: discord.ForumChannel, role_id: str, count: int):
+    async def role_auto_apply(self, interaction: discord.Interaction, space: discord.ForumChannel, role_id: str, count: int, auto_grant: bool = False):
         try:
             role_id_int = int(role_id)
         except ValueError:
@@ -319,6 +399,11 @@ class RoleAssigner(commands.Cog):
             await interaction.response.send_message(f"找不到 ID 为 {role_id_int} 的身份组", ephemeral=True)
             return
 
+        auto_grant_cog = self.bot.get_cog("ForumAutoGrant")
+        if auto_grant_cog is None and auto_grant:
+            await interaction.response.send_message("错误：ForumAutoGrant 未加载，无法开启自动发放", ephemeral=True)
+            return
+
         embed = discord.Embed(
             title="身份组自动申请",
             description=f"点击下方的按钮，按照提示输入你的帖子链接即可申请 **{role.name}** 身份组\n\n"
@@ -328,6 +413,8 @@ class RoleAssigner(commands.Cog):
                         f"- 帖子的最高反应数需要达到 **{count}** 个。",
             color=discord.Color.blue()
         )
+        if auto_grant:
+            embed.add_field(name="自动发放", value="帖子达到反应数后，机器人会自动为作者发放身份组，无需申请", inline=False)
         
         view = RoleAutoApplyView()
         # Get the button and set its dynamic custom_id
@@ -336,6 +423,11 @@ class RoleAssigner(commands.Cog):
         
         await interaction.response.send_message(embed=embed, view=view)
 
+        # 确认消息发送成功后才持久化保存论坛阈值 (供申请校验与自动发放使用)，
+        # 避免回复失败时留下管理员未见到确认的规则
+        if auto_grant_cog:
+            auto_grant_cog.set_rule(space, role, count, auto_grant)
+
     @commands.Cog.listener("on_interaction")
     async def on_auto_apply_interaction(self, interaction: Interaction):
         if not interaction.data or 'custom_id' not in interaction.data:
@@ -350,12 +442,20 @@ class RoleAssigner(commands.Cog):
             role_id = int(role_id_str)
             required_reactions = int(reactions_str)
             forum_channel_id = int(forum_id_str)
+
+            # 优先使用持久化保存的阈值，按钮中的数值仅作为旧面板的回退
+            auto_grant_cog = self.bot.get_cog("ForumAutoGrant")
+            if auto_grant_cog:
+                saved_threshold = auto_grant_cog.get_threshold(forum_channel_id, role_id)
+                if saved_threshold is not None:
+                    required_reactions = saved_threshold
             
             modal = ApplyModal(
                 role_id=role_id,
                 required_reactions=required_reactions,
                 forum_channel_id=forum_channel_id
             )
+
             await interaction.response.send_modal(modal)
         
         except (ValueError, IndexError) as e:
@@ -363,6 +463,29 @@ class RoleAssigner(commands.Cog):
             if not interaction.response.is_done():
                 await interaction.response.send_message("处理申请时发生内部错误，按钮数据格式无效。", ephemeral=True)
 
+    @commands.Cog.listener("on_interaction")
+    async def on_remove_role_select_interaction(self, interaction: Interaction):
+        if interaction.type != discord.InteractionType.component or not interaction.data:
+            return
+
+        message_id = parse_remove_role_custom_id(interaction.data.get('custom_id', ''))
+        if message_id is None:
+            return
+
+        values = interaction.data.get('values') or [None]
+        try:
+            await interaction_guard.run(
+                interaction,
+                REMOVE_ROLE_SELECT_PREFIX,
+                functools.partial(handle_remove_role_select, message_id=message_id),
+                message_id,
+                values[0]
+            )
+        except Exception as e:
+            logger.error(f"处理自助移除面板交互 (msg_id: {message_id}) 时出错: {e}", exc_info=True)
+            if not interaction.response.is_done():
+                await interaction.response.send_message("处理请求时发生内部错误。", ephemeral=True)
+
     @commands.Cog.listener()
     async def on_app_command_error(self, interaction: Interaction, error: app_commands.AppCommandError):
         """处理 Cog 内应用程序命令的错误"""
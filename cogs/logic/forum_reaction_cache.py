@@ -0,0 +1,199 @@
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+import discord
+from discord.ext import commands
+
+logger = logging.getLogger('discord_bot.cogs.forum_reaction_cache')
+
+# 缓存条目最后一次通过 REST 校准后的有效期 (秒)；期间的变化由原始反应事件增量维护
+CACHE_TTL_SECONDS = 30 * 60
+# 每个论坛频道最多缓存的帖子数量，超出时淘汰最久未使用的条目
+MAX_THREADS_PER_FORUM = 5000
+
+
+def _emoji_key(emoji) -> str:
+    """自定义表情使用ID (改名后仍一致)，Unicode 表情使用字符本身"""
+    emoji_id = getattr(emoji, 'id', None)
+    return str(emoji_id) if emoji_id else str(emoji)
+
+
+# 一次反应变化: (表情键, 增量)；增量为 None 表示清空该表情，表情键为 None 表示清空全部反应
+ReactionChange = Tuple[Optional[str], Optional[int]]
+
+
+class StarterReactions:
+    """一个帖子起始消息的反应计数"""
+    __slots__ = ('owner_id', 'counts', 'synced_at')
+
+    def __init__(self, owner_id: Optional[int], counts: Dict[str, int]):
+        self.owner_id = owner_id
+        self.counts = counts
+        self.synced_at = time.monotonic()
+
+    @property
+    def peak(self) -> int:
+        """起始消息上最高的单个反应数，没有反应时为 0"""
+        return max(self.counts.values(), default=0)
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.synced_at > CACHE_TTL_SECONDS
+
+    def apply(self, key: Optional[str], delta: Optional[int]):
+        if key is None:
+            self.counts.clear()
+        elif delta is None:
+            self.counts.pop(key, None)
+        else:
+            count = self.counts.get(key, 0) + delta
+            if count > 0:
+                self.counts[key] = count
+            else:
+                self.counts.pop(key, None)
+
+
+class ForumReactionCache(commands.Cog):
+    """
+    论坛帖子起始消息的反应计数缓存
+
+    - 按论坛频道分组缓存每个帖子起始消息的反应数
+    - 通过 on_raw_reaction_add / on_raw_reaction_remove 等原始事件增量更新
+    - 未命中时优先使用 discord.py 缓存的起始消息回填，条目过期时总是通过 REST 重新校准
+    - 回填请求进行期间收到的反应变化会被缓冲，回填完成后重新应用
+    - 对于被关注的论坛，新增反应后派发 starter_reaction_add 事件 (参数为帖子与最新计数)
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        # 论坛频道ID -> (帖子ID -> 起始消息反应计数)
+        self.forums: Dict[int, "OrderedDict[int, StarterReactions]"] = {}
+        # 帖子ID -> 论坛频道ID，供事件快速定位条目
+        self._thread_forum: Dict[int, int] = {}
+        # 需要派发 starter_reaction_add 事件的论坛频道ID
+        self.watched_forums: Set[int] = set()
+        # 帖子ID -> 进行中的 REST 回填各自的反应变化缓冲区
+        self._pending: Dict[int, List[List[ReactionChange]]] = {}
+
+    def _get_entry(self, thread_id: int) -> Optional[StarterReactions]:
+        forum_id = self._thread_forum.get(thread_id)
+        if forum_id is None:
+            return None
+        return self.forums[forum_id].get(thread_id)
+
+    def _store(self, forum_id: int, thread_id: int, entry: StarterReactions):
+        threads = self.forums.setdefault(forum_id, OrderedDict())
+        threads[thread_id] = entry
+        threads.move_to_end(thread_id)
+        self._thread_forum[thread_id] = forum_id
+        while len(threads) > MAX_THREADS_PER_FORUM:
+            evicted_id, _ = threads.popitem(last=False)
+            self._thread_forum.pop(evicted_id, None)
+
+    def _drop(self, thread_id: int):
+        forum_id = self._thread_forum.pop(thread_id, None)
+        if forum_id is not None:
+            self.forums[forum_id].pop(thread_id, None)
+
+    def store_message(self, thread: discord.Thread, message: discord.Message) -> StarterReactions:
+        """用一条完整的起始消息回填缓存"""
+        counts = {_emoji_key(reaction.emoji): reaction.count for reaction in message.reactions}
+        entry = StarterReactions(thread.owner_id, counts)
+        self._store(thread.parent_id, thread.id, entry)
+        return entry
+
+    async def get_starter_reactions(self, thread: discord.Thread) -> StarterReactions:
+        """
+        获取帖子起始消息的反应计数
+
+        优先使用缓存；未命中时使用 discord.py 消息缓存中的起始消息，
+        条目已过期 (可能因错过的原始事件而偏离) 或仍无法获得时通过 REST 获取
+        (可能抛出 discord.NotFound 等异常)
+        """
+        entry = self._get_entry(thread.id)
+        if entry is not None and not entry.is_stale():
+            self.forums[thread.parent_id].move_to_end(thread.id)
+            return entry
+
+        # 论坛帖子的起始消息ID与帖子本身的ID相同
+        if entry is None and thread.starter_message is not None:
+            return self.store_message(thread, thread.starter_message)
+        return await self._fetch_and_store(thread)
+
+    async def _fetch_and_store(self, thread: discord.Thread) -> StarterReactions:
+        """通过 REST 回填，并重新应用请求期间收到的反应变化"""
+        buffer: List[ReactionChange] = []
+        self._pending.setdefault(thread.id, []).append(buffer)
+        try:
+            message = await thread.fetch_message(thread.id)
+        finally:
+            buffers = self._pending[thread.id]
+            buffers.remove(buffer)
+            if not buffers:
+                del self._pending[thread.id]
+        entry = self.store_message(thread, message)
+        for key, delta in buffer:
+            entry.apply(key, delta)
+        return entry
+
+    def _record(self, payload, key: Optional[str], delta: Optional[int]):
+        # 只关心帖子的起始消息
+        if payload.message_id != payload.channel_id:
+            return
+        for buffer in self._pending.get(payload.message_id, ()):
+            buffer.append((key, delta))
+        entry = self._get_entry(payload.message_id)
+        if entry is not None:
+            entry.apply(key, delta)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        self._record(payload, _emoji_key(payload.emoji), 1)
+        if payload.message_id != payload.channel_id or not self.watched_forums:
+            return
+
+        thread = self.bot.get_channel(payload.channel_id)
+        if not isinstance(thread, discord.Thread) or thread.parent_id not in self.watched_forums:
+            return
+        try:
+            # 已缓存的条目刚刚完成增量更新；未缓存时回填的计数已包含本次反应
+            entry = await self.get_starter_reactions(thread)
+        except discord.HTTPException as e:
+            logger.debug(f"无法获取帖子 {thread.id} 的起始消息: {e}")
+            return
+        self.bot.dispatch('starter_reaction_add', thread, entry)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        self._record(payload, _emoji_key(payload.emoji), -1)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear(self, payload: discord.RawReactionClearEvent):
+        self._record(payload, None, None)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload: discord.RawReactionClearEmojiEvent):
+        self._record(payload, _emoji_key(payload.emoji), None)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        if payload.message_id == payload.channel_id:
+            self._drop(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_thread_delete(self, payload: discord.RawThreadDeleteEvent):
+        self._drop(payload.thread_id)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # 重新连接 (非恢复会话) 期间可能错过反应事件，清空缓存以免使用错误的计数
+        if self._thread_forum:
+            logger.info(f"网关重新连接，清空 {len(self._thread_forum)} 个帖子的反应计数缓存")
+        self.forums.clear()
+        self._thread_forum.clear()
+
+
+async def setup(bot: commands.Bot):
+    """异步 setup 函数，用于加载 Cog"""
+    await bot.add_cog(ForumReactionCache(bot))
+    logger.info("ForumReactionCache Cog 已成功加载")
@@ -0,0 +1,343 @@
+import os
+import json
+import struct
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Tuple
+from discord.ext import commands, tasks
+from utils.id_set import IdSet
+from utils.metrics import timed_file_io
+
+logger = logging.getLogger('discord_bot.cogs.removal_exclusion_logic')
+
+DATA_DIR = "data"
+EXCLUSION_LOG_FILE = os.path.join(DATA_DIR, "removal_exclusions.log")
+
+# 旧版存储，仅在首次启动 (尚无 EXCLUSION_LOG_FILE) 时迁移
+LEGACY_REMOVED_DIR = os.path.join(DATA_DIR, "removed")
+LEGACY_REMOVAL_LOG_FILE = os.path.join(DATA_DIR, "role_removal_log.json")
+# 迁移完成前关闭时缓冲区中的记录暂存于此，迁移时与旧版数据一并写入日志
+PREMIGRATION_LOG_FILE = os.path.join(DATA_DIR, "removal_exclusions.premigration.log")
+# 迁移时无法确定所属服务器的旧版记录 ({role_id: [user_id, ...]})，在服务器可用后重试解析
+UNRESOLVED_LEGACY_FILE = os.path.join(DATA_DIR, "removal_exclusions.unresolved.json")
+# 迁移失败后重试的间隔 (秒)
+MIGRATION_RETRY_SECONDS = 300
+
+# 追加写入的二进制记录: 操作类型 (1 添加 / 0 移除), guild_id, role_id, user_id
+_RECORD = struct.Struct('<BQQQ')
+OP_ADD = 1
+OP_REMOVE = 0
+
+# 日志中的记录数超过存活条目数的倍数时进行压缩
+COMPACT_RATIO = 2
+COMPACT_MIN_RECORDS = 1024
+
+# 写回缓冲：点击路径只写入内存，定时或积累到一定数量后批量落盘
+FLUSH_INTERVAL_SECONDS = 5.0
+FLUSH_THRESHOLD = 256
+
+
+class RemovalExclusionLogic(commands.Cog):
+    """
+    统一的自助退出名单服务
+
+    记录用户主动移除过的身份组 (按服务器和身份组区分)，供自动过期替换流程跳过这些用户
+    内存中为每个 (guild_id, role_id) 维护一个 IdSet，变更以二进制记录追加写入磁盘
+    变更先进入内存缓冲区，由后台定时或达到阈值时批量写入，交互回调中不会访问磁盘
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.exclusions: Dict[Tuple[int, int], IdSet] = {}
+        self._loaded = asyncio.Event()
+        self._migration_task = None
+        self._pending: List[bytes] = []
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self._unresolved_task = None
+
+    async def cog_load(self):
+        if os.path.exists(EXCLUSION_LOG_FILE):
+            self._load_log()
+            if os.path.exists(PREMIGRATION_LOG_FILE):
+                # 迁移写入日志后、删除暂存文件前中断，其中的记录已在日志中
+                os.remove(PREMIGRATION_LOG_FILE)
+            self._loaded.set()
+            self._schedule_unresolved_retry()
+        else:
+            # 旧版数据不含服务器ID，需要等待服务器缓存就绪后才能确定身份组所属的服务器
+            self._migration_task = asyncio.create_task(self._migrate_legacy_stores())
+        self.flush_pending.start()
+
+    async def cog_unload(self):
+        self.flush_pending.cancel()
+        for task in (self._migration_task, self._unresolved_task):
+            if task and not task.done():
+                task.cancel()
+        # 关闭前把缓冲区中剩余的记录同步写入磁盘
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            records, self._pending = self._pending, []
+            if self._loaded.is_set():
+                self._append_records(records)
+                logger.info(f"关闭前已写入 {len(records)} 条缓冲的退出记录")
+            else:
+                # 与 flush 相同，迁移完成前不能创建日志文件，否则下次启动会跳过迁移
+                self._append_records(records, PREMIGRATION_LOG_FILE)
+                logger.info(f"迁移尚未完成，关闭前已暂存 {len(records)} 条缓冲的退出记录")
+
+    async def wait_until_loaded(self):
+        """等待退出名单加载 (或首次迁移) 完成"""
+        await self._loaded.wait()
+
+    def _apply(self, op: int, guild_id: int, role_id: int, user_id: int) -> bool:
+        key = (guild_id, role_id)
+        if op == OP_ADD:
+            return self.exclusions.setdefault(key, IdSet()).add(user_id)
+        id_set = self.exclusions.get(key)
+        if id_set is None or not id_set.discard(user_id):
+            return False
+        if not id_set:
+            del self.exclusions[key]
+        return True
+
+    @timed_file_io('removal_exclusions.log', 'read')
+    def _load_log(self):
+        """重放追加日志，必要时压缩"""
+        try:
+            with open(EXCLUSION_LOG_FILE, 'rb') as f:
+                data = f.read()
+        except IOError as e:
+            logger.error(f"读取退出名单日志 {EXCLUSION_LOG_FILE} 失败: {e}")
+            return
+
+        record_count = len(data) // _RECORD.size
+        if len(data) % _RECORD.size:
+            logger.warning(f"退出名单日志 {EXCLUSION_LOG_FILE} 末尾存在不完整的记录，已忽略")
+        for op, guild_id, role_id, user_id in _RECORD.iter_unpack(data[:record_count * _RECORD.size]):
+            self._apply(op, guild_id, role_id, user_id)
+
+        live_count = sum(len(id_set) for id_set in self.exclusions.values())
+        logger.info(f"已加载 {len(self.exclusions)} 个身份组的退出名单，共 {live_count} 条记录")
+        if record_count > COMPACT_MIN_RECORDS and record_count > live_count * COMPACT_RATIO:
+            self._compact()
+
+    @timed_file_io('removal_exclusions.log', 'write')
+    def _compact(self):
+        """将当前内存状态重写为只包含添加记录的新日志"""
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp_path = f"{EXCLUSION_LOG_FILE}.tmp"
+        with open(tmp_path, 'wb') as f:
+            for (guild_id, role_id), id_set in self.exclusions.items():
+                f.write(b''.join(_RECORD.pack(OP_ADD, guild_id, role_id, user_id) for user_id in id_set))
+        os.replace(tmp_path, EXCLUSION_LOG_FILE)
+        logger.info(f"已压缩退出名单日志 {EXCLUSION_LOG_FILE}")
+
+    @timed_file_io('removal_exclusions.log', 'append')
+    def _append_records(self, records: Iterable[bytes], path: str = EXCLUSION_LOG_FILE):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        with open(path, 'ab') as f:
+            f.write(b''.join(records))
+
+    def _buffer(self, record: bytes):
+        self._pending.append(record)
+        if len(self._pending) >= FLUSH_THRESHOLD and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """把缓冲区中的记录追加写入磁盘 (在线程中执行)"""
+        async with self._flush_lock:
+            # 首次迁移完成前不创建日志文件，否则迁移中断后将被误认为已完成
+            if not self._pending or not self._loaded.is_set():
+                return
+            records, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._append_records, records)
+            except Exception as e:
+                # 写入失败时放回缓冲区，保持记录顺序，等待下次重试
+                self._pending[:0] = records
+                logger.error(f"写入退出名单日志失败，{len(records)} 条记录将稍后重试: {e}")
+
+    @tasks.loop(seconds=FLUSH_INTERVAL_SECONDS)
+    async def flush_pending(self):
+        await self.flush()
+
+    def add(self, guild_id: int, role_id: int, user_id: int) -> bool:
+        """记录用户主动移除了某个身份组，返回是否为新记录"""
+        if not self._apply(OP_ADD, guild_id, role_id, user_id):
+            return False
+        self._buffer(_RECORD.pack(OP_ADD, guild_id, role_id, user_id))
+        return True
+
+    def discard(self, guild_id: int, role_id: int, user_id: int) -> bool:
+        """用户重新佩戴了身份组，将其移出退出名单，返回是否确实移除"""
+        if not self._apply(OP_REMOVE, guild_id, role_id, user_id):
+            return False
+        self._buffer(_RECORD.pack(OP_REMOVE, guild_id, role_id, user_id))
+        return True
+
+    def is_excluded(self, guild_id: int, role_id: int, user_id: int) -> bool:
+        id_set = self.exclusions.get((guild_id, role_id))
+        return id_set is not None and user_id in id_set
+
+    def get_excluded(self, guild_id: int, role_ids: Iterable[int]) -> IdSet:
+        """返回主动移除过指定服务器中任意一个给定身份组的用户"""
+        result = IdSet()
+        for role_id in role_ids:
+            id_set = self.exclusions.get((guild_id, role_id))
+            if id_set:
+                result = result.union(id_set)
+        return result
+
+    async def _migrate_legacy_stores(self):
+        """等待服务器缓存就绪后迁移旧版存储；失败时稍后重试，成功前不会标记为已加载"""
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                self._migrate_once()
+                break
+            except Exception as e:
+                logger.error(f"迁移旧版退出名单时发生错误，{MIGRATION_RETRY_SECONDS} 秒后重试: {e}", exc_info=True)
+                await asyncio.sleep(MIGRATION_RETRY_SECONDS)
+        self._loaded.set()
+
+    def _migrate_once(self):
+        """把旧版的 data/removed/ 与 role_removal_log.json 合并迁移到统一的退出名单"""
+        legacy: Dict[int, IdSet] = {}
+        if os.path.isdir(LEGACY_REMOVED_DIR):
+            for fname in os.listdir(LEGACY_REMOVED_DIR):
+                role_id_str, ext = os.path.splitext(fname)
+                if not role_id_str.isdigit():
+                    continue
+                fpath = os.path.join(LEGACY_REMOVED_DIR, fname)
+                try:
+                    if ext == ".bin":
+                        user_ids = IdSet.load(fpath) or IdSet()
+                    elif ext == ".json":
+                        with open(fpath, 'r', encoding='utf-8') as f:
+                            user_ids = IdSet(json.load(f).get("data", []))
+                    else:
+                        continue
+                except Exception as e:
+                    logger.error(f"迁移旧版退出名单 {fpath} 失败: {e}")
+                    continue
+                role_id = int(role_id_str)
+                legacy[role_id] = legacy.get(role_id, IdSet()).union(user_ids)
+
+        try:
+            with open(LEGACY_REMOVAL_LOG_FILE, 'r', encoding='utf-8') as f:
+                for role_id_str, user_id_strs in json.load(f).items():
+                    role_id = int(role_id_str)
+                    legacy[role_id] = legacy.get(role_id, IdSet()).union(IdSet(user_id_strs))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"迁移旧版移除日志 {LEGACY_REMOVAL_LOG_FILE} 失败: {e}")
+
+        # 重试时内存中可能已有部分记录，仍然全部写入日志 (重复的添加记录在重放时没有影响)
+        records, unresolved = self._resolve_legacy(legacy)
+        # 先保存无法解析的记录，再创建日志文件标记迁移完成
+        self._save_unresolved(unresolved)
+
+        # 上次在迁移完成前关闭时暂存的记录，按原顺序排在旧版数据之后
+        try:
+            with open(PREMIGRATION_LOG_FILE, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b''
+        premigration = data[:len(data) - len(data) % _RECORD.size]
+        for op, guild_id, role_id, user_id in _RECORD.iter_unpack(premigration):
+            self._apply(op, guild_id, role_id, user_id)
+        records.append(premigration)
+
+        # 即使没有旧数据也创建日志文件，标记迁移已完成
+        self._append_records(records)
+        if data:
+            os.remove(PREMIGRATION_LOG_FILE)
+        logger.info(f"已从旧版存储迁移 {len(records) - 1} 条退出记录到 {EXCLUSION_LOG_FILE}")
+
+    def _resolve_legacy(self, legacy: Dict[int, IdSet]) -> Tuple[List[bytes], Dict[int, IdSet]]:
+        """
+        为只有身份组ID的旧版记录确定所属服务器并应用到内存
+
+        返回 (日志记录, 无法确定服务器的记录)；服务器暂时不可用或缓存未就绪时身份组无法解析，
+        这些记录需要保留下来稍后重试，而不是丢弃
+        """
+        role_guilds = {}
+        for guild in self.bot.guilds:
+            for role_id in legacy:
+                if role_id not in role_guilds and guild.get_role(role_id):
+                    role_guilds[role_id] = guild.id
+
+        records = []
+        unresolved: Dict[int, IdSet] = {}
+        for role_id, user_ids in legacy.items():
+            guild_id = role_guilds.get(role_id)
+            if guild_id is None:
+                logger.warning(f"无法确定身份组 {role_id} 所属的服务器，其 {len(user_ids)} 条旧版退出记录将保留并稍后重试")
+                unresolved[role_id] = user_ids
+                continue
+            for user_id in user_ids:
+                self._apply(OP_ADD, guild_id, role_id, user_id)
+                records.append(_RECORD.pack(OP_ADD, guild_id, role_id, user_id))
+        return records, unresolved
+
+    def _load_unresolved(self) -> Dict[int, IdSet]:
+        try:
+            with open(UNRESOLVED_LEGACY_FILE, 'r', encoding='utf-8') as f:
+                return {int(role_id): IdSet(user_ids) for role_id, user_ids in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+
+    def _save_unresolved(self, unresolved: Dict[int, IdSet]):
+        """原子地保存无法解析的旧版记录，没有剩余记录时删除文件"""
+        if not unresolved:
+            if os.path.exists(UNRESOLVED_LEGACY_FILE):
+                os.remove(UNRESOLVED_LEGACY_FILE)
+            return
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp_path = f"{UNRESOLVED_LEGACY_FILE}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({str(role_id): list(user_ids) for role_id, user_ids in unresolved.items()}, f)
+        os.replace(tmp_path, UNRESOLVED_LEGACY_FILE)
+
+    def _schedule_unresolved_retry(self):
+        if not os.path.exists(UNRESOLVED_LEGACY_FILE):
+            return
+        if self._unresolved_task is None or self._unresolved_task.done():
+            self._unresolved_task = asyncio.create_task(self._retry_unresolved())
+
+    async def _retry_unresolved(self):
+        """重新解析迁移时无法确定服务器的旧版记录"""
+        await self.bot.wait_until_ready()
+        await self.wait_until_loaded()
+        try:
+            unresolved = self._load_unresolved()
+            if not unresolved:
+                return
+            records, remaining = self._resolve_legacy(unresolved)
+            if records:
+                async with self._flush_lock:
+                    await asyncio.to_thread(self._append_records, records)
+            self._save_unresolved(remaining)
+            logger.info(f"已补充迁移 {len(records)} 条旧版退出记录，仍有 {len(remaining)} 个身份组无法确定所属服务器")
+        except Exception as e:
+            logger.error(f"补充迁移旧版退出记录失败: {e}", exc_info=True)
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild):
+        # 服务器恢复可用后其身份组才能解析
+        if self._loaded.is_set():
+            self._schedule_unresolved_retry()
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        if self._loaded.is_set():
+            self._schedule_unresolved_retry()
+
+
+async def setup(bot: commands.Bot):
+    """异步 setup 函数，用于加载 Cog"""
+    await bot.add_cog(RemovalExclusionLogic(bot))
+    logger.info("RemovalExclusionLogic Cog 已成功加载")
@@ -1,19 +1,42 @@
 import discord
 from discord.ext import commands
 import json
+import asyncio
 import logging
 import os
+import threading
+import time
+from typing import Dict
 from cogs.ui.role_distributor_view import RoleDistributorView
+from utils.interaction_guard import respond, defer
+from utils.metrics import timed_file_io
 
 logger = logging.getLogger('discord_bot.cogs.role_distributor_logic')
 
+# 频道安静多少秒后才重新发送分发器消息，连续的聊天消息只触发一次重发
+STICKY_QUIET_SECONDS = 5.0
+# 频道持续活跃时，距第一条未处理消息最多等待多少秒后强制重发
+STICKY_MAX_DELAY_SECONDS = 60.0
+
 class RoleDistributorLogic(commands.Cog):
     """处理身份组分发器核心逻辑的 Cog"""
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.distributors_file = 'data/role_distributors.json'
         self.distributors = self.load_distributors()
-
+        self._write_lock = threading.Lock()
+        # 频道ID字符串 -> 等待中的重发任务 / 第一条未处理消息的时间
+        self._repost_tasks: Dict[str, asyncio.Task] = {}
+        self._repost_deadlines: Dict[str, float] = {}
+        self._repost_locks: Dict[str, asyncio.Lock] = {}
+
+    def cog_unload(self):
+        for task in self._repost_tasks.values():
+            task.cancel()
+        self._repost_tasks.clear()
+        self._repost_deadlines.clear()
+
+    @timed_file_io('role_distributors.json', 'read')
     def load_distributors(self):
         """从 JSON 文件加载分发器配置"""
         try:
@@ -22,75 +45,85 @@ class RoleDistributorLogic(commands.Cog):
         except (FileNotFoundError, json.JSONDecodeError):
             return {}
 
+    @timed_file_io('role_distributors.json', 'write')
+    def _write_snapshot(self, snapshot: str):
+        """原子地写入一份序列化好的分发器配置"""
+        with self._write_lock:
+            tmp_path = f"{self.distributors_file}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.distributors_file)
+
     def save_distributors(self):
         """将分发器配置保存到 JSON 文件"""
-        with open(self.distributors_file, 'w', encoding='utf-8') as f:
-            json.dump(self.distributors, f, indent=4)
+        self._write_snapshot(json.dumps(self.distributors, indent=4))
+
+    async def save_distributors_async(self):
+        """在事件循环中序列化当前配置的快照，在线程中写入文件"""
+        snapshot = json.dumps(self.distributors, indent=4)
+        try:
+            await asyncio.to_thread(self._write_snapshot, snapshot)
+        except Exception as e:
+            logger.error(f"保存分发器配置失败: {e}")
 
-    async def handle_role_acquisition(self, interaction: discord.Interaction):
-        """处理用户获取身份组的请求"""
-        await interaction.response.defer(ephemeral=True)
+    async def handle_role_acquisition(self, interaction: discord.Interaction) -> str:
+        """处理用户获取身份组的请求，返回回复给用户的消息"""
+        await defer(interaction, ephemeral=True)
         channel_id_str = str(interaction.channel_id)
 
         if channel_id_str not in self.distributors:
-            await interaction.followup.send("此频道没有配置身份组分发器", ephemeral=True)
-            return
+            return await respond(interaction, "此频道没有配置身份组分发器")
 
         config = self.distributors[channel_id_str]
         role_id = config.get('role_id')
         role = interaction.guild.get_role(role_id)
 
         if not role:
-            await interaction.followup.send("配置的身份组无效，请联系管理员", ephemeral=True)
-            return
+            return await respond(interaction, "配置的身份组无效，请联系管理员")
 
         member = interaction.user
         if role in member.roles:
-            await interaction.followup.send(f"您已经拥有 **{role.name}** 身份组", ephemeral=True)
-        else:
-            try:
-                await member.add_roles(role, reason="通过身份组分发器获取")
-                await interaction.followup.send(f"成功获取 **{role.name}** 身份组！", ephemeral=True)
-            except discord.Forbidden:
-                await interaction.followup.send("机器人权限不足，无法为您添加身份组", ephemeral=True)
-
-    async def handle_role_release(self, interaction: discord.Interaction):
-        """处理用户退出身份组的请求"""
-        await interaction.response.defer(ephemeral=True)
+            return await respond(interaction, f"您已经拥有 **{role.name}** 身份组")
+        try:
+            await member.add_roles(role, reason="通过身份组分发器获取")
+            return await respond(interaction, f"成功获取 **{role.name}** 身份组！")
+        except discord.Forbidden:
+            return await respond(interaction, "机器人权限不足，无法为您添加身份组")
+
+    async def handle_role_release(self, interaction: discord.Interaction) -> str:
+        """处理用户退出身份组的请求，返回回复给用户的消息"""
+        await defer(interaction, ephemeral=True)
         channel_id_str = str(interaction.channel_id)
 
         if channel_id_str not in self.distributors:
-            await interaction.followup.send("此频道没有配置身份组分发器", ephemeral=True)
-            return
+            return await respond(interaction, "此频道没有配置身份组分发器")
 
         config = self.distributors[channel_id_str]
         role_id = config.get('role_id')
         role = interaction.guild.get_role(role_id)
 
         if not role:
-            await interaction.followup.send("配置的身份组无效，请联系管理员", ephemeral=True)
-            return
+            return await respond(interaction, "配置的身份组无效，请联系管理员")
 
         member = interaction.user
         if role not in member.roles:
-            await interaction.followup.send(f"您不拥有 **{role.name}** 身份组", ephemeral=True)
-        else:
-            try:
-                await member.remove_roles(role, reason="通过身份组分发器退出")
-                await interaction.followup.send(f"已成功退出 **{role.name}** 身份组", ephemeral=True)
-            except discord.Forbidden:
-                await interaction.followup.send("机器人权限不足，无法为您移除身份组", ephemeral=True)
+            return await respond(interaction, f"您不拥有 **{role.name}** 身份组")
+        try:
+            await member.remove_roles(role, reason="通过身份组分发器退出")
+            return await respond(interaction, f"已成功退出 **{role.name}** 身份组")
+        except discord.Forbidden:
+            return await respond(interaction, "机器人权限不足，无法为您移除身份组")
 
     async def delete_distributor(self, channel: discord.TextChannel):
         """安全地删除一个频道的分发器配置并删除其消息"""
         channel_id_str = str(channel.id)
         if channel_id_str in self.distributors:
+            self._cancel_repost(channel_id_str)
             config = self.distributors.pop(channel_id_str)
             self.save_distributors()
             
             try:
-                message = await channel.fetch_message(config["message_id"])
-                await message.delete()
+                await channel.get_partial_message(config["message_id"]).delete()
                 logger.info(f"成功删除了频道 {channel.id} 的身份组分发器消息")
             except discord.NotFound:
                 logger.warning(f"试图删除时，在频道 {channel.id} 中找不到分发器消息 (ID: {config['message_id']})")
@@ -100,45 +133,88 @@ class RoleDistributorLogic(commands.Cog):
             return True
         return False
 
+    def _cancel_repost(self, channel_id_str: str):
+        task = self._repost_tasks.pop(channel_id_str, None)
+        if task:
+            task.cancel()
+        self._repost_deadlines.pop(channel_id_str, None)
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
-        """监听消息事件，以保持分发器消息在频道底部"""
+        """监听消息事件，以保持分发器消息在频道底部 (按频道去抖动，安静一段时间后才重发)"""
         if message.author.bot:
             return
 
         channel_id_str = str(message.channel.id)
-        if channel_id_str in self.distributors:
-            config = self.distributors[channel_id_str]
-            
-            # 删除旧消息
-            try:
-                old_message = await message.channel.fetch_message(config["message_id"])
-                await old_message.delete()
-            except discord.NotFound:
-                logger.warning(f"在频道 {channel_id_str} 中找不到旧的分发消息 (ID: {config['message_id']})，可能已被手动删除")
-            except discord.Forbidden:
-                logger.error(f"机器人没有权限删除频道 {channel_id_str} 中的消息")
-                return # 如果无法删除，则不继续以避免垃圾信息
+        if channel_id_str not in self.distributors:
+            return
 
-            # 发送新消息
-            try:
-                embed = discord.Embed(title=config["title"], description=config["content"], color=discord.Color.blue())
-                if message.guild.icon:
-                    embed.set_author(name=config["name"], icon_url=message.guild.icon.url)
-                else:
-                    embed.set_author(name=config["name"])
-                
-                view = RoleDistributorView()
-                new_message = await message.channel.send(embed=embed, view=view)
-                
-                # 更新配置中的消息ID
-                self.distributors[channel_id_str]["message_id"] = new_message.id
-                self.save_distributors()
-                
-            except discord.Forbidden:
-                logger.error(f"机器人没有权限在频道 {channel_id_str} 中发送新的分发消息")
-            except Exception as e:
-                logger.error(f"重新发送分发消息时出错: {e}", exc_info=True)
+        now = time.monotonic()
+        deadline = self._repost_deadlines.setdefault(channel_id_str, now + STICKY_MAX_DELAY_SECONDS)
+        delay = max(0.0, min(STICKY_QUIET_SECONDS, deadline - now))
+
+        pending = self._repost_tasks.get(channel_id_str)
+        if pending:
+            pending.cancel()
+        self._repost_tasks[channel_id_str] = asyncio.create_task(
+            self._repost_after_quiet(message.channel, channel_id_str, delay)
+        )
+
+    async def _repost_after_quiet(self, channel: discord.abc.Messageable, channel_id_str: str, delay: float):
+        """等待频道安静后重发分发器消息；等待期间有新消息时本任务会被取消并重新计时"""
+        await asyncio.sleep(delay)
+
+        # 开始重发后不再响应取消，新的消息会排队等待下一次重发
+        if self._repost_tasks.get(channel_id_str) is asyncio.current_task():
+            del self._repost_tasks[channel_id_str]
+        self._repost_deadlines.pop(channel_id_str, None)
+
+        lock = self._repost_locks.setdefault(channel_id_str, asyncio.Lock())
+        async with lock:
+            await self._repost(channel, channel_id_str)
+
+    async def _repost(self, channel: discord.abc.Messageable, channel_id_str: str):
+        """删除旧的分发器消息并在频道底部发送新消息"""
+        config = self.distributors.get(channel_id_str)
+        if config is None:
+            return
+
+        # 删除旧消息 (通过部分消息对象直接删除，无需先获取)
+        try:
+            await channel.get_partial_message(config["message_id"]).delete()
+        except discord.NotFound:
+            logger.warning(f"在频道 {channel_id_str} 中找不到旧的分发消息 (ID: {config['message_id']})，可能已被手动删除")
+        except discord.Forbidden:
+            logger.error(f"机器人没有权限删除频道 {channel_id_str} 中的消息")
+            return # 如果无法删除，则不继续以避免垃圾信息
+        except discord.HTTPException as e:
+            logger.error(f"删除频道 {channel_id_str} 中的旧分发消息失败: {e}")
+            return
+
+        # 发送新消息
+        try:
+            embed = discord.Embed(title=config["title"], description=config["content"], color=discord.Color.blue())
+            if channel.guild.icon:
+                embed.set_author(name=config["name"], icon_url=channel.guild.icon.url)
+            else:
+                embed.set_author(name=config["name"])
+            
+            view = RoleDistributorView()
+            new_message = await channel.send(embed=embed, view=view)
+            
+            # 发送期间分发器可能已被删除，此时清理刚发送的消息
+            if self.distributors.get(channel_id_str) is not config:
+                await new_message.delete()
+                return
+
+            # 更新配置中的消息ID
+            config["message_id"] = new_message.id
+            await self.save_distributors_async()
+            
+        except discord.Forbidden:
+            logger.error(f"机器人没有权限在频道 {channel_id_str} 中发送新的分发消息")
+        except Exception as e:
+            logger.error(f"重新发送分发消息时出错: {e}", exc_info=True)
 
 async def setup(bot: commands.Bot):
     """异步 setup 函数，用于加载 Cog"""
@@ -4,6 +4,7 @@ import logging
 from typing import Dict, Any, Optional, Tuple
 from discord.ext import commands
 import asyncio
+from utils.metrics import timed_file_io
 
 logger = logging.getLogger(__name__)
 
@@ -15,14 +16,18 @@ class RoleMappingLogic(commands.Cog):
         self.file_path = 'data/role_mapping.json'
         self.lock = asyncio.Lock()
         self.mappings: Dict[str, Any] = {}
+        # role_id -> (group_id, role_name) 的倒排索引，随映射变更重建
+        self.role_index: Dict[str, Tuple[str, str]] = {}
         self.load_mappings()
 
+    @timed_file_io('role_mapping.json', 'read')
     def load_mappings(self):
         """从 JSON 文件加载角色映射"""
         if not os.path.exists(self.file_path):
             logger.warning(f"角色映射文件不存在: {self.file_path}，将创建一个空文件。")
             self.mappings = {}
             self.save_mappings()
+            self._rebuild_index()
             return
 
         try:
@@ -32,7 +37,18 @@ class RoleMappingLogic(commands.Cog):
         except (json.JSONDecodeError, IOError) as e:
             logger.error(f"加载角色映射文件 {self.file_path} 失败: {e}", exc_info=True)
             self.mappings = {}
-
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        """根据当前映射重建 role_id -> (group_id, role_name) 索引"""
+        index: Dict[str, Tuple[str, str]] = {}
+        for group_id, group in self.mappings.items():
+            for role_id, role_name in group.get("data", {}).items():
+                # 与原先按组顺序查找的行为保持一致：同一角色出现在多个组时取第一个
+                index.setdefault(str(role_id), (group_id, role_name))
+        self.role_index = index
+
+    @timed_file_io('role_mapping.json', 'write')
     def save_mappings(self):
         """将当前角色映射保存到 JSON 文件"""
         try:
@@ -65,6 +81,7 @@ class RoleMappingLogic(commands.Cog):
             group_data[role_id] = role_name
             self.mappings[group_id]["data"] = group_data
             self.save_mappings()
+            self._rebuild_index()
             return True, f"成功将角色 '{role_name}' ({role_id}) 添加到组 '{self.mappings[group_id]['name']}'。"
 
     async def remove_role(self, group_id: str, role_id: str) -> Tuple[bool, str]:
@@ -89,6 +106,7 @@ class RoleMappingLogic(commands.Cog):
             removed_role_name = group_data.pop(role_id)
             self.mappings[group_id]["data"] = group_data
             self.save_mappings()
+            self._rebuild_index()
             return True, f"成功从组 '{self.mappings[group_id]['name']}' 中移除了角色 '{removed_role_name}' ({role_id})。"
 
     def get_all_group_ids(self) -> list:
@@ -98,6 +116,15 @@ class RoleMappingLogic(commands.Cog):
             for key, value in self.mappings.items()
         ]
 
+    def get_role_entry(self, role_id) -> Optional[Tuple[str, str]]:
+        """通过索引查找角色所属的组 ID 和角色名称，未受管理时返回 None"""
+        return self.role_index.get(str(role_id))
+
+    def get_role_name(self, role_id) -> Optional[str]:
+        """通过索引查找角色名称，未受管理时返回 None"""
+        entry = self.role_index.get(str(role_id))
+        return entry[1] if entry else None
+
     def get_roles_in_group(self, group_id: str) -> list:
         """获取指定组内的所有角色 ID 和名称"""
         if group_id not in self.mappings:
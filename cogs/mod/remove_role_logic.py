@@ -1,14 +1,22 @@
 import discord
-import os
-import json
 import logging
 from discord import Interaction, SelectOption
 from discord.ui import Select, View
-from .remove_role_state import save_panel_state, load_panel_state
+from .remove_role_state import save_panel_state, load_panel_state, set_panel_channel
+from utils.interaction_guard import respond
 
 logger = logging.getLogger('discord_bot.cogs.remove_role')
 
+REMOVE_ROLE_SELECT_PREFIX = "remove_role_select"
+
 class RemoveRoleSelectView(View):
+    """
+    自助移除面板的选单布局
+
+    此视图只负责生成组件，不注册回调：所有 "remove_role_select:<message_id>" 交互
+    由 RoleAssigner 的 on_interaction 监听器统一解析并交给 handle_remove_role_select 处理，
+    因此无论存在多少面板，启动时都不需要为每个面板注册持久化视图
+    """
     def __init__(self, roles: list[discord.Role], persist_list: bool = False, custom_id_suffix: str = ""):
         super().__init__(timeout=None)
         self.roles = roles
@@ -18,8 +26,7 @@ class RemoveRoleSelectView(View):
         # 基础 ID: "remove_role_select"
         # 后缀: 通常是消息 ID，例如 ":1234567890"
         # 最终 custom_id: "remove_role_select:1234567890"
-        base_custom_id = "remove_role_select"
-        final_custom_id = f"{base_custom_id}{custom_id_suffix}"
+        final_custom_id = f"{REMOVE_ROLE_SELECT_PREFIX}{custom_id_suffix}"
 
         options = [
             SelectOption(label=getattr(role, 'name', f'ID: {role.id}'), value=str(role.id), description=f"点击移除身份组: {getattr(role, 'name', f'ID: {role.id}')}")
@@ -33,88 +40,74 @@ class RemoveRoleSelectView(View):
             options=options,
             custom_id=final_custom_id
         )
-        select.callback = self.select_callback
         self.add_item(select)
 
-    async def select_callback(self, interaction: Interaction):
-        # 从交互中获取消息 ID
-        message_id = interaction.message.id
-        
-        # 加载此面板的状态
-        panel_state = load_panel_state(message_id)
-        if not panel_state:
-            await interaction.response.send_message("错误：找不到此面板的状态信息，可能已被删除或已过期。", ephemeral=True)
-            logger.warning(f"无法为消息 ID {message_id} 加载面板状态。")
-            return
 
-        persist_list = panel_state.get('persist_list', False)
-        
-        selected_role_id = int(interaction.data['values'][0])
-        guild = interaction.guild
-        role = guild.get_role(selected_role_id)
-        member = interaction.user
+def parse_remove_role_custom_id(custom_id: str):
+    """解析 "remove_role_select:<message_id>"，格式不符时返回 None"""
+    prefix, _, message_id_str = custom_id.partition(':')
+    if prefix != REMOVE_ROLE_SELECT_PREFIX or not message_id_str.isdigit():
+        return None
+    return int(message_id_str)
 
-        if not role:
-            await interaction.response.send_message("选择的身份组不存在或已被删除", ephemeral=True)
-            return
 
-        # 确认所选角色是否是此面板的一部分
-        if role.id not in panel_state.get('role_ids', []):
-            await interaction.response.send_message("错误：无效的选择。", ephemeral=True)
-            logger.warning(f"用户 {member.name} 尝试从未经授权的面板 (msg_id: {message_id}) 移除角色 (role_id: {role.id})")
-            return
+async def handle_remove_role_select(interaction: Interaction, message_id: int) -> str:
+    """处理自助移除面板的选单交互，返回回复给用户的消息"""
+    # 加载此面板的状态
+    panel_state = load_panel_state(message_id)
+    if not panel_state:
+        logger.warning(f"无法为消息 ID {message_id} 加载面板状态。")
+        return await respond(interaction, "错误：找不到此面板的状态信息，可能已被删除或已过期。")
 
-        if role not in member.roles:
-            await interaction.response.send_message(f"你没有身份组：{role.name}", ephemeral=True)
-            return
+    persist_list = panel_state.get('persist_list', False)
+    if 'channel_id' not in panel_state:
+        set_panel_channel(message_id, interaction.channel_id)
+    
+    selected_role_id = int(interaction.data['values'][0])
+    guild = interaction.guild
+    role = guild.get_role(selected_role_id)
+    member = interaction.user
 
-        try:
-            await member.remove_roles(role, reason="用户自助移除")
-            logger.info(f"用户 {member.name} ({member.id}) 成功移除身份组 {role.name} ({role.id})")
-            await interaction.response.send_message(f"已移除你的身份组：{role.name}", ephemeral=True)
-            
-            await send_remove_role_log(
-                interaction,
-                role.id,
-                "自助移除身份组",
-                extra_lines=[f"身份组名: {role.name}"]
-            )
+    if not role:
+        return await respond(interaction, "选择的身份组不存在或已被删除")
 
-            if persist_list:
-                self.persist_user_removal(role, member)
+    # 确认所选角色是否是此面板的一部分
+    if role.id not in panel_state.get('role_ids', []):
+        logger.warning(f"用户 {member.name} 尝试从未经授权的面板 (msg_id: {message_id}) 移除角色 (role_id: {role.id})")
+        return await respond(interaction, "错误：无效的选择。")
 
-        except discord.Forbidden:
-            await interaction.response.send_message("机器人权限不足，无法移除该身份组", ephemeral=True)
-        except Exception as e:
-            await interaction.response.send_message(f"移除身份组时发生错误：{e}", ephemeral=True)
-            logger.error(f"用户 {member.name} ({member.id}) 移除身份组 {role.name} ({role.id}) 时发生错误: {e}", exc_info=True)
+    if role not in member.roles:
+        return await respond(interaction, f"你没有身份组：{role.name}")
 
-    def persist_user_removal(self, role: discord.Role, member: discord.Member):
-        role_id_str = str(role.id)
-        data_dir = "data"
-        file_path = os.path.join(data_dir, f"removed/{role_id_str}.json")
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    try:
+        await member.remove_roles(role, reason="用户自助移除")
+        logger.info(f"用户 {member.name} ({member.id}) 成功移除身份组 {role.name} ({role.id})")
+        reply = await respond(interaction, f"已移除你的身份组：{role.name}")
+        
+        await send_remove_role_log(
+            interaction,
+            role.id,
+            "自助移除身份组",
+            extra_lines=[f"身份组名: {role.name}"]
+        )
 
-        try:
-            if os.path.exists(file_path):
-                with open(file_path, "r", encoding="utf-8") as f:
-                    role_data = json.load(f)
-            else:
-                role_data = {}
-        except (json.JSONDecodeError, IOError):
-            role_data = {}
+        if persist_list:
+            persist_user_removal(interaction, role, member)
+        return reply
 
-        if "roleid" not in role_data:
-            role_data["roleid"] = role_id_str
-        if "data" not in role_data or not isinstance(role_data.get("data"), list):
-            role_data["data"] = []
+    except discord.Forbidden:
+        return await respond(interaction, "机器人权限不足，无法移除该身份组")
+    except Exception as e:
+        logger.error(f"用户 {member.name} ({member.id}) 移除身份组 {role.name} ({role.id}) 时发生错误: {e}", exc_info=True)
+        return await respond(interaction, f"移除身份组时发生错误：{e}")
 
-        user_id_str = str(member.id)
-        if user_id_str not in role_data["data"]:
-            role_data["data"].append(user_id_str)
 
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(role_data, f, ensure_ascii=False, indent=2)
+def persist_user_removal(interaction: Interaction, role: discord.Role, member: discord.Member):
+    exclusion_cog = interaction.client.get_cog("RemovalExclusionLogic")
+    if not exclusion_cog:
+        logger.error(f"RemovalExclusionLogic 未加载，无法记录用户 {member.id} 退出身份组 {role.id}")
+        return
+    exclusion_cog.add(interaction.guild.id, role.id, member.id)
 
 
 async def handle_remove_role(interaction: Interaction, role_ids_str: str, persist_list: bool = False):
@@ -153,8 +146,6 @@ async def handle_remove_role(interaction: Interaction, role_ids_str: str, persis
     )
     embed.set_footer(text="枫叶 丨 身份组移除")
 
-    view = RemoveRoleSelectView(roles, persist_list, custom_id_suffix="")
-    
     # 发送一个占位消息，以便稍后编辑并添加正确的视图
     try:
         # 先用一个不带 view 的 embed 发送，获取 message 对象
@@ -170,9 +161,11 @@ async def handle_remove_role(interaction: Interaction, role_ids_str: str, persis
 
     # 现在我们有了 message_id，可以创建带有正确 custom_id 的视图
     final_view = RemoveRoleSelectView(roles, persist_list, custom_id_suffix=f":{message_id}")
+    # 交互由监听器统一路由，停止视图以免 discord.py 为每个面板常驻一个 View 对象
+    final_view.stop()
 
     # 保存状态
-    save_panel_state(message_id, role_ids_for_state, persist_list)
+    save_panel_state(message_id, role_ids_for_state, persist_list, channel_id=public_message.channel.id)
     await public_message.edit(embed=embed, view=final_view)
     await interaction.edit_original_response(content="移除角色面板已成功创建！")
 
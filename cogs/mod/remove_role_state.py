@@ -1,62 +1,152 @@
 import json
 import os
+import asyncio
 import logging
+import threading
 from typing import List, Dict, Optional
+from utils.metrics import timed_file_io
 
 logger = logging.getLogger('discord_bot.cogs.remove_role_state')
 
 STATE_FILE_PATH = os.path.join('data', 'remove_role_panels.json')
 
+# 面板状态常驻内存 (message_id 字符串 -> 状态)，启动时加载一次
+# 变更后延迟批量写回，多个连续变更只触发一次原子写入
+FLUSH_DELAY_SECONDS = 2.0
+
+_panels: Dict[str, Dict] = {}
+_loaded = False
+_dirty = False
+_flush_handle: Optional[asyncio.TimerHandle] = None
+_write_lock = threading.Lock()
+
 def _ensure_data_dir_exists():
     """确保 data 目录存在"""
     os.makedirs(os.path.dirname(STATE_FILE_PATH), exist_ok=True)
 
-def save_panel_state(message_id: int, role_ids: List[int], persist_list: bool):
-    """保存一个移除角色面板的状态"""
-    _ensure_data_dir_exists()
+@timed_file_io('remove_role_panels.json', 'read')
+def load_panel_registry() -> int:
+    """从文件加载全部面板状态到内存，返回面板数量"""
+    global _panels, _loaded, _dirty
     try:
         with open(STATE_FILE_PATH, 'r', encoding='utf-8') as f:
-            all_panels = json.load(f)
+            data = json.load(f)
+        _panels = data if isinstance(data, dict) else {}
     except (FileNotFoundError, json.JSONDecodeError):
-        all_panels = {}
+        _panels = {}
+    _loaded = True
+    _dirty = False
+    logger.info(f"已加载 {len(_panels)} 个移除角色面板的状态")
+    return len(_panels)
+
+def _ensure_loaded():
+    if not _loaded:
+        load_panel_registry()
+
+@timed_file_io('remove_role_panels.json', 'write')
+def _write_snapshot(snapshot: str):
+    """原子地写入一份序列化好的面板状态"""
+    _ensure_data_dir_exists()
+    with _write_lock:
+        tmp_path = f"{STATE_FILE_PATH}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(snapshot)
+        os.replace(tmp_path, STATE_FILE_PATH)
+
+def flush_panel_states():
+    """立即把内存中的面板状态写回文件 (仅在有未保存的变更时)"""
+    global _dirty, _flush_handle
+    if _flush_handle is not None:
+        _flush_handle.cancel()
+        _flush_handle = None
+    if not _dirty:
+        return
+    _dirty = False
+    _write_snapshot(json.dumps(_panels, indent=2, ensure_ascii=False))
+    logger.debug(f"已写回 {len(_panels)} 个移除角色面板的状态")
+
+def _flush_scheduled():
+    """事件循环中的延迟写回：在主线程序列化快照，在线程池中写盘"""
+    global _dirty, _flush_handle
+    _flush_handle = None
+    if not _dirty:
+        return
+    _dirty = False
+    snapshot = json.dumps(_panels, indent=2, ensure_ascii=False)
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(None, _write_snapshot, snapshot)
+    future.add_done_callback(_on_write_done)
+
+def _on_write_done(future: asyncio.Future):
+    global _dirty
+    # 被取消的 future 调用 exception() 会抛出 CancelledError，需先检查
+    if future.cancelled():
+        logger.warning("写回移除角色面板状态的任务被取消，稍后重试")
+    elif future.exception():
+        logger.error(f"写回移除角色面板状态失败: {future.exception()}")
+    else:
+        return
+    _dirty = True
+    _schedule_flush()
+
+def _schedule_flush():
+    global _dirty, _flush_handle
+    _dirty = True
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # 不在事件循环中 (例如脚本调用)，直接同步写入
+        flush_panel_states()
+        return
+    if _flush_handle is None:
+        _flush_handle = loop.call_later(FLUSH_DELAY_SECONDS, _flush_scheduled)
 
-    all_panels[str(message_id)] = {
+def save_panel_state(message_id: int, role_ids: List[int], persist_list: bool, channel_id: Optional[int] = None):
+    """保存一个移除角色面板的状态 (channel_id 用于清理已删除的面板)"""
+    _ensure_loaded()
+    state = {
         'role_ids': role_ids,
         'persist_list': persist_list
     }
-
-    with open(STATE_FILE_PATH, 'w', encoding='utf-8') as f:
-        json.dump(all_panels, f, indent=2, ensure_ascii=False)
+    if channel_id is not None:
+        state['channel_id'] = channel_id
+    _panels[str(message_id)] = state
+    _schedule_flush()
     logger.info(f"已为消息 ID {message_id} 保存面板状态")
 
 def load_panel_state(message_id: int) -> Optional[Dict]:
     """加载指定移除角色面板的状态"""
-    try:
-        with open(STATE_FILE_PATH, 'r', encoding='utf-8') as f:
-            all_panels = json.load(f)
-        return all_panels.get(str(message_id))
-    except (FileNotFoundError, json.JSONDecodeError):
-        return None
+    _ensure_loaded()
+    return _panels.get(str(message_id))
 
 def load_all_panel_states() -> Dict[str, Dict]:
     """加载所有移除角色面板的状态"""
-    try:
-        with open(STATE_FILE_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+    _ensure_loaded()
+    return dict(_panels)
+
+def set_panel_channel(message_id: int, channel_id: int):
+    """为缺少频道信息的旧面板补记所在频道"""
+    _ensure_loaded()
+    state = _panels.get(str(message_id))
+    if state is not None and state.get('channel_id') != channel_id:
+        state['channel_id'] = channel_id
+        _schedule_flush()
 
 def remove_panel_state(message_id: int):
     """移除一个移除角色面板的状态"""
-    _ensure_data_dir_exists()
-    try:
-        with open(STATE_FILE_PATH, 'r', encoding='utf-8') as f:
-            all_panels = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return
+    _ensure_loaded()
+    if _panels.pop(str(message_id), None) is not None:
+        _schedule_flush()
+        logger.info(f"已为消息 ID {message_id} 移除面板状态")
 
-    if str(message_id) in all_panels:
-        del all_panels[str(message_id)]
-        with open(STATE_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(all_panels, f, indent=2, ensure_ascii=False)
-        logger.info(f"已为消息 ID {message_id} 移除面板状态")
\ No newline at end of file
+def remove_panel_states(message_ids) -> int:
+    """批量移除面板状态，返回实际移除的数量"""
+    _ensure_loaded()
+    removed = 0
+    for message_id in message_ids:
+        if _panels.pop(str(message_id), None) is not None:
+            removed += 1
+    if removed:
+        _schedule_flush()
+        logger.info(f"已批量移除 {removed} 个面板状态")
+    return removed
@@ -9,6 +9,11 @@ import os
 import random
 from datetime import datetime
 from utils.progress_utils import create_progress_bar
+from cogs.tasks.user_role_store import add_user_roles, run_locked
+from utils.user_resolver import user_resolver
+from utils.report_utils import text_attachment
+from utils.interaction_guard import respond, defer
+from utils.metrics import timed_file_io, BULK_OPERATIONS
 import asyncio
 
 logger = logging.getLogger('discord_bot.cogs.role_assigner_logic')
@@ -21,6 +26,7 @@ def _ensure_data_dir():
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
+@timed_file_io('role_assignments.json', 'read')
 def _load_assignment_log():
     """加载分配日志"""
     _ensure_data_dir()
@@ -40,6 +46,7 @@ def _load_assignment_log():
         return []
 
 
+@timed_file_io('role_assignments.json', 'write')
 def _save_assignment_log(log_data):
     """保存分配日志"""
     _ensure_data_dir()
@@ -69,7 +76,7 @@ async def handle_assign_roles(interaction: Interaction, role_id_str: str = None,
         history_op = next((op for op in log_data if op[0] == operation_id), None)
 
         if not history_op:
-            await interaction.response.send_message(f"错误：未找到操作ID为 `{operation_id}` 的历史记录", ephemeral=True)
+            await respond(interaction, f"错误：未找到操作ID为 `{operation_id}` 的历史记录")
             return
         
         # 从历史记录中提取所有涉及的 role_id
@@ -86,11 +93,11 @@ async def handle_assign_roles(interaction: Interaction, role_id_str: str = None,
         role_id_str_2 = role_id_strs_from_history[2] if len(role_id_strs_from_history) > 2 else None
         
         if not any([role_id_str, role_id_str_1, role_id_str_2]):
-            await interaction.response.send_message(f"错误：操作ID `{operation_id}` 的历史记录中不包含有效的身份组信息", ephemeral=True)
+            await respond(interaction, f"错误：操作ID `{operation_id}` 的历史记录中不包含有效的身份组信息")
             return
             
     elif not role_id_str:
-        await interaction.response.send_message("错误：必须提供身份组ID或有效的操作ID", ephemeral=True)
+        await respond(interaction, "错误：必须提供身份组ID或有效的操作ID")
         return
 
     # 如果不是基于历史操作，则生成新的 operation_id
@@ -121,7 +128,8 @@ async def handle_assign_roles(interaction: Interaction, role_id_str: str = None,
 
     # 检查所有服务器中的身份组状态
     all_valid = all(not status["invalid"] for status in role_status.values())
-    await interaction.response.defer(ephemeral=not all_valid)
+    # 校验耗时较长时 ack_budget 可能已经自动延迟响应
+    await defer(interaction, ephemeral=not all_valid)
     
     # 创建验证结果Embed
     verify_embed = discord.Embed(
@@ -237,9 +245,8 @@ async def handle_assign_roles(interaction: Interaction, role_id_str: str = None,
 
     if message_link:
         # 解析消息链接并提取用户 ID
-        if not interaction.response.is_done():
-            await interaction.response.defer(ephemeral=True)
-        
+        await defer(interaction, ephemeral=True)
+
         match = re.match(r'https://discord\.com/channels/(\d+)/(\d+)/(\d+)', message_link)
         if not match:
             await interaction.followup.send("错误：提供的消息链接格式无效", ephemeral=True)
@@ -290,13 +297,13 @@ async def handle_assign_roles(interaction: Interaction, role_id_str: str = None,
                 invalid_ids.append(uid_str)
     else:
         # 如果两者都未提供
-        await interaction.response.send_message("错误：请提供用户 ID 列表或有效的消息链接", ephemeral=True)
+        await respond(interaction, "错误：请提供用户 ID 列表或有效的消息链接")
         return
 
     # 去重
     user_ids = list(set(user_ids))
     if not user_ids:
-        await interaction.response.send_message("错误：未能提取到任何有效的用户 ID", ephemeral=True)
+        await respond(interaction, "错误：未能提取到任何有效的用户 ID")
         return
 
     all_assigned = []
@@ -354,15 +361,16 @@ async def handle_assign_roles(interaction: Interaction, role_id_str: str = None,
                     role_names = ", ".join([f'"{r.name}" ({r.id})' for r in current_roles])
                     assigned_users.append(f'{g.name}: {member.name}#{member.discriminator}')
                     successfully_assigned_ids.append(member.id)
+                    BULK_OPERATIONS.inc('assign_roles', 'success')
                     logger.info(f'在服务器 {g.name} 成功为 {member.name} 分配了 {role_names} 身份组')
             except discord.NotFound:
-                failed_users.append(f'{g.name}: {user_id} (未找到)')
+                failed_users.append((user_id, '未找到'))
                 logger.warning(f'在服务器 {g.name} 未找到 ID 为 {user_id} 的用户')
             except discord.Forbidden:
-                failed_users.append(f'{g.name}: {user_id} (权限不足)')
+                failed_users.append((user_id, '权限不足'))
                 logger.error(f'在服务器 {g.name} 机器人权限不足，无法为 ID 为 {user_id} 的用户分配身份组')
             except Exception as e:
-                failed_users.append(f'{g.name}: {user_id} (未知错误: {e})')
+                failed_users.append((user_id, f'未知错误: {e}'))
                 logger.error(f'在服务器 {g.name} 为 ID 为 {user_id} 的用户分配身份组时发生未知错误: {e}', exc_info=True)
             
             processed_users += 1
@@ -371,6 +379,8 @@ async def handle_assign_roles(interaction: Interaction, role_id_str: str = None,
                 await progress_message.edit(embed=progress_embed)
                 await asyncio.sleep(0.5) # 防止速率限制
 
+        if failed_users:
+            BULK_OPERATIONS.inc('assign_roles', 'failure', amount=len(failed_users))
         if successfully_assigned_ids:
             all_log_entries.append({
                 "guild_id": g.id,
@@ -383,7 +393,10 @@ async def handle_assign_roles(interaction: Interaction, role_id_str: str = None,
             })
         
         all_assigned.extend(assigned_users)
-        all_failed.extend(failed_users)
+        if failed_users:
+            # 失败用户的名称优先取自缓存，未命中的并发获取
+            failed_names = await user_resolver.resolve(interaction.client, [uid for uid, _ in failed_users], g)
+            all_failed.extend(f'{g.name}: {failed_names[uid]} ({uid}) ({reason})' for uid, reason in failed_users)
     
     await progress_message.delete()
 
@@ -397,6 +410,8 @@ async def handle_assign_roles(interaction: Interaction, role_id_str: str = None,
 
             # 检查是否是基于历史操作的补充
             existing_op_index = -1
+            # 需要增量写入以用户为中心视图的 (guild_id, role_ids, user_ids)
+            view_updates = []
             for i, op in enumerate(log_data):
                 if op[0] == operation_id:
                     existing_op_index = i
@@ -419,10 +434,12 @@ async def handle_assign_roles(interaction: Interaction, role_id_str: str = None,
                         existing_user_ids = set(history_guild_entry.get('assigned_user_ids', []))
                         existing_user_ids.update(new_user_ids)
                         history_guild_entry['assigned_user_ids'] = list(existing_user_ids)
+                        view_updates.append((guild_id, history_guild_entry.get('role_ids', []), new_user_ids))
                         logger.debug(f"已将 {len(new_user_ids)} 名新用户追加到服务器 {guild_id} 的记录中")
                     else:
                         # 如果历史记录中没有这个服务器的条目（理论上不应该发生），则添加
                         log_data[existing_op_index][1]['data'].append(new_entry)
+                        view_updates.append((guild_id, new_entry['role_ids'], new_user_ids))
                         logger.warning(f"在操作 {operation_id} 的历史记录中未找到服务器 {guild_id} 的条目，已新建")
 
             else:
@@ -439,10 +456,19 @@ async def handle_assign_roles(interaction: Interaction, role_id_str: str = None,
                     }
                 ]
                 log_data.append(operation_entry)
+                view_updates.extend(
+                    (entry['guild_id'], entry['role_ids'], entry['assigned_user_ids'])
+                    for entry in all_log_entries
+                )
 
             _save_assignment_log(log_data)
             logger.info(f"已成功将操作ID {operation_id} 的分配记录保存到 {ASSIGNMENT_LOG_FILE}")
 
+            # 增量更新以用户为中心的视图，使新分配的身份组立即可在身份组管理器中佩戴
+            # 与 /check_user_roles 的全量重建共用锁，并在线程中读写分片
+            for view_guild_id, view_role_ids, view_user_ids in view_updates:
+                await run_locked(add_user_roles, view_guild_id, view_role_ids, view_user_ids)
+
         except Exception as e:
             logger.error(f"保存分配日志时出错: {e}", exc_info=True)
     # 构建响应消息
@@ -451,15 +477,17 @@ async def handle_assign_roles(interaction: Interaction, role_id_str: str = None,
         if len(all_assigned) > 50 or len(all_failed) > 20:
             summary = discord.Embed(
                 title="跨服务器身份组分配完成",
-                description=f"**操作ID**: `{operation_id}`\n成功: {len(all_assigned)}, 失败: {len(all_failed)}\n详情请查看机器人控制台日志",
+                description=f"**操作ID**: `{operation_id}`\n成功: {len(all_assigned)}, 失败: {len(all_failed)}\n完整名单见附件",
                 color=discord.Color.green()
             )
-            await interaction.channel.send(embed=summary)
+            report_lines = [f"成功分配的用户 ({len(all_assigned)}):", *all_assigned, "", f"分配失败的情况 ({len(all_failed)}):", *all_failed]
+            report_filename = f"assign_{operation_id}.txt"
+            await interaction.channel.send(embed=summary, file=text_attachment(report_filename, report_lines))
             # 同时发送到日志频道
             if config.LOG_CHANNEL_ID:
                 log_channel = interaction.client.get_channel(int(config.LOG_CHANNEL_ID))
                 if log_channel:
-                    await log_channel.send(embed=summary)
+                    await log_channel.send(embed=summary, file=text_attachment(report_filename, report_lines))
             return
 
         # 构建详细embeds
@@ -0,0 +1,133 @@
+import io
+import gzip
+import struct
+import asyncio
+import logging
+from array import array
+from typing import Dict, Iterable, List, Tuple
+import discord
+from discord import Interaction
+from utils.member_export import SIZE_MARGIN_BYTES, encode_rows, part_filenames, send_export_files
+
+logger = logging.getLogger('discord_bot.cogs.role_matrix')
+
+# 遍历成员缓存时每处理这么多成员让出一次事件循环
+YIELD_EVERY = 10000
+
+# 位图文件头: 魔数, 身份组数量, 成员行数
+BITMAP_MAGIC = b'RMX1'
+BITMAP_HEADER = struct.Struct('<4sII')
+
+
+def managed_role_ids(client: discord.Client) -> List[int]:
+    """返回 role_mapping.json 中登记的全部身份组ID"""
+    mapping_cog = client.get_cog('RoleMappingLogic')
+    if not mapping_cog:
+        return []
+    return [int(role_id) for role_id in mapping_cog.role_index]
+
+
+def member_role_ids(member: discord.Member) -> Iterable[int]:
+    """
+    成员持有的身份组ID (不含 @everyone)
+
+    优先读取 discord.py 内部的 Member._roles (身份组ID数组)，可以避免为每个成员构造并排序 Role 对象列表；
+    该属性在 discord.py 升级后不存在时退回公开的 member.roles
+    """
+    role_ids = getattr(member, '_roles', None)
+    if role_ids is None:
+        return [role.id for role in member.roles if not role.is_default()]
+    return role_ids
+
+
+async def collect_matrix(guild: discord.Guild, role_ids: List[int], bitmap: bool) -> Tuple[int, bytes, array, array]:
+    """
+    一次遍历成员缓存，收集成员与身份组的对应关系
+
+    只记录至少拥有一个目标身份组的成员。
+    bitmap 为 True 时返回 (行数, 位图行数据, 空, 空)，每行为 8 字节用户ID加上按身份组顺序排列的位掩码；
+    否则返回 (行数, b'', 用户ID数组, 身份组ID数组) 形式的稀疏对
+    """
+    columns: Dict[int, int] = {role_id: index for index, role_id in enumerate(role_ids)}
+    width = (len(role_ids) + 7) // 8
+    rows = 0
+    body = bytearray()
+    user_ids, held_role_ids = array('Q'), array('Q')
+
+    for position, member in enumerate(guild.members, 1):
+        hits = [columns[role_id] for role_id in member_role_ids(member) if role_id in columns]
+        if hits:
+            rows += 1
+            if bitmap:
+                mask = bytearray(width)
+                for column in hits:
+                    mask[column >> 3] |= 1 << (column & 7)
+                body += member.id.to_bytes(8, 'little')
+                body += mask
+            else:
+                for column in hits:
+                    user_ids.append(member.id)
+                    held_role_ids.append(role_ids[column])
+        if position % YIELD_EVERY == 0:
+            await asyncio.sleep(0)
+
+    return rows, bytes(body), user_ids, held_role_ids
+
+
+def encode_bitmap(role_ids: List[int], rows: int, body: bytes, compress: bool, limit: int) -> List[bytes]:
+    """
+    生成位图文件并按上传限制切分 (同步函数，应在线程中调用)
+
+    文件格式 (小端): 文件头 '<4sII' (RMX1, 身份组数量 R, 行数 N)，
+    R 个 8 字节身份组ID，随后 N 行，每行 8 字节用户ID + ceil(R/8) 字节位掩码 (第 i 位对应第 i 个身份组)。
+    分卷按字节切分，按顺序拼接即可还原
+    """
+    data = BITMAP_HEADER.pack(BITMAP_MAGIC, len(role_ids), rows) + array('Q', role_ids).tobytes() + body
+    if compress:
+        data = gzip.compress(data)
+    chunk = max(limit - SIZE_MARGIN_BYTES, SIZE_MARGIN_BYTES)
+    return [data[start:start + chunk] for start in range(0, len(data), chunk)] or [data]
+
+
+async def handle_export_role_matrix(interaction: Interaction, scope: str = "managed", fmt: str = "sparse", compress: bool = False):
+    """导出整个服务器的成员×身份组矩阵"""
+    guild = interaction.guild
+    if not guild:
+        await interaction.response.send_message("❌ 此命令只能在服务器内使用", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    if scope == "all":
+        roles = [role for role in guild.roles if not role.is_default()]
+    else:
+        roles = [role for role in map(guild.get_role, managed_role_ids(interaction.client)) if role is not None]
+    if not roles:
+        await interaction.followup.send("❌ 没有可导出的身份组 (role_mapping.json 中未登记本服务器的身份组)", ephemeral=True)
+        return
+
+    role_ids = [role.id for role in roles]
+    bitmap = fmt == "bitmap"
+    if not guild.chunked:
+        logger.warning(f"服务器 {guild.id} 的成员缓存尚未加载完成，导出结果可能不完整")
+
+    rows, body, user_ids, held_role_ids = await collect_matrix(guild, role_ids, bitmap)
+    limit = guild.filesize_limit
+    if bitmap:
+        parts = await asyncio.to_thread(encode_bitmap, role_ids, rows, body, compress, limit)
+        extension = "bin" + (".gz" if compress else "")
+    else:
+        parts = await asyncio.to_thread(encode_rows, zip(user_ids, held_role_ids), ['UserID', '身份组ID'], "csv", compress, limit)
+        extension = "csv" + (".gz" if compress else "")
+
+    # 身份组列的顺序与名称说明，与数据分卷一起按上传限制打包发送
+    legend = encode_rows(((index, role.id, role.name) for index, role in enumerate(roles)), ['序号', '身份组ID', '身份组名称'], limit=limit)
+
+    basename = f"role_matrix_{guild.id}"
+    files = [discord.File(io.BytesIO(data), filename=name) for name, data in zip(part_filenames(basename, extension, len(parts)), parts)]
+    files += [discord.File(io.BytesIO(data), filename=name) for name, data in zip(part_filenames(f"{basename}_roles", "csv", len(legend)), legend)]
+
+    content = f"已导出 {len(roles)} 个身份组、{rows} 名成员的对应关系 ({'位图' if bitmap else '稀疏 CSV'}{'，gzip 压缩' if compress else ''})"
+    if len(parts) > 1:
+        content += f"，共 {len(parts)} 个分卷"
+    await send_export_files(interaction, content, files, ephemeral=True)
+    logger.info(f"用户 {interaction.user.id} 导出了服务器 {guild.id} 的身份组矩阵: {len(roles)} 个身份组, {rows} 行, {len(parts)} 个分卷")
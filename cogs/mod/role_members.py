@@ -1,11 +1,14 @@
 import discord
 import logging
-import csv
-import os
 import asyncio
+from array import array
+from typing import Sequence
 from discord.ui import View, Select, Modal, TextInput
 from config import LOG_CHANNEL_ID
 from utils.progress_utils import create_progress_bar
+from utils.report_utils import MESSAGE_LIMIT, text_attachment, truncate
+from utils.metrics import BULK_OPERATIONS
+from utils.member_export import MEMBER_COLUMNS, member_rows, build_export_files, send_export_files
 
 logger = logging.getLogger(__name__)
 
@@ -46,68 +49,82 @@ async def send_log_to_channel(interaction, role_id, action_desc, extra_lines=Non
     except Exception as e:
         logger.error(f"发送日志到频道失败: {e}")
 
+# 导出操作 -> (格式, 是否 gzip 压缩)
+EXPORT_ACTIONS = {
+    "print": ("csv", False),
+    "print_jsonl": ("jsonl", False),
+    "print_gzip": ("csv", True),
+}
+
+
 class RoleActionSelect(Select):
-    def __init__(self, role_id, members, member_list, max_length):
+    def __init__(self, role_id):
         self.role_id = role_id
-        self.members = members
-        self.member_list = member_list
-        self.max_length = max_length
-        
+
         options = [
-            discord.SelectOption(label="仅打印成员名单", value="print", description="仅显示成员名单"),
+            discord.SelectOption(label="仅打印成员名单", value="print", description="导出为 CSV 文件"),
+            discord.SelectOption(label="导出为 JSONL", value="print_jsonl", description="每行一个成员的 JSON 对象"),
+            discord.SelectOption(label="导出为压缩 CSV", value="print_gzip", description="gzip 压缩的 CSV，适合大型身份组"),
             discord.SelectOption(label="移除这些人的身份组", value="remove", description="批量移除身份组"),
             discord.SelectOption(label="替换为新身份组", value="replace", description="移除原身份组并添加新身份组"),
         ]
         super().__init__(placeholder="请选择要执行的操作", min_values=1, max_values=1, options=options)
 
+    def resolve_members(self, guild: discord.Guild):
+        """
+        在执行操作时才把当前显示的ID解析为成员对象 (跳过已离开服务器的成员)
+        搜索过滤后只作用于匹配的成员，而不是整个身份组
+        """
+        return [member for member in map(guild.get_member, self.view.visible) if member is not None]
+
+    def scope_description(self, count: int) -> str:
+        """确认提示中操作范围的描述"""
+        if self.view.query is not None:
+            return f"身份组 <@&{self.role_id}> 中搜索 \"{self.view.query}\" 匹配的 {count} 名成员"
+        return f"身份组 <@&{self.role_id}> 下的所有成员 ({count} 人)"
+
     async def callback(self, interaction2: discord.Interaction):
         action = self.values[0]
         guild = interaction2.guild
         role = guild.get_role(self.role_id)
+        members = self.resolve_members(guild)
         logger.info(f"用户 {interaction2.user} 选择了操作: {action} (身份组ID: {self.role_id})")
         
-        if action == "print":
-            # 生成CSV文件
-            filename = f"role_{self.role_id}_members.csv"
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(['昵称', 'UserID', '用户名'])
-                for member in self.members:
-                    writer.writerow([member.display_name, member.id, str(member)])
-            
-            # 发送CSV文件
-            file = discord.File(filename)
-            await interaction2.response.send_message(
-                f"身份组 <@&{self.role_id}> 下的成员列表已生成CSV文件",
-                file=file,
-            )
-
-            # 日志频道记录
-            extra_lines = [f"导出成员数: {len(self.members)}"]
-            await send_log_to_channel(
-                interaction2,
-                self.role_id,
-                "导出身份组成员名单",
-                extra_lines=extra_lines
-            )
-            
-            # 延迟删除临时文件（后台任务）
-            async def delete_file():
-                await asyncio.sleep(5)  # 等待5秒确保文件发送完成
-                try:
-                    os.remove(filename)
-                except Exception as e:
-                    logger.warning(f"删除临时文件 {filename} 失败: {str(e)}")
-            
-            asyncio.create_task(delete_file())
+        if action in EXPORT_ACTIONS:
+            await self.handle_export_action(interaction2, members, *EXPORT_ACTIONS[action])
         elif action == "remove":
-            await self.handle_remove_action(interaction2, role)
+            await self.handle_remove_action(interaction2, role, members)
         elif action == "replace":
-            await self.handle_replace_action(interaction2, role)
+            await self.handle_replace_action(interaction2, role, members)
         else:
             await interaction2.response.send_message("❌ 未知操作类型", ephemeral=True)
 
-    async def handle_remove_action(self, interaction2: discord.Interaction, role):
+    async def handle_export_action(self, interaction2: discord.Interaction, members, fmt: str, compress: bool):
+        await interaction2.response.defer(thinking=True)
+        # 成员数据在事件循环中快照，编码与压缩在线程中完成，不写入磁盘
+        files = await build_export_files(
+            f"role_{self.role_id}_members",
+            member_rows(members),
+            MEMBER_COLUMNS,
+            fmt=fmt,
+            compress=compress,
+            limit=interaction2.guild.filesize_limit
+        )
+        content = f"身份组 <@&{self.role_id}> 下的成员列表已生成{fmt.upper()}文件"
+        if len(files) > 1:
+            content += f" (共 {len(files)} 个分卷)"
+        await send_export_files(interaction2, content, files)
+
+        # 日志频道记录
+        extra_lines = [f"导出成员数: {len(members)}", f"格式: {fmt}{' (gzip)' if compress else ''}"]
+        await send_log_to_channel(
+            interaction2,
+            self.role_id,
+            "导出身份组成员名单",
+            extra_lines=extra_lines
+        )
+
+    async def handle_remove_action(self, interaction2: discord.Interaction, role, members):
         class ConfirmRemoveView(View):
             def __init__(self, role_id, members):
                 super().__init__(timeout=30)
@@ -138,9 +155,11 @@ class RoleActionSelect(Select):
                     try:
                         await member.remove_roles(role, reason=f"通过命令移除身份组 {self.role_id}")
                         logger.debug(f"成功移除成员 {member.display_name} ({member.id}) 的身份组")
+                        BULK_OPERATIONS.inc('role_members_remove', 'success')
                     except Exception as e:
                         logger.error(f"移除成员 {member.display_name} ({member.id}) 身份组失败: {str(e)}")
                         failed.append(f"{member.display_name} ({member.id})")
+                        BULK_OPERATIONS.inc('role_members_remove', 'failure')
                     
                     processed_count += 1
                     if processed_count % 5 == 0 or processed_count == total_members:
@@ -150,13 +169,20 @@ class RoleActionSelect(Select):
 
                 await progress_message.delete()
                 
-                msg = f"已尝试移除身份组 <@&{self.role_id}> 下的所有成员\n"
+                msg = f"已尝试移除 {total_members} 名成员的身份组 <@&{self.role_id}>\n"
                 if failed:
                     msg += f"以下成员移除失败：\n" + "\n".join(failed)
                 else:
                     msg += "全部成员移除成功"
                 
-                await interaction.followup.send(msg)
+                if len(msg) > MESSAGE_LIMIT:
+                    # 失败名单过长时完整内容放入附件
+                    await interaction.followup.send(
+                        truncate(msg),
+                        file=text_attachment(f"role_{self.role_id}_remove_failures.txt", failed)
+                    )
+                else:
+                    await interaction.followup.send(msg)
                 # 日志频道记录
                 extra_lines = [
                     f"批量移除身份组成员数: {len(self.members)}",
@@ -181,12 +207,12 @@ class RoleActionSelect(Select):
                 self.stop()
 
         await interaction2.response.send_message(
-            f"⚠️ 确认要移除身份组 <@&{self.role_id}> 下的所有成员吗？此操作不可撤销",
-            view=ConfirmRemoveView(self.role_id, self.members),
+            f"⚠️ 确认要移除{self.scope_description(len(members))}的身份组吗？此操作不可撤销",
+            view=ConfirmRemoveView(self.role_id, members),
             ephemeral=True
         )
 
-    async def handle_replace_action(self, interaction2: discord.Interaction, role):
+    async def handle_replace_action(self, interaction2: discord.Interaction, role, members):
         class ConfirmReplaceView(View):
             def __init__(self, role_id, members):
                 super().__init__(timeout=30)
@@ -257,9 +283,11 @@ class RoleActionSelect(Select):
                                         reason=f"通过命令替换身份组 {self.role_id} -> {self.new_role_id.value}"
                                     )
                                     logger.info(f"成功为成员 {member.display_name} ({member.id}) 添加新身份组")
+                                    BULK_OPERATIONS.inc('role_members_replace', 'success')
                                 except Exception as e:
                                     logger.error(f"为成员 {member.display_name} ({member.id}) 添加新身份组失败: {str(e)}")
                                     failed_add.append(f"{member.display_name} ({member.id})")
+                                    BULK_OPERATIONS.inc('role_members_replace', 'failure')
                                 
                                 processed_count += 1
                                 if processed_count % 5 == 0 or processed_count == total_members:
@@ -280,7 +308,15 @@ class RoleActionSelect(Select):
                             
                             # 发送结果消息
                             try:
-                                await modal_interaction.followup.send(msg)
+                                if len(msg) > MESSAGE_LIMIT:
+                                    # 失败名单过长时完整内容放入附件
+                                    report_lines = ["移除原身份组失败：", *failed_remove, "", "添加新身份组失败：", *failed_add]
+                                    await modal_interaction.followup.send(
+                                        truncate(msg),
+                                        file=text_attachment(f"role_{self.role_id}_replace_failures.txt", report_lines)
+                                    )
+                                else:
+                                    await modal_interaction.followup.send(msg)
                             except Exception as e:
                                 logger.error(f"发送结果消息失败: {str(e)}")
                             # 日志频道记录
@@ -316,29 +352,98 @@ class RoleActionSelect(Select):
                 self.stop()
 
         await interaction2.response.send_message(
-            f"⚠️ 确认要将身份组 <@&{self.role_id}> 下的所有成员替换为新身份组吗？此操作不可撤销",
-            view=ConfirmReplaceView(self.role_id, self.members),
+            f"⚠️ 确认要将{self.scope_description(len(members))}替换为新身份组吗？此操作不可撤销",
+            view=ConfirmReplaceView(self.role_id, members),
             ephemeral=True
         )
 
 
+PAGE_SIZE = 30
+
+
+def build_member_page_embed(guild: discord.Guild, role_id: int, ids: Sequence[int], page: int, total_members: int, query: str = None) -> discord.Embed:
+    """按偏移量只渲染当前页的成员，成员名称在渲染时从成员缓存读取"""
+    total_pages = max(1, (len(ids) + PAGE_SIZE - 1) // PAGE_SIZE)
+    page_ids = ids[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+    lines = []
+    for member_id in page_ids:
+        member = guild.get_member(member_id)
+        lines.append(member.display_name if member else f"(已离开) {member_id}")
+
+    role = guild.get_role(role_id)
+    description = f"共有 {total_members} 人 (当前页: {len(page_ids)}人)"
+    if query is not None:
+        description = f"搜索 \"{query}\"：匹配 {len(ids)} 人 / 共 {total_members} 人 (当前页: {len(page_ids)}人)"
+    embed = discord.Embed(
+        title=f"身份组：{role.name if role else role_id} 的成员列表 ({page}/{total_pages})",
+        description=description,
+        color=discord.Color.blue()
+    )
+    member_list = "\n".join(lines) if lines else "(无匹配成员)"
+    embed.add_field(name="成员列表", value=f"```\n{member_list}\n```", inline=False)
+    return embed
+
+
 class RoleActionView(View):
-    def __init__(self, role_id, members, member_list, max_length, current_page=1, total_pages=1):
+    """
+    身份组成员列表的分页视图
+
+    只保存成员ID的紧凑快照 (array，保持身份组成员的原有顺序)，翻页时按偏移量渲染当前页；
+    支持跳转页码和在身份组内搜索 (之后的导出、移除与替换只作用于匹配的成员)，视图超时后释放快照
+    """
+    def __init__(self, role_id: int, snapshot: Sequence[int]):
         super().__init__(timeout=60)
         self.role_id = role_id
-        self.members = members
-        self.member_list = member_list
-        self.max_length = max_length
-        self.current_page = current_page
-        self.total_pages = total_pages
-        
-        self.add_item(RoleActionSelect(role_id, members, member_list, max_length))
-        
-        if total_pages > 1:
-            if current_page > 1:
-                self.add_item(PageButton("上一页", "prev", discord.ButtonStyle.secondary))
-            if current_page < total_pages:
-                self.add_item(PageButton("下一页", "next", discord.ButtonStyle.primary))
+        self.snapshot = snapshot
+        # 当前显示的ID集合 (搜索时为快照的子集)
+        self.visible = snapshot
+        self.query = None
+        self.current_page = 1
+
+        self.add_item(RoleActionSelect(role_id))
+        self.prev_button = PageButton("上一页", "prev", discord.ButtonStyle.secondary)
+        self.next_button = PageButton("下一页", "next", discord.ButtonStyle.primary)
+        self.add_item(self.prev_button)
+        self.add_item(self.next_button)
+        self.add_item(JumpPageButton())
+        self.add_item(SearchButton())
+        self._refresh_buttons()
+
+    @property
+    def total_pages(self) -> int:
+        return max(1, (len(self.visible) + PAGE_SIZE - 1) // PAGE_SIZE)
+
+    def _refresh_buttons(self):
+        self.prev_button.disabled = self.current_page <= 1
+        self.next_button.disabled = self.current_page >= self.total_pages
+
+    def build_embed(self, guild: discord.Guild) -> discord.Embed:
+        return build_member_page_embed(guild, self.role_id, self.visible, self.current_page, len(self.snapshot), self.query)
+
+    async def show_page(self, interaction: discord.Interaction, page: int):
+        self.current_page = min(max(1, page), self.total_pages)
+        self._refresh_buttons()
+        await interaction.response.edit_message(embed=self.build_embed(interaction.guild), view=self)
+
+    def search(self, guild: discord.Guild, query: str):
+        """在快照内按显示名称或用户名搜索；空查询恢复完整列表"""
+        query = query.strip()
+        if not query:
+            self.visible, self.query = self.snapshot, None
+            return
+        needle = query.casefold()
+        matches = []
+        for member_id in self.snapshot:
+            member = guild.get_member(member_id)
+            if member and (needle in member.display_name.casefold() or needle in member.name.casefold() or query == str(member_id)):
+                matches.append(member_id)
+        self.visible, self.query = array('Q', matches), query
+
+    async def on_timeout(self):
+        # 释放快照，避免超时的列表继续占用内存
+        self.snapshot = self.visible = array('Q')
+        self.stop()
+
 
 class PageButton(discord.ui.Button):
     def __init__(self, label, custom_id, style):
@@ -346,34 +451,49 @@ class PageButton(discord.ui.Button):
     
     async def callback(self, interaction: discord.Interaction):
         view: RoleActionView = self.view
-        new_page = view.current_page
-        
-        if self.custom_id == "prev":
-            new_page -= 1
-        elif self.custom_id == "next":
-            new_page += 1
-        
-        # 获取对应分页的成员列表
-        chunks = [view.members[i:i + 30] for i in range(0, len(view.members), 30)]
-        chunk = chunks[new_page-1]
-        member_list = "\n".join([f"{member.display_name}" for member in chunk])
-        
-        # 更新embed
-        embed = discord.Embed(
-            title=f"身份组：{interaction.guild.get_role(view.role_id).name} 的成员列表 ({new_page}/{view.total_pages})", 
-            description=f"共有 {len(view.members)} 人 (当前页: {len(chunk)}人)",
-            color=discord.Color.blue()
-        )
-        embed.add_field(name="成员列表", value=f"```\n{member_list}\n```", inline=False)
-        
-        # 更新view
-        new_view = RoleActionView(
-            view.role_id,
-            view.members,
-            member_list,
-            view.max_length,
-            new_page,
-            view.total_pages
-        )
-        
-        await interaction.response.edit_message(embed=embed, view=new_view)
+        delta = -1 if self.custom_id == "prev" else 1
+        await view.show_page(interaction, view.current_page + delta)
+
+
+class JumpPageModal(Modal, title="跳转到页码"):
+    page = TextInput(label="页码", placeholder="请输入要跳转的页码", required=True, max_length=6)
+
+    def __init__(self, view: RoleActionView):
+        super().__init__()
+        self.list_view = view
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            page = int(self.page.value)
+        except ValueError:
+            await interaction.response.send_message("❌ 请输入有效的页码", ephemeral=True)
+            return
+        await self.list_view.show_page(interaction, page)
+
+
+class JumpPageButton(discord.ui.Button):
+    def __init__(self):
+        super().__init__(label="跳转", custom_id="jump", style=discord.ButtonStyle.secondary)
+
+    async def callback(self, interaction: discord.Interaction):
+        await interaction.response.send_modal(JumpPageModal(self.view))
+
+
+class SearchModal(Modal, title="在身份组内搜索"):
+    query = TextInput(label="关键词", placeholder="成员名称或用户ID，留空显示全部成员", required=False, max_length=100)
+
+    def __init__(self, view: RoleActionView):
+        super().__init__()
+        self.list_view = view
+
+    async def on_submit(self, interaction: discord.Interaction):
+        self.list_view.search(interaction.guild, self.query.value or "")
+        await self.list_view.show_page(interaction, 1)
+
+
+class SearchButton(discord.ui.Button):
+    def __init__(self):
+        super().__init__(label="搜索", custom_id="search", style=discord.ButtonStyle.secondary)
+
+    async def callback(self, interaction: discord.Interaction):
+        await interaction.response.send_modal(SearchModal(self.view))
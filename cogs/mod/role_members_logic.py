@@ -1,7 +1,7 @@
-import discord
 import logging
-from discord import Interaction, Embed
-from .role_members import RoleActionView
+from array import array
+from discord import Interaction
+from .role_members import RoleActionView, PAGE_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -26,30 +26,17 @@ async def handle_list_role_members(interaction: Interaction, role_id_str: str):
         await interaction.response.send_message(f"❌ 未找到ID为 {role_id} 的身份组", ephemeral=True, delete_after=120)
         return
     
-    members = role.members
-    if not members:
+    # 只保存成员ID的紧凑快照 (保持 role.members 的顺序)，分页时按偏移量渲染
+    snapshot = array('Q', (member.id for member in role.members))
+    if not snapshot:
         await interaction.response.send_message(f"身份组 <@&{role_id}> 下没有成员", ephemeral=True, delete_after=120)
         return
 
-    # 分页显示成员列表，每页最多30个成员
-    chunks = [members[i:i + 30] for i in range(0, len(members), 30)]
-    total_pages = len(chunks)
-    logger.info(f"分页信息 - 总成员数: {len(members)}, 总页数: {total_pages}, 每页成员数: {[len(c) for c in chunks]}")
-    
-    first_chunk = chunks[0]
-    member_list = "\n".join([f"{member.display_name}" for member in first_chunk])
-    embed = Embed(
-        title=f"身份组：{role.name} 的成员列表 (1/{total_pages})", 
-        description=f"共有 {len(members)} 人 (当前页: {len(first_chunk)}人)",
-        color=discord.Color.blue()
-    )
-    embed.add_field(name="成员列表", value=f"```\n{member_list}\n```", inline=False)
-    
-    # 添加交互组件
-    view = RoleActionView(role_id, members, member_list, len(members), 1, total_pages)
+    view = RoleActionView(role_id, snapshot)
+    logger.info(f"分页信息 - 总成员数: {len(snapshot)}, 总页数: {view.total_pages}, 每页成员数: {PAGE_SIZE}")
     
     await interaction.response.send_message(
-        embed=embed,
+        embed=view.build_embed(guild),
         view=view,
         delete_after=120,
         ephemeral=True
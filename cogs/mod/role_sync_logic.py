@@ -2,6 +2,9 @@ import discord
 from discord import Interaction
 import logging
 from ..ui.confirm_view import ConfirmView
+from utils.id_set import IdSet
+from utils.user_resolver import user_resolver
+from utils.report_utils import MESSAGE_LIMIT, text_attachment, truncate
 
 logger = logging.getLogger('discord_bot.cogs.role_sync_logic')
 
@@ -46,23 +49,24 @@ async def handle_sync_role(interaction: Interaction, role_id_1_str: str, server_
             logger.error(f"在服务器 {guild_2.name} 中找不到 ID 为 {role_id_2} 的身份组")
             return
 
-        # 4. 获取成员列表和服务器成员列表
-        members_1_ids = {member.id for member in role_1.members}
-        members_2_ids = {member.id for member in role_2.members}
-        
-        # 获取两个服务器的所有成员ID
-        guild_1_member_ids = {member.id for member in guild_1.members}
-        guild_2_member_ids = {member.id for member in guild_2.members}
+        # 4. 获取身份组成员列表 (只遍历身份组成员，对端是否存在通过成员缓存逐个判断)
+        members_1_ids = IdSet(member.id for member in role_1.members)
+        members_2_ids = IdSet(member.id for member in role_2.members)
         
         # 5. 找出差异（只考虑同时存在于两个服务器的成员）
         # to_add_to_2: 本地有且在远端服务器中存在但没有身份组 -> 推送
-        to_add_to_2 = members_1_ids.intersection(guild_2_member_ids) - members_2_ids
+        to_add_to_2 = IdSet(
+            member_id for member_id in members_1_ids.difference(members_2_ids)
+            if guild_2.get_member(member_id) is not None
+        )
         # to_add_to_1: 远端有且在本地服务器中存在但没有身份组 -> 拉取
-        to_add_to_1 = members_2_ids.intersection(guild_1_member_ids) - members_1_ids
+        to_add_to_1 = IdSet(
+            member_id for member_id in members_2_ids.difference(members_1_ids)
+            if guild_1.get_member(member_id) is not None
+        )
         
         # 记录日志，帮助调试
         logger.info(f"本地身份组成员数: {len(members_1_ids)}, 远端身份组成员数: {len(members_2_ids)}")
-        logger.info(f"本地服务器成员数: {len(guild_1_member_ids)}, 远端服务器成员数: {len(guild_2_member_ids)}")
         logger.info(f"需要推送到远端的成员数: {len(to_add_to_2)}, 需要拉取到本地的成员数: {len(to_add_to_1)}")
 
         # 6. 构建确认消息
@@ -162,7 +166,7 @@ async def handle_sync_role(interaction: Interaction, role_id_1_str: str, server_
         
         if action == "remove_local":
             # 只处理同时存在于本地服务器的成员
-            members_to_process = members_2_ids.intersection(guild_1_member_ids)
+            members_to_process = IdSet(member_id for member_id in members_2_ids if guild_1.get_member(member_id) is not None)
             logger.info(f"移除本地身份组：远端身份组成员数 {len(members_2_ids)}，本地存在的成员数 {len(members_to_process)}")
             
             for member_id in members_to_process:
@@ -199,43 +203,36 @@ async def handle_sync_role(interaction: Interaction, role_id_1_str: str, server_
                 inline=True
             )
 
-        # 9. 生成失败报告
+        # 9. 生成失败报告 (用户名优先取自缓存，未命中的并发获取；完整名单放入附件)
+        failure_sections = [
+            (f"添加到 {role_1.name} 失败的成员", failed_to_add_to_1, guild_1),
+            (f"添加到 {role_2.name} 失败的成员", failed_to_add_to_2, guild_2),
+            (f"从 {role_1.name} 移除失败的成员", failed_to_remove_from_1, guild_1),
+        ]
         error_report = ""
-        if failed_to_add_to_1:
-            failed_members_details = []
-            for member_id in failed_to_add_to_1:
-                try:
-                    user = await interaction.client.fetch_user(member_id)
-                    failed_members_details.append(f"{user.name} ({user.id})")
-                except discord.NotFound:
-                    failed_members_details.append(f"未知用户 ({member_id})")
-            error_report += f"\n**添加到 {role_1.name} 失败的成员:**\n```\n" + "\n".join(failed_members_details) + "\n```"
-
-        if failed_to_add_to_2:
-            failed_members_details = []
-            for member_id in failed_to_add_to_2:
-                try:
-                    user = await interaction.client.fetch_user(member_id)
-                    failed_members_details.append(f"{user.name} ({user.id})")
-                except discord.NotFound:
-                    failed_members_details.append(f"未知用户 ({member_id})")
-            error_report += f"\n**添加到 {role_2.name} 失败的成员:**\n```\n" + "\n".join(failed_members_details) + "\n```"
-        
-        if failed_to_remove_from_1:
-            failed_members_details = []
-            for member_id in failed_to_remove_from_1:
-                try:
-                    user = await interaction.client.fetch_user(member_id)
-                    failed_members_details.append(f"{user.name} ({user.id})")
-                except discord.NotFound:
-                    failed_members_details.append(f"未知用户 ({member_id})")
-            error_report += f"\n**从 {role_1.name} 移除失败的成员:**\n```\n" + "\n".join(failed_members_details) + "\n```"
+        report_lines = []
+        for title, failed_ids, guild in failure_sections:
+            if not failed_ids:
+                continue
+            failed_members_details = await user_resolver.describe(interaction.client, failed_ids, guild)
+            error_report += f"\n**{title}:**\n```\n" + "\n".join(failed_members_details) + "\n```"
+            report_lines.append(f"{title} ({len(failed_ids)}):")
+            report_lines.extend(failed_members_details)
+            report_lines.append("")
 
         await interaction.edit_original_response(embed=report_embed)
         if error_report:
-            if len(error_report) > 2000:
-                error_report = error_report[:1990] + "...`"
-            await interaction.followup.send(content=error_report, ephemeral=True)
+            if len(error_report) > MESSAGE_LIMIT:
+                summary = "\n".join(
+                    f"**{title}:** {len(failed_ids)} 人" for title, failed_ids, _ in failure_sections if failed_ids
+                )
+                await interaction.followup.send(
+                    content=truncate(f"失败成员较多，完整名单见附件\n{summary}"),
+                    file=text_attachment("sync_failures.txt", report_lines),
+                    ephemeral=True
+                )
+            else:
+                await interaction.followup.send(content=error_report, ephemeral=True)
 
 
     except ValueError:
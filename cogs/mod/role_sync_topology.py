@@ -0,0 +1,299 @@
+import discord
+from discord import Interaction
+import os
+import json
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from ..ui.confirm_view import ConfirmView
+from utils.id_set import IdSet
+from utils.progress_utils import create_progress_bar
+from utils.user_resolver import user_resolver
+from utils.report_utils import text_attachment, truncate
+from utils.metrics import timed_file_io, BULK_OPERATIONS
+
+logger = logging.getLogger('discord_bot.cogs.role_sync_topology')
+
+TOPOLOGY_FILE = os.path.join('data', 'role_sync_topology.json')
+
+# 每个服务器同时进行的身份组修改请求数 (同一服务器的成员修改共享速率限制)
+PER_GUILD_CONCURRENCY = 4
+
+DIRECTIONS = {
+    "bidirectional": "双向同步",
+    "push": "仅推送到远端",
+    "pull": "仅同步到本地",
+}
+
+
+@timed_file_io('role_sync_topology.json', 'read')
+def load_topology() -> List[Dict]:
+    """
+    加载同步拓扑
+
+    每一项为 {"guild_1", "role_1", "guild_2", "role_2", "direction", "mirror"}，
+    direction 以 1 为本地、2 为远端，含义与 /sync_role 相同；
+    mirror 为 True 时由 RoleMirror 实时镜像该身份组对的变化
+    """
+    try:
+        with open(TOPOLOGY_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, list) else []
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+
+@timed_file_io('role_sync_topology.json', 'write')
+def save_topology(pairs: List[Dict]):
+    """原子地保存同步拓扑"""
+    os.makedirs(os.path.dirname(TOPOLOGY_FILE), exist_ok=True)
+    tmp_path = f"{TOPOLOGY_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(pairs, f, indent=4)
+    os.replace(tmp_path, TOPOLOGY_FILE)
+
+
+def describe_pair(client: discord.Client, pair: Dict) -> str:
+    """生成一个身份组对的可读描述"""
+    def role_label(guild_id, role_id):
+        guild = client.get_guild(guild_id)
+        role = guild.get_role(role_id) if guild else None
+        return f"{guild.name if guild else guild_id}/{role.name if role else role_id}"
+
+    arrow = {"bidirectional": "⇄", "push": "→", "pull": "←"}.get(pair['direction'], "?")
+    mirror = " (实时镜像)" if pair.get('mirror') else ""
+    return f"{role_label(pair['guild_1'], pair['role_1'])} {arrow} {role_label(pair['guild_2'], pair['role_2'])}{mirror}"
+
+
+def plan_topology(client: discord.Client, pairs: List[Dict]) -> Tuple[Dict[Tuple[int, int], IdSet], List[str]]:
+    """
+    一次遍历计算拓扑中所有身份组对的差异
+
+    每个 (服务器, 身份组) 的成员只读取一次；同一目标身份组在多个身份组对中出现时自动去重
+    返回 ({(目标服务器ID, 目标身份组ID): 需要添加的用户}, 无法解析的身份组对描述)
+    """
+    role_members: Dict[Tuple[int, int], IdSet] = {}
+    problems = []
+
+    def members_of(guild: discord.Guild, role: discord.Role) -> IdSet:
+        key = (guild.id, role.id)
+        if key not in role_members:
+            role_members[key] = IdSet(member.id for member in role.members)
+        return role_members[key]
+
+    wanted: Dict[Tuple[int, int], IdSet] = {}
+    for pair in pairs:
+        guild_1 = client.get_guild(pair['guild_1'])
+        guild_2 = client.get_guild(pair['guild_2'])
+        role_1 = guild_1.get_role(pair['role_1']) if guild_1 else None
+        role_2 = guild_2.get_role(pair['role_2']) if guild_2 else None
+        if role_1 is None or role_2 is None:
+            problems.append(describe_pair(client, pair))
+            continue
+
+        members_1 = members_of(guild_1, role_1)
+        members_2 = members_of(guild_2, role_2)
+        directions = []
+        if pair['direction'] in ("bidirectional", "push"):
+            directions.append((members_1, guild_2, role_2, members_2))
+        if pair['direction'] in ("bidirectional", "pull"):
+            directions.append((members_2, guild_1, role_1, members_1))
+
+        for source, target_guild, target_role, target_members in directions:
+            # 只考虑目标服务器中存在且尚未拥有身份组的成员
+            to_add = IdSet(
+                member_id for member_id in source.difference(target_members)
+                if target_guild.get_member(member_id) is not None
+            )
+            if to_add:
+                key = (target_guild.id, target_role.id)
+                wanted[key] = wanted.get(key, IdSet()).union(to_add)
+
+    return wanted, problems
+
+
+async def execute_plan(client: discord.Client, plan: Dict[Tuple[int, int], IdSet], on_progress=None, concurrency: int = PER_GUILD_CONCURRENCY) -> Dict[Tuple[int, int], Tuple[int, List[int]]]:
+    """
+    并发执行同步计划，每个服务器由固定数量 (concurrency) 的 worker 依次取出并执行成员修改
+
+    返回 {(服务器ID, 身份组ID): (成功数, 失败的用户ID列表)}
+    """
+    results = {key: [0, []] for key in plan}
+
+    async def add_role(guild: discord.Guild, role: discord.Role, member_id: int):
+        member = guild.get_member(member_id)
+        try:
+            if member is None:
+                raise LookupError("成员不在服务器中")
+            await member.add_roles(role, reason="按同步拓扑同步身份组")
+            results[(guild.id, role.id)][0] += 1
+            BULK_OPERATIONS.inc('sync_topology', 'success')
+        except Exception as e:
+            logger.error(f"无法将成员 {member_id} 添加到身份组 {role.name} ({role.id})：{e}")
+            results[(guild.id, role.id)][1].append(member_id)
+            BULK_OPERATIONS.inc('sync_topology', 'failure')
+        if on_progress:
+            await on_progress()
+
+    async def worker(guild: discord.Guild, queue):
+        # 同一服务器的 worker 共享一个惰性生成任务的迭代器，任务在被取出时才生成，
+        # 因此无论计划有多大，同时存在的协程数都只有 服务器数 × concurrency
+        for role, member_id in queue:
+            await add_role(guild, role, member_id)
+
+    queues: Dict[int, Tuple[discord.Guild, list]] = {}
+    for (guild_id, role_id), member_ids in plan.items():
+        guild = client.get_guild(guild_id)
+        role = guild.get_role(role_id) if guild else None
+        if role is None:
+            results[(guild_id, role_id)][1].extend(member_ids)
+            continue
+        queues.setdefault(guild.id, (guild, []))[1].append((role, member_ids))
+
+    workers = []
+    for guild, role_jobs in queues.values():
+        queue = ((role, member_id) for role, member_ids in role_jobs for member_id in member_ids)
+        workers.extend(worker(guild, queue) for _ in range(concurrency))
+
+    await asyncio.gather(*workers)
+    return {key: (added, failed) for key, (added, failed) in results.items()}
+
+
+def _notify_mirror(client: discord.Client):
+    """拓扑变更后通知 RoleMirror 重建索引"""
+    mirror_cog = client.get_cog('RoleMirror')
+    if mirror_cog:
+        mirror_cog.reload_topology()
+
+
+async def handle_sync_topology(interaction: Interaction, action: str, role_id_1_str: Optional[str] = None, server_id_str: Optional[str] = None, role_id_2_str: Optional[str] = None, direction: str = "bidirectional", mirror: bool = False, index: Optional[int] = None):
+    """管理并执行多组身份组的同步拓扑 (index 为删除时 list 显示的序号)"""
+    await interaction.response.defer(ephemeral=True)
+    pairs = load_topology()
+
+    if action == "list":
+        if not pairs:
+            await interaction.followup.send("同步拓扑为空，请先使用 add 添加身份组对", ephemeral=True)
+            return
+        lines = [f"`{index}` {describe_pair(interaction.client, pair)}" for index, pair in enumerate(pairs)]
+        embed = discord.Embed(title="身份组同步拓扑", description=truncate("\n".join(lines), 4096), color=discord.Color.blue())
+        await interaction.followup.send(embed=embed, ephemeral=True)
+        return
+
+    if action == "add":
+        try:
+            pair = {
+                "guild_1": interaction.guild.id,
+                "role_1": int(role_id_1_str),
+                "guild_2": int(server_id_str),
+                "role_2": int(role_id_2_str),
+                "direction": direction if direction in DIRECTIONS else "bidirectional",
+                "mirror": mirror,
+            }
+        except (TypeError, ValueError):
+            await interaction.followup.send("错误：添加身份组对需要提供有效的 role_id_1、server_id 和 role_id_2", ephemeral=True)
+            return
+        guild_2 = interaction.client.get_guild(pair['guild_2'])
+        if interaction.guild.get_role(pair['role_1']) is None or guild_2 is None or guild_2.get_role(pair['role_2']) is None:
+            await interaction.followup.send("错误：找不到指定的服务器或身份组", ephemeral=True)
+            return
+        # 同一对身份组只保留一项，重复添加时更新方向
+        pairs = [
+            p for p in pairs
+            if (p['guild_1'], p['role_1'], p['guild_2'], p['role_2']) != (pair['guild_1'], pair['role_1'], pair['guild_2'], pair['role_2'])
+        ]
+        pairs.append(pair)
+        save_topology(pairs)
+        _notify_mirror(interaction.client)
+        await interaction.followup.send(f"✅ 已添加身份组对: {describe_pair(interaction.client, pair)}", ephemeral=True)
+        return
+
+    if action == "remove":
+        if index is None or not 0 <= index < len(pairs):
+            await interaction.followup.send("错误：删除时请在 index 中填写 list 显示的序号", ephemeral=True)
+            return
+        pair = pairs.pop(index)
+        save_topology(pairs)
+        _notify_mirror(interaction.client)
+        await interaction.followup.send(f"✅ 已删除身份组对: {describe_pair(interaction.client, pair)}", ephemeral=True)
+        return
+
+    if action != "run":
+        await interaction.followup.send("错误: 无效的操作。", ephemeral=True)
+        return
+
+    if not pairs:
+        await interaction.followup.send("同步拓扑为空，请先使用 add 添加身份组对", ephemeral=True)
+        return
+
+    plan, problems = plan_topology(interaction.client, pairs)
+    total = sum(len(member_ids) for member_ids in plan.values())
+    if not total:
+        message = f"拓扑中的 {len(pairs)} 组身份组已经一致，无需同步"
+        if problems:
+            message += "\n以下身份组对无法解析，已跳过:\n" + "\n".join(problems)
+        await interaction.followup.send(truncate(message), ephemeral=True)
+        return
+
+    embed = discord.Embed(
+        title="同步拓扑确认",
+        description=f"共 {len(pairs)} 组身份组对，将进行 **{total}** 次身份组添加",
+        color=discord.Color.blue()
+    )
+    plan_lines = []
+    for (guild_id, role_id), member_ids in plan.items():
+        guild = interaction.client.get_guild(guild_id)
+        role = guild.get_role(role_id)
+        plan_lines.append(f"{guild.name}/{role.name}: +{len(member_ids)}")
+    embed.add_field(name="计划", value=truncate("\n".join(plan_lines), 1024), inline=False)
+    if problems:
+        embed.add_field(name="无法解析 (将跳过)", value=truncate("\n".join(problems), 1024), inline=False)
+
+    view = ConfirmView()
+    await interaction.followup.send(embed=embed, view=view, ephemeral=True)
+    await view.wait()
+    if not view.value:
+        await interaction.edit_original_response(content="操作已取消" if view.value is False else "操作超时，已取消同步", embed=None, view=None)
+        return
+
+    progress_embed = discord.Embed(title="正在按拓扑同步...", description=create_progress_bar(0, total), color=discord.Color.gold())
+    await interaction.edit_original_response(embed=progress_embed, view=None)
+    done = 0
+
+    async def on_progress():
+        nonlocal done
+        done += 1
+        if done % 25 == 0:
+            progress_embed.description = create_progress_bar(done, total)
+            try:
+                await interaction.edit_original_response(embed=progress_embed)
+            except discord.HTTPException:
+                pass
+
+    results = await execute_plan(interaction.client, plan, on_progress)
+
+    # 汇总报告
+    report_embed = discord.Embed(title="拓扑同步完成", color=discord.Color.green())
+    summary_lines = []
+    failure_lines = []
+    for (guild_id, role_id), (added, failed) in results.items():
+        guild = interaction.client.get_guild(guild_id)
+        role = guild.get_role(role_id) if guild else None
+        label = f"{guild.name if guild else guild_id}/{role.name if role else role_id}"
+        summary_lines.append(f"{label}: 新增 **{added}**，失败 **{len(failed)}**")
+        if failed:
+            failure_lines.append(f"{label} ({len(failed)}):")
+            failure_lines.extend(await user_resolver.describe(interaction.client, failed, guild))
+            failure_lines.append("")
+    report_embed.description = truncate("\n".join(summary_lines), 4096)
+    if problems:
+        report_embed.add_field(name="已跳过的身份组对", value=truncate("\n".join(problems), 1024), inline=False)
+
+    await interaction.edit_original_response(embed=report_embed)
+    if failure_lines:
+        await interaction.followup.send(
+            "部分成员同步失败，完整名单见附件",
+            file=text_attachment("topology_sync_failures.txt", failure_lines),
+            ephemeral=True
+        )
+    logger.info(f"拓扑同步完成: {len(pairs)} 组身份组对，计划 {total} 次添加")
@@ -1,22 +1,46 @@
 import discord
 import logging
-import psutil
 from datetime import datetime
-from typing import Tuple, Dict, Union
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
-async def get_system_status() -> Dict[str, Union[str, int, float]]:
-    return {
-        'cpu_usage': psutil.cpu_percent(),
-        'ram_usage': psutil.virtual_memory().percent
-    }
+try:
+    from ..tasks.resource_sampler import percentile, sparkline
+except ImportError:
+    from cogs.tasks.resource_sampler import percentile, sparkline
+
+
+def _format_bytes(value: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.2f} GB"
+
+
+def _summary(values: List[float], fmt) -> str:
+    """当前值 + p50/p95 + 迷你折线图"""
+    if not values:
+        return "暂无数据"
+    return (
+        f"当前 {fmt(values[-1])}\n"
+        f"p50 {fmt(percentile(values, 50))} · p95 {fmt(percentile(values, 95))}\n"
+        f"`{sparkline(values)}`"
+    )
+
+
+def _window_text(sampler) -> Optional[str]:
+    if len(sampler.history) < 2:
+        return None
+    minutes = (sampler.history[-1].taken_at - sampler.history[0].taken_at) / 60
+    return f"最近 {minutes:.0f} 分钟 · {len(sampler.history)} 个样本"
 
 
 async def build_status_embed(bot_instance) -> discord.Embed:
-    # 获取各项状态
-    system_status = await get_system_status()
-    
+    # 资源数据来自后台采样器的滚动历史，查询时不做阻塞式采样
+    sampler = bot_instance.get_cog('ResourceSampler')
+
     # Discord延迟
     dc_latency = round(bot_instance.latency * 1000) if bot_instance.latency else "N/A"
     
@@ -25,14 +49,24 @@ async def build_status_embed(bot_instance) -> discord.Embed:
         title="📊 系统与机器人状态",
         color=discord.Color.blue()
     )
-    
-    # 添加字段
-    embed.add_field(name="🖥️ 主机 CPU", value=f"{system_status['cpu_usage']}%", inline=True)
-    embed.add_field(name="🧠 主机 RAM", value=f"{system_status['ram_usage']}%", inline=True)
-    embed.add_field(name=" ", value=" ", inline=True)
-    
+
+    if sampler is None or not sampler.history:
+        embed.description = "资源采样器尚未产生数据，请稍后再试"
+    else:
+        window = _window_text(sampler)
+        if window:
+            embed.description = window
+        embed.add_field(name="🖥️ 进程 CPU", value=_summary(sampler.series('cpu_percent'), lambda v: f"{v:.1f}%"), inline=True)
+        embed.add_field(name="🧠 进程内存 (RSS)", value=_summary(sampler.series('rss_bytes'), _format_bytes), inline=True)
+        embed.add_field(name="⏱️ 事件循环延迟", value=_summary(sampler.series('loop_lag_ms'), lambda v: f"{v:.0f} ms"), inline=True)
+        latest = sampler.history[-1]
+        embed.add_field(name="📂 打开的文件句柄", value=str(latest.open_files), inline=True)
+        embed.add_field(name="🧵 asyncio 任务", value=str(latest.task_count), inline=True)
+        embed.add_field(name=" ", value=" ", inline=True)
+
+    gateway_series = sampler.series('gateway_latency_ms') if sampler else []
     embed.add_field(name="<:logosdiscordicon:1383323627579244664> Discord 延迟", 
-                   value=f"{dc_latency} ms" if isinstance(dc_latency, int) else dc_latency, 
+                   value=_summary(gateway_series, lambda v: f"{v:.0f} ms") if gateway_series else (f"{dc_latency} ms" if isinstance(dc_latency, int) else dc_latency), 
                    inline=True)
     
     
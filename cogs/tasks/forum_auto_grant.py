@@ -0,0 +1,243 @@
+import discord
+from discord.ext import commands
+import logging
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+from utils.metrics import timed_file_io
+
+logger = logging.getLogger('discord_bot.cogs.tasks.forum_auto_grant')
+
+CONFIG_FILE = os.path.join('data', 'role_auto_apply.json')
+# 每个论坛上次完整补扫时见到的最新归档时间 (时间戳)；启动补扫只翻页到这个时间为止
+# 已归档的帖子无法再被添加反应，更早归档的帖子在上次补扫时已检查过，重新激活后再归档的帖子归档时间会更新
+SCAN_STATE_FILE = os.path.join('data', 'forum_auto_grant_scan.json')
+
+# 补扫时每批检查的帖子数量，以及批次之间的间隔 (秒)
+SCAN_BATCH_SIZE = 25
+SCAN_BATCH_DELAY_SECONDS = 2
+
+
+class ForumAutoGrant(commands.Cog):
+    """
+    论坛帖子反应数达标后自动发放身份组
+
+    - 每个论坛频道的身份组与反应数阈值持久化保存在 data/role_auto_apply.json
+    - 开启自动发放 (auto_grant) 的论坛，由 ForumReactionCache 的 starter_reaction_add 事件实时发放
+    - 启动时分批补扫这些论坛的活跃帖子与上次补扫后新归档的帖子，补发离线期间达标的身份组
+    - 新增或修改规则时完整补扫该论坛
+    """
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        # 论坛频道ID字符串 -> (身份组ID字符串 -> {"threshold": int, "auto_grant": bool})
+        self.forums: Dict[str, Dict[str, Dict]] = self.load_config()
+        # 论坛频道ID字符串 -> 上次完整补扫时见到的最新归档时间戳
+        self.scan_marks: Dict[str, float] = self.load_scan_state()
+        self._scan_tasks = set()
+
+    async def cog_load(self):
+        self._spawn(self._startup_scan())
+
+    def cog_unload(self):
+        for task in self._scan_tasks:
+            task.cancel()
+        cache = self.bot.get_cog('ForumReactionCache')
+        if cache:
+            cache.watched_forums.clear()
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._scan_tasks.add(task)
+        task.add_done_callback(self._scan_tasks.discard)
+
+    @timed_file_io('role_auto_apply.json', 'read')
+    def load_config(self) -> Dict[str, Dict[str, Dict]]:
+        """从 JSON 文件加载论坛阈值配置"""
+        try:
+            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @timed_file_io('role_auto_apply.json', 'write')
+    def save_config(self):
+        """原子地将论坛阈值配置保存到 JSON 文件"""
+        os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
+        tmp_path = f"{CONFIG_FILE}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.forums, f, indent=4)
+        os.replace(tmp_path, CONFIG_FILE)
+
+    @timed_file_io('forum_auto_grant_scan.json', 'read')
+    def load_scan_state(self) -> Dict[str, float]:
+        """加载各论坛的补扫进度"""
+        try:
+            with open(SCAN_STATE_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @timed_file_io('forum_auto_grant_scan.json', 'write')
+    def save_scan_state(self):
+        """原子地保存各论坛的补扫进度"""
+        os.makedirs(os.path.dirname(SCAN_STATE_FILE), exist_ok=True)
+        tmp_path = f"{SCAN_STATE_FILE}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.scan_marks, f, indent=4)
+        os.replace(tmp_path, SCAN_STATE_FILE)
+
+    def get_threshold(self, forum_id: int, role_id: int) -> Optional[int]:
+        """返回已保存的论坛/身份组阈值，未配置时返回 None"""
+        rule = self.forums.get(str(forum_id), {}).get(str(role_id))
+        return rule['threshold'] if rule else None
+
+    def auto_grant_forum_ids(self) -> List[int]:
+        return [
+            int(forum_id) for forum_id, rules in self.forums.items()
+            if any(rule.get('auto_grant') for rule in rules.values())
+        ]
+
+    def _auto_grant_rules(self, forum_id: int) -> List[Tuple[int, int]]:
+        """返回论坛中开启自动发放的 (身份组ID, 阈值) 列表"""
+        rules = self.forums.get(str(forum_id), {})
+        return [(int(role_id), rule['threshold']) for role_id, rule in rules.items() if rule.get('auto_grant')]
+
+    def set_rule(self, forum: discord.ForumChannel, role: discord.Role, threshold: int, auto_grant: bool):
+        """保存论坛的身份组阈值；开启自动发放时立即在后台完整补扫该论坛"""
+        self.forums.setdefault(str(forum.id), {})[str(role.id)] = {
+            "threshold": threshold,
+            "auto_grant": auto_grant
+        }
+        self.save_config()
+        # 规则变化后之前的补扫进度不再有效，完整补扫完成前重启也需要从头补扫
+        if self.scan_marks.pop(str(forum.id), None) is not None:
+            self.save_scan_state()
+        self._update_watched_forums()
+        if auto_grant:
+            self._spawn(self._scan_forums([forum]))
+
+    def _update_watched_forums(self):
+        cache = self.bot.get_cog('ForumReactionCache')
+        if not cache:
+            logger.warning("ForumReactionCache 未加载，论坛自动发放只能依靠启动时的补扫")
+            return
+        cache.watched_forums = set(self.auto_grant_forum_ids())
+
+    async def _grant_if_eligible(self, thread: discord.Thread, peak: int, rules: List[Tuple[int, int]]):
+        """为达到阈值且尚未拥有身份组的帖子作者发放身份组"""
+        guild = thread.guild
+        member = guild.get_member(thread.owner_id) if thread.owner_id else None
+        if member is None:
+            return
+        roles = [
+            role for role in (guild.get_role(role_id) for role_id, threshold in rules if peak >= threshold)
+            if role is not None and role not in member.roles
+        ]
+        if not roles:
+            return
+        try:
+            await member.add_roles(*roles, reason=f"论坛帖子 {thread.id} 最高反应数达到 {peak}，自动发放")
+            logger.info(f"帖子 {thread.id} 最高反应数 {peak}，已为作者 {member.id} 自动发放身份组 {[role.id for role in roles]}")
+        except discord.Forbidden:
+            logger.error(f"机器人权限不足，无法为用户 {member.id} 自动发放身份组 {[role.id for role in roles]}")
+        except discord.HTTPException as e:
+            logger.error(f"为用户 {member.id} 自动发放身份组失败: {e}")
+
+    def _owner_missing_roles(self, thread: discord.Thread, rules: List[Tuple[int, int]]) -> bool:
+        """帖子作者仍在服务器且至少缺少一个可发放的身份组"""
+        member = thread.guild.get_member(thread.owner_id) if thread.owner_id else None
+        if member is None:
+            return False
+        member_role_ids = {role.id for role in member.roles}
+        return any(role_id not in member_role_ids for role_id, _ in rules)
+
+    @commands.Cog.listener()
+    async def on_starter_reaction_add(self, thread: discord.Thread, entry):
+        rules = self._auto_grant_rules(thread.parent_id)
+        if rules:
+            await self._grant_if_eligible(thread, entry.peak, rules)
+
+    async def scan_forum(self, forum: discord.ForumChannel):
+        """
+        分批检查论坛中的活跃帖子与上次补扫后归档的帖子，为达标的作者补发身份组
+        全部帖子检查完成后记录本次见到的最新归档时间
+        """
+        rules = self._auto_grant_rules(forum.id)
+        cache = self.bot.get_cog('ForumReactionCache')
+        if not rules or not cache:
+            return
+
+        since = self.scan_marks.get(str(forum.id))
+        newest = since
+        complete = True
+        threads = list(forum.threads)
+        try:
+            # 已归档的帖子按归档时间从新到旧返回
+            async for thread in forum.archived_threads(limit=None):
+                archived_at = thread.archive_timestamp.timestamp()
+                if since is not None and archived_at <= since:
+                    break
+                newest = archived_at if newest is None else max(newest, archived_at)
+                threads.append(thread)
+        except discord.HTTPException as e:
+            logger.error(f"获取论坛 {forum.id} 的已归档帖子失败: {e}")
+            complete = False
+
+        # 作者已拥有全部身份组或已离开服务器的帖子无需获取起始消息
+        candidates = [thread for thread in threads if self._owner_missing_roles(thread, rules)]
+        logger.info(
+            f"开始补扫论坛 {forum.id}: 共 {len(threads)} 个帖子"
+            f"{' (上次补扫后归档的)' if since is not None else ''}，其中 {len(candidates)} 个需要检查反应数"
+        )
+
+        for start in range(0, len(candidates), SCAN_BATCH_SIZE):
+            batch = candidates[start:start + SCAN_BATCH_SIZE]
+            results = await asyncio.gather(
+                *(cache.get_starter_reactions(thread) for thread in batch),
+                return_exceptions=True
+            )
+            for thread, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.debug(f"无法获取帖子 {thread.id} 的起始消息: {result}")
+                    # 未能检查的帖子需在下次补扫时重试，不推进进度
+                    complete = False
+                    continue
+                await self._grant_if_eligible(thread, result.peak, rules)
+            if start + SCAN_BATCH_SIZE < len(candidates):
+                await asyncio.sleep(SCAN_BATCH_DELAY_SECONDS)
+
+        # 补扫期间规则被修改 (进度已被清除) 时不写入过时的进度
+        if complete and newest is not None and newest != since and self.scan_marks.get(str(forum.id)) == since:
+            self.scan_marks[str(forum.id)] = newest
+            self.save_scan_state()
+
+    async def _scan_forums(self, forums: List[discord.ForumChannel]):
+        try:
+            for forum in forums:
+                await self.scan_forum(forum)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"论坛自动发放补扫时发生错误: {e}", exc_info=True)
+
+    async def _startup_scan(self):
+        """等待机器人就绪后关注自动发放论坛，并逐个补扫"""
+        await self.bot.wait_until_ready()
+        self._update_watched_forums()
+        forums = []
+        for forum_id in self.auto_grant_forum_ids():
+            forum = self.bot.get_channel(forum_id)
+            if isinstance(forum, discord.ForumChannel):
+                forums.append(forum)
+            else:
+                logger.warning(f"找不到自动发放配置中的论坛频道 {forum_id}")
+        await self._scan_forums(forums)
+
+
+async def setup(bot: commands.Bot):
+    """异步 setup 函数，用于加载 Cog"""
+    await bot.add_cog(ForumAutoGrant(bot))
+    logger.info("ForumAutoGrant Cog 已成功加载")
@@ -0,0 +1,91 @@
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from typing import Optional
+from discord.ext import commands
+import config
+from utils.token_bucket import TokenBucket
+
+logger = logging.getLogger('discord_bot.cogs.tasks.loop_watchdog')
+
+# 事件循环心跳间隔 (秒)
+HEARTBEAT_INTERVAL_SECONDS = 0.05
+# 看门狗自身的日志限流：最多连续报告 REPORT_BURST 次，之后每分钟恢复 REPORTS_PER_MINUTE 次
+REPORT_BURST = 5
+REPORTS_PER_MINUTE = 6
+# 报告中保留的最内层栈帧数量
+STACK_DEPTH = 15
+
+
+class LoopWatchdog(commands.Cog):
+    """
+    事件循环阻塞看门狗 (通过 LOOP_WATCHDOG_MS 启用)
+
+    事件循环定期更新心跳；独立的守护线程发现心跳超过阈值未更新时，
+    立即采样事件循环所在线程的调用栈并写入日志，从而定位阻塞事件循环的代码
+    每次阻塞只报告一次，报告数量受令牌桶限制
+    """
+    def __init__(self, bot: commands.Bot, threshold_ms: int = config.LOOP_WATCHDOG_MS):
+        self.bot = bot
+        self.threshold = threshold_ms / 1000
+        self._last_tick = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat: Optional[asyncio.TimerHandle] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._bucket = TokenBucket(REPORT_BURST, REPORTS_PER_MINUTE / 60, time.monotonic())
+        self._suppressed = 0
+
+    async def cog_load(self):
+        if not self.threshold:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._tick()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"事件循环看门狗已启用，阈值 {self.threshold * 1000:.0f} ms")
+
+    async def cog_unload(self):
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.cancel()
+
+    def _tick(self):
+        self._last_tick = time.monotonic()
+        self._heartbeat = asyncio.get_running_loop().call_later(HEARTBEAT_INTERVAL_SECONDS, self._tick)
+
+    def _watch(self):
+        reported_tick = None
+        check_interval = min(self.threshold / 4, HEARTBEAT_INTERVAL_SECONDS)
+        while not self._stop.wait(check_interval):
+            last_tick = self._last_tick
+            stalled = time.monotonic() - last_tick
+            # 心跳间隔本身不计入阻塞时间；同一次阻塞只报告一次
+            if stalled - HEARTBEAT_INTERVAL_SECONDS < self.threshold or last_tick == reported_tick:
+                continue
+            reported_tick = last_tick
+            self._report(stalled)
+
+    def _report(self, stalled: float):
+        now = time.monotonic()
+        if self._bucket.retry_after(now):
+            self._suppressed += 1
+            return
+        self._bucket.consume()
+
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = "".join(traceback.format_stack(frame)[-STACK_DEPTH:])
+        suppressed = f" (此前另有 {self._suppressed} 次阻塞因限流未报告)" if self._suppressed else ""
+        self._suppressed = 0
+        logger.warning(f"事件循环已阻塞 {stalled * 1000:.0f} ms{suppressed}，当前调用栈:\n{stack}")
+
+
+async def setup(bot: commands.Bot):
+    """异步 setup 函数，用于加载 Cog"""
+    await bot.add_cog(LoopWatchdog(bot))
+    logger.info("LoopWatchdog Cog 已成功加载")
@@ -0,0 +1,121 @@
+import logging
+from aiohttp import web
+import discord
+from discord import app_commands
+from discord.ext import commands
+from discord.webhook.async_ import async_context
+import config
+from utils.metrics import registry, route_label, COMMAND_LATENCY, REST_REQUESTS, REST_RATE_LIMITED, GATEWAY_EVENTS
+
+logger = logging.getLogger('discord_bot.cogs.tasks.metrics_server')
+
+METRICS_HOST = '127.0.0.1'
+
+
+class _RateLimitLogHandler(logging.Handler):
+    """discord.py 在内部处理 429 并重试，只能从 discord.http 的警告日志中统计"""
+
+    def emit(self, record: logging.LogRecord):
+        if isinstance(record.msg, str) and record.msg.startswith('We are being rate limited.') and len(record.args or ()) >= 2:
+            method, url = record.args[0], record.args[1]
+            REST_RATE_LIMITED.inc(route_label(str(method), str(url)))
+
+
+class MetricsServer(commands.Cog):
+    """
+    在 127.0.0.1 上以 Prometheus 文本格式提供进程内指标
+
+    指标由 utils.metrics 中的计数器在各处增量更新，本 Cog 只负责：
+    - 包装 HTTPClient.request 与默认 webhook 适配器的 request 统计每个路由的 REST 请求数
+      (交互回调与 followup 经由 webhook 适配器发出，不经过 HTTPClient)
+    - 从 discord.http 日志统计 429；webhook 适配器的限速日志不含路由，交互回调与 followup 的 429 不计入
+    - 包装网关事件解析函数 (ConnectionState.parsers) 同步统计网关事件，不为每个事件创建监听任务
+    - 统计斜杠命令耗时
+    - 提供 /metrics HTTP 端点
+    """
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self._runner = None
+        self._log_handler = _RateLimitLogHandler(level=logging.WARNING)
+        self._original_parsers = {}
+
+    async def cog_load(self):
+        self._wrap_http()
+        self._wrap_webhook_adapter()
+        self._wrap_parsers()
+        logging.getLogger('discord.http').addHandler(self._log_handler)
+        if config.METRICS_PORT:
+            await self._start_server()
+
+    async def cog_unload(self):
+        logging.getLogger('discord.http').removeHandler(self._log_handler)
+        # 移除实例上的包装，恢复类方法
+        self.bot.http.__dict__.pop('request', None)
+        async_context.get().__dict__.pop('request', None)
+        # 解析函数表被网关连接按引用共享，原地恢复即可立即生效
+        self.bot._connection.parsers.update(self._original_parsers)
+        self._original_parsers = {}
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _wrap_http(self):
+        http = self.bot.http
+        original = http.request
+
+        async def request(route, **kwargs):
+            REST_REQUESTS.inc(route_label(route.method, route.url))
+            return await original(route, **kwargs)
+
+        http.request = request
+
+    def _wrap_webhook_adapter(self):
+        adapter = async_context.get()
+        original = adapter.request
+
+        async def request(route, *args, **kwargs):
+            REST_REQUESTS.inc(route_label(route.method, route.url))
+            return await original(route, *args, **kwargs)
+
+        adapter.request = request
+
+    def _wrap_parsers(self):
+        parsers = self.bot._connection.parsers
+        self._original_parsers = dict(parsers)
+        for event_type, parse in self._original_parsers.items():
+            parsers[event_type] = self._counting_parser(event_type, parse)
+
+    @staticmethod
+    def _counting_parser(event_type: str, parse):
+        def parser(data):
+            GATEWAY_EVENTS.inc(event_type)
+            return parse(data)
+        return parser
+
+    async def _start_server(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, METRICS_HOST, config.METRICS_PORT).start()
+        except OSError as e:
+            logger.error(f"无法在 {METRICS_HOST}:{config.METRICS_PORT} 启动指标端点: {e}")
+            await self._runner.cleanup()
+            self._runner = None
+            return
+        logger.info(f"指标端点已启动: http://{METRICS_HOST}:{config.METRICS_PORT}/metrics")
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode('utf-8'), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(self, interaction: discord.Interaction, command: app_commands.Command):
+        elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        COMMAND_LATENCY.observe(max(0.0, elapsed), command.qualified_name)
+
+
+async def setup(bot: commands.Bot):
+    """异步 setup 函数，用于加载 Cog"""
+    await bot.add_cog(MetricsServer(bot))
+    logger.info("MetricsServer Cog 已成功加载")
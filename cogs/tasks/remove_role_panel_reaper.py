@@ -0,0 +1,106 @@
+import discord
+from discord.ext import commands, tasks
+import logging
+import asyncio
+
+try:
+    from ..mod.remove_role_state import load_all_panel_states, load_panel_state, remove_panel_state, remove_panel_states
+except ImportError:
+    from cogs.mod.remove_role_state import load_all_panel_states, load_panel_state, remove_panel_state, remove_panel_states
+
+logger = logging.getLogger('discord_bot.cogs.tasks.remove_role_panel_reaper')
+
+# 每批检查的面板数量，以及批次之间的间隔 (秒)，避免一次性消耗过多的 API 配额
+REAP_BATCH_SIZE = 25
+REAP_BATCH_DELAY_SECONDS = 5
+
+
+class RemoveRolePanelReaper(commands.Cog):
+    """
+    清理已失效的自助移除身份组面板
+
+    - 面板消息被删除时通过原始事件立即移除其状态
+    - 定期分批检查剩余面板，移除消息或频道已不存在的面板
+    - 缺少频道信息的旧面板无法检查，保留到其消息被删除，或被使用时补记频道后再纳入检查
+    """
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.reap_orphaned_panels.start()
+
+    def cog_unload(self):
+        self.reap_orphaned_panels.cancel()
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        if load_panel_state(payload.message_id) is not None:
+            remove_panel_state(payload.message_id)
+            logger.info(f"面板消息 {payload.message_id} 已被删除，已移除其状态")
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        removed = remove_panel_states(payload.message_ids)
+        if removed:
+            logger.info(f"频道 {payload.channel_id} 批量删除消息，已移除 {removed} 个面板状态")
+
+    async def _is_orphaned(self, message_id: int, channel_id: int) -> bool:
+        """判断面板的消息或频道是否已不存在；无法确定时返回 False"""
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            try:
+                channel = await self.bot.fetch_channel(channel_id)
+            except discord.NotFound:
+                return True
+            except discord.HTTPException as e:
+                logger.debug(f"无法获取面板 {message_id} 所在的频道 {channel_id}: {e}")
+                return False
+
+        if not hasattr(channel, 'get_partial_message'):
+            return False
+
+        try:
+            await channel.get_partial_message(message_id).fetch()
+        except discord.NotFound:
+            return True
+        except discord.HTTPException as e:
+            logger.debug(f"无法获取面板消息 {message_id}: {e}")
+        return False
+
+    @tasks.loop(hours=6.0)
+    async def reap_orphaned_panels(self):
+        """分批检查所有面板，移除已失效的面板"""
+        panels = load_all_panel_states()
+        candidates = [
+            (int(message_id), state['channel_id'])
+            for message_id, state in panels.items()
+            if state.get('channel_id')
+        ]
+        unknown_channel = len(panels) - len(candidates)
+        logger.debug(f"开始检查 {len(candidates)} 个面板 (另有 {unknown_channel} 个旧面板缺少频道信息，将在被使用时补记)")
+
+        orphaned = []
+        for start in range(0, len(candidates), REAP_BATCH_SIZE):
+            batch = candidates[start:start + REAP_BATCH_SIZE]
+            results = await asyncio.gather(
+                *(self._is_orphaned(message_id, channel_id) for message_id, channel_id in batch)
+            )
+            orphaned.extend(message_id for (message_id, _), gone in zip(batch, results) if gone)
+            if start + REAP_BATCH_SIZE < len(candidates):
+                await asyncio.sleep(REAP_BATCH_DELAY_SECONDS)
+
+        if orphaned:
+            removed = remove_panel_states(orphaned)
+            logger.info(f"已清理 {removed} 个消息或频道已不存在的面板")
+
+    @reap_orphaned_panels.before_loop
+    async def before_reap_orphaned_panels(self):
+        """在任务循环开始前等待机器人准备就绪"""
+        await self.bot.wait_until_ready()
+
+    @reap_orphaned_panels.error
+    async def reap_orphaned_panels_error(self, error):
+        """处理任务循环中的错误"""
+        logger.error(f"任务错误: {error}", exc_info=True)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(RemoveRolePanelReaper(bot))
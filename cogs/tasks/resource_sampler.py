@@ -0,0 +1,130 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import List, Optional, Sequence
+import psutil
+from discord.ext import commands, tasks
+from utils.metrics import PROCESS_RSS, PROCESS_CPU, EVENT_LOOP_LAG, ASYNCIO_TASKS
+
+logger = logging.getLogger('discord_bot.cogs.tasks.resource_sampler')
+
+# 采样间隔 (秒) 与保留的样本数 (默认 1 小时)
+SAMPLE_INTERVAL_SECONDS = 10
+HISTORY_SIZE = 360
+# 事件循环延迟探针的唤醒间隔 (秒)
+LAG_PROBE_INTERVAL_SECONDS = 0.25
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+class ResourceSample:
+    """一次资源采样"""
+    __slots__ = ('taken_at', 'rss_bytes', 'cpu_percent', 'open_files', 'task_count', 'loop_lag_ms', 'gateway_latency_ms')
+
+    def __init__(self, rss_bytes: int, cpu_percent: float, open_files: int, task_count: int, loop_lag_ms: float, gateway_latency_ms: Optional[float]):
+        self.taken_at = time.time()
+        self.rss_bytes = rss_bytes
+        self.cpu_percent = cpu_percent
+        self.open_files = open_files
+        self.task_count = task_count
+        self.loop_lag_ms = loop_lag_ms
+        self.gateway_latency_ms = gateway_latency_ms
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """最近秩法百分位数，空序列返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def sparkline(values: Sequence[float], width: int = 30) -> str:
+    """把序列压缩为 width 个字符的迷你折线图 (每格取该段的最大值)"""
+    if not values:
+        return ""
+    step = max(1, math.ceil(len(values) / width))
+    points = [max(values[i:i + step]) for i in range(0, len(values), step)]
+    low, high = min(points), max(points)
+    if high == low:
+        return SPARK_CHARS[0] * len(points)
+    scale = (len(SPARK_CHARS) - 1) / (high - low)
+    return "".join(SPARK_CHARS[round((point - low) * scale)] for point in points)
+
+
+class ResourceSampler(commands.Cog):
+    """
+    后台资源采样器
+
+    定期记录本进程的 RSS、CPU、打开的文件句柄、asyncio 任务数、事件循环延迟和网关延迟，
+    保留滚动历史供 /status 展示，查询时不再进行阻塞式采样
+    """
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.history: deque = deque(maxlen=HISTORY_SIZE)
+        self.process = psutil.Process(os.getpid())
+        # 上次采样以来观测到的最大事件循环延迟 (秒)
+        self._max_lag = 0.0
+        self._lag_probe = None
+
+    async def cog_load(self):
+        # psutil 的进程 CPU 占用基于两次调用之间的差值，先调用一次作为基准
+        self.process.cpu_percent(None)
+        self._lag_probe = asyncio.create_task(self._probe_loop_lag())
+        self.sample.start()
+
+    def cog_unload(self):
+        self.sample.cancel()
+        if self._lag_probe:
+            self._lag_probe.cancel()
+
+    async def _probe_loop_lag(self):
+        """定期休眠并测量实际唤醒比预期晚了多久"""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LAG_PROBE_INTERVAL_SECONDS
+            await asyncio.sleep(LAG_PROBE_INTERVAL_SECONDS)
+            self._max_lag = max(self._max_lag, loop.time() - expected)
+
+    def _open_files(self) -> int:
+        try:
+            return self.process.num_fds() if hasattr(self.process, 'num_fds') else self.process.num_handles()
+        except psutil.Error:
+            return 0
+
+    @tasks.loop(seconds=SAMPLE_INTERVAL_SECONDS)
+    async def sample(self):
+        latency = self.bot.latency
+        lag, self._max_lag = self._max_lag, 0.0
+        entry = ResourceSample(
+            rss_bytes=self.process.memory_info().rss,
+            cpu_percent=self.process.cpu_percent(None),
+            open_files=self._open_files(),
+            task_count=len(asyncio.all_tasks()),
+            loop_lag_ms=lag * 1000,
+            gateway_latency_ms=latency * 1000 if latency and math.isfinite(latency) else None,
+        )
+        self.history.append(entry)
+        PROCESS_RSS.set(entry.rss_bytes)
+        PROCESS_CPU.set(entry.cpu_percent)
+        EVENT_LOOP_LAG.set(lag)
+        ASYNCIO_TASKS.set(entry.task_count)
+
+    @sample.error
+    async def sample_error(self, error):
+        """处理任务循环中的错误"""
+        logger.error(f"资源采样任务错误: {error}", exc_info=True)
+
+    def series(self, field: str) -> List[float]:
+        """返回历史中某个字段的序列 (跳过缺失值)"""
+        return [value for value in (getattr(entry, field) for entry in self.history) if value is not None]
+
+
+async def setup(bot: commands.Bot):
+    """异步 setup 函数，用于加载 Cog"""
+    await bot.add_cog(ResourceSampler(bot))
+    logger.info("ResourceSampler Cog 已成功加载")
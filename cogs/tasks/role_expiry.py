@@ -10,11 +10,17 @@ import json
 # 导入共享的日志加载/保存函数和配置
 try:
     from ..mod.role_assigner_logic import _load_assignment_log, _save_assignment_log
+    from .user_role_formatter import format_role_assignments
+    from .user_role_store import replace_user_roles, run_locked
     import config # 导入根目录的 config
 except ImportError:
    
     from cogs.mod.role_assigner_logic import _load_assignment_log, _save_assignment_log
+    from cogs.tasks.user_role_formatter import format_role_assignments
+    from cogs.tasks.user_role_store import replace_user_roles, run_locked
     import config
+from utils.id_set import IdSet
+from utils.metrics import EXPIRY_PASS_DURATION, EXPIRY_BACKLOG, BULK_OPERATIONS
 
 logger = logging.getLogger('discord_bot.cogs.tasks.role_expiry')
 logger.setLevel(logging.DEBUG)  # 确保日志级别为DEBUG
@@ -40,20 +46,17 @@ class RoleExpiryTask(commands.Cog):
     # @tasks.loop(seconds=10)
     async def check_expired_roles(self):
         """定期检查并处理过期的身份组分配记录"""
+        with EXPIRY_PASS_DURATION.time():
+            await self._check_expired_roles()
+
+    async def _check_expired_roles(self):
         logger.debug("开始检查过期的身份组分配...")
         try:
-            exited_user_ids = set()
-            removed_dir = "data/removed"
-            if os.path.exists(removed_dir):
-                for fname in os.listdir(removed_dir):
-                    if fname.endswith(".json"):
-                        fpath = os.path.join(removed_dir, fname)
-                        try:
-                            with open(fpath, "r", encoding="utf-8") as f:
-                                exited_data = json.load(f)
-                                exited_user_ids.update(exited_data.get("data", []))
-                        except Exception as e:
-                            logger.error(f"读取排除名单文件 {fpath} 失败: {e}")
+            exclusion_cog = self.bot.get_cog("RemovalExclusionLogic")
+            if exclusion_cog:
+                await exclusion_cog.wait_until_loaded()
+            else:
+                logger.warning("RemovalExclusionLogic 未加载，本次检查不会跳过自助退出的用户")
 
             log_data = _load_assignment_log()
             if not isinstance(log_data, list):
@@ -63,6 +66,8 @@ class RoleExpiryTask(commands.Cog):
             current_time = time.time()
             logs_to_keep = []
             processed_operations = 0
+            # 已过期但未能完全处理、留待下次重试的操作数
+            backlog = 0
 
             for operation_entry in log_data:
                 if not isinstance(operation_entry, list) or len(operation_entry) != 2:
@@ -162,12 +167,15 @@ class RoleExpiryTask(commands.Cog):
                             operation_fully_processed = False
                             continue
 
-                        for user_id in assigned_user_ids:
-                            # 跳过自动退出名单中的用户
-                            if str(user_id) in exited_user_ids:
-                                logger.debug(f"用户 {user_id} 在自动退出名单，跳过补偿身份组")
-                                continue
+                        # 跳过主动移除过本操作中任一身份组的用户
+                        exited_user_ids = exclusion_cog.get_excluded(guild_id, old_role_ids) if exclusion_cog else IdSet()
+                        assigned_id_set = IdSet(assigned_user_ids)
+                        pending_user_ids = assigned_id_set.difference(exited_user_ids)
+                        skipped_count = len(assigned_id_set) - len(pending_user_ids)
+                        if skipped_count:
+                            logger.debug(f"操作 {operation_id} 中有 {skipped_count} 名用户在自动退出名单，跳过补偿身份组")
 
+                        for user_id in pending_user_ids:
                             member = None
                             try:
                                 member = await guild.fetch_member(user_id)
@@ -216,11 +224,13 @@ class RoleExpiryTask(commands.Cog):
                                         operation_fully_processed = False
                                 else:
                                     logger.debug(f"用户 {user_id} 已有替换身份组")
+                                BULK_OPERATIONS.inc('role_expiry', 'processed')
 
 
                     if not operation_fully_processed:
                         logger.warning(f"操作 {operation_id} 未完全处理")
                         logs_to_keep.append(operation_entry)
+                        backlog += 1
                     else:
                         logger.debug(f"操作 {operation_id} 处理完成")
 
@@ -228,10 +238,13 @@ class RoleExpiryTask(commands.Cog):
                     # 未过期，保留日志
                     logs_to_keep.append(operation_entry)
 
+            EXPIRY_BACKLOG.set(backlog)
+
             # 保存更新后的日志 (仅当日志内容有变动时)
             if len(logs_to_keep) != len(log_data):
                 logger.debug(f"保存日志变更，处理了 {processed_operations} 个操作")
                 _save_assignment_log(logs_to_keep)
+                await self.refresh_user_role_view(log_data, logs_to_keep)
 
             # 发送处理结果到日志频道
             # logger.debug(f"准备发送处理结果到日志频道，LOG_CHANNEL_ID: {config.LOG_CHANNEL_ID}")
@@ -267,6 +280,35 @@ class RoleExpiryTask(commands.Cog):
         except Exception as e:
             logger.error(f"检查过期身份组错误: {e}", exc_info=True)
 
+    async def refresh_user_role_view(self, old_log: list, new_log: list):
+        """
+        增量更新以用户为中心的视图：只重新计算被移除的过期操作所涉及的用户
+        """
+        kept_entries = {id(entry) for entry in new_log}
+        # 先收集全部用户ID，最后一次性构建 IdSet，避免在循环中反复复制有序数组
+        affected_ids: list = []
+        for operation_entry in old_log:
+            if id(operation_entry) in kept_entries:
+                continue
+            if not isinstance(operation_entry, list) or len(operation_entry) != 2:
+                continue
+            details = operation_entry[1]
+            if not isinstance(details, dict) or not isinstance(details.get('data'), list):
+                continue
+            for assignment in details['data']:
+                if isinstance(assignment, dict) and isinstance(assignment.get('assigned_user_ids'), list):
+                    affected_ids.extend(assignment['assigned_user_ids'])
+
+        affected_user_ids = IdSet(affected_ids)
+        if not affected_user_ids:
+            return
+        try:
+            recomputed = await asyncio.to_thread(format_role_assignments, new_log, affected_user_ids)
+            changed_shards = await run_locked(replace_user_roles, affected_user_ids, recomputed)
+            logger.debug(f"已增量更新 {len(affected_user_ids)} 名用户的角色视图，重写了 {changed_shards} 个分片")
+        except Exception as e:
+            logger.error(f"增量更新用户角色视图失败: {e}", exc_info=True)
+
     @check_expired_roles.before_loop
     async def before_check_expired_roles(self):
         """在任务循环开始前等待机器人准备就绪"""
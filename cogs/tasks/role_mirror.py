@@ -0,0 +1,320 @@
+import discord
+from discord.ext import commands, tasks
+import os
+import logging
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+from utils.id_set import IdSet
+
+try:
+    from ..mod.role_sync_topology import load_topology
+except ImportError:
+    from cogs.mod.role_sync_topology import load_topology
+
+logger = logging.getLogger('discord_bot.cogs.tasks.role_mirror')
+
+# 每个镜像身份组对的基线 (上次两端一致时同时拥有该身份组的成员) 保存在此目录
+BASELINE_DIR = os.path.join('data', 'role_mirror')
+# 自身镜像请求完成后在此时间 (秒) 内到达的对应成员更新事件被识别并忽略，避免来回反弹
+SUPPRESS_TTL_SECONDS = 5
+# 基线变更写入磁盘的间隔 (分钟)
+BASELINE_SAVE_INTERVAL_MINUTES = 5
+
+OP_ADD = True
+OP_REMOVE = False
+
+PairKey = Tuple[int, int, int, int]
+
+
+def pair_key(pair: Dict) -> PairKey:
+    return (pair['guild_1'], pair['role_1'], pair['guild_2'], pair['role_2'])
+
+
+def baseline_path(key: PairKey) -> str:
+    return os.path.join(BASELINE_DIR, "{}_{}_{}_{}.bin".format(*key))
+
+
+def _save_baselines(snapshots: Dict[PairKey, IdSet]):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    for key, baseline in snapshots.items():
+        baseline.save(baseline_path(key))
+
+
+class RoleMirror(commands.Cog):
+    """
+    在同步拓扑中标记为 mirror 的身份组对之间实时镜像身份组变化
+
+    - on_member_update 检测成员获得或失去被镜像的身份组，把对应变更放入队列
+    - 同一成员同一目标身份组的多次变更只保留最新状态，由后台工作协程逐个执行
+    - 自身执行的变更会被记录，对端的成员更新事件不会再被反向镜像
+    - 为每个身份组对维护并持久化基线：两端最近一次一致时同时拥有该身份组的成员
+    - 定期 (以及重新连接后) 进行低优先级的补偿对账，按基线判断断线期间哪一端发生了变化，
+      补齐错过的添加，也同步错过的移除
+    """
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        # (服务器ID, 身份组ID) -> [(目标服务器ID, 目标身份组ID)]
+        self.routes: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        # (服务器ID, 身份组ID) -> [(身份组对, 对端服务器ID, 对端身份组ID)]，用于维护基线
+        self.sides: Dict[Tuple[int, int], List[Tuple[PairKey, int, int]]] = {}
+        self.baselines: Dict[PairKey, IdSet] = {}
+        # 有未保存变更的基线
+        self._dirty = set()
+        # (目标服务器ID, 目标身份组ID, 用户ID) -> 最新的目标状态
+        self._pending: Dict[Tuple[int, int, int], bool] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # (服务器ID, 身份组ID, 用户ID, 操作) -> 过期时间，只抵消第一个匹配的事件
+        self._expected: Dict[Tuple[int, int, int, bool], float] = {}
+        self._worker = None
+        self._ready_once = False
+        self.reload_topology()
+
+    async def cog_load(self):
+        self._worker = asyncio.create_task(self._process_queue())
+        self.reconcile.start()
+        self.save_baselines.start()
+
+    async def cog_unload(self):
+        self.reconcile.cancel()
+        self.save_baselines.cancel()
+        if self._worker:
+            self._worker.cancel()
+        await self._flush_baselines()
+
+    def reload_topology(self):
+        """从同步拓扑重建镜像路由，并加载各身份组对的基线"""
+        routes: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        sides: Dict[Tuple[int, int], List[Tuple[PairKey, int, int]]] = {}
+        baselines: Dict[PairKey, IdSet] = {}
+        for pair in self._mirror_pairs():
+            side_1 = (pair['guild_1'], pair['role_1'])
+            side_2 = (pair['guild_2'], pair['role_2'])
+            if pair['direction'] in ("bidirectional", "push"):
+                routes.setdefault(side_1, []).append(side_2)
+            if pair['direction'] in ("bidirectional", "pull"):
+                routes.setdefault(side_2, []).append(side_1)
+            key = pair_key(pair)
+            sides.setdefault(side_1, []).append((key, *side_2))
+            sides.setdefault(side_2, []).append((key, *side_1))
+            baseline = self.baselines.get(key)
+            if baseline is None:
+                baseline = IdSet.load(baseline_path(key)) or IdSet()
+            baselines[key] = baseline
+        self.routes = routes
+        self.sides = sides
+        self.baselines = baselines
+        self._dirty &= set(baselines)
+        logger.info(f"已加载 {len(routes)} 条身份组镜像路由")
+
+    def _mirror_pairs(self) -> List[Dict]:
+        return [pair for pair in load_topology() if pair.get('mirror')]
+
+    def _consume_expected(self, key: Tuple[int, int, int, bool]) -> bool:
+        expires_at = self._expected.pop(key, None)
+        return expires_at is not None and expires_at >= time.monotonic()
+
+    def _expect(self, key: Tuple[int, int, int, bool], ttl: float = SUPPRESS_TTL_SECONDS):
+        now = time.monotonic()
+        if len(self._expected) > 1000:
+            self._expected = {k: v for k, v in self._expected.items() if v >= now}
+        self._expected[key] = now + ttl
+
+    def _enqueue(self, target: Tuple[int, int], user_id: int, op: bool):
+        key = (target[0], target[1], user_id)
+        if key not in self._pending:
+            self._queue.put_nowait(key)
+        self._pending[key] = op
+
+    def _observe(self, key: PairKey, user_id: int, has_role: bool, other_guild_id: int, other_role_id: int):
+        """一端的身份组发生变化后，如果两端状态一致，则把该状态记入基线"""
+        other_guild = self.bot.get_guild(other_guild_id)
+        other = other_guild.get_member(user_id) if other_guild else None
+        if other is None or (other.get_role(other_role_id) is not None) != has_role:
+            return
+        baseline = self.baselines.setdefault(key, IdSet())
+        if baseline.add(user_id) if has_role else baseline.discard(user_id):
+            self._dirty.add(key)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if not self.sides or before.roles == after.roles:
+            return
+
+        guild_id = after.guild.id
+        before_ids = {role.id for role in before.roles}
+        after_ids = {role.id for role in after.roles}
+        changes = [(role_id, OP_ADD) for role_id in after_ids - before_ids]
+        changes += [(role_id, OP_REMOVE) for role_id in before_ids - after_ids]
+
+        for role_id, op in changes:
+            for key, other_guild_id, other_role_id in self.sides.get((guild_id, role_id), ()):
+                self._observe(key, after.id, op, other_guild_id, other_role_id)
+            targets = self.routes.get((guild_id, role_id))
+            if not targets:
+                continue
+            if self._consume_expected((guild_id, role_id, after.id, op)):
+                # 这是本 Cog 镜像过来的变更，不再反向传播
+                continue
+            for target in targets:
+                self._enqueue(target, after.id, op)
+
+    async def _apply(self, guild_id: int, role_id: int, user_id: int, op: bool, reason: str = "身份组实时镜像") -> bool:
+        """把目标成员的身份组设置为期望状态，返回是否实际发出并完成了修改请求"""
+        guild = self.bot.get_guild(guild_id)
+        role = guild.get_role(role_id) if guild else None
+        member = guild.get_member(user_id) if guild else None
+        if role is None or member is None:
+            return False
+        # 目标已处于期望状态时不发出请求
+        if (member.get_role(role_id) is not None) == op:
+            return False
+
+        # 成员更新事件可能早于请求的响应到达，请求期间一直有效，完成后只再保留很短的时间
+        expected = (guild_id, role_id, user_id, op)
+        self._expect(expected, ttl=float('inf'))
+        succeeded = False
+        try:
+            if op == OP_ADD:
+                await member.add_roles(role, reason=reason)
+            else:
+                await member.remove_roles(role, reason=reason)
+            succeeded = True
+        except discord.HTTPException as e:
+            logger.error(f"镜像身份组 {role_id} 到用户 {user_id} (服务器 {guild_id}) 失败: {e}")
+        finally:
+            if not succeeded:
+                self._expected.pop(expected, None)
+            elif expected in self._expected:
+                self._expect(expected)
+        if not succeeded:
+            return False
+        logger.debug(f"已镜像: {'添加' if op else '移除'} 用户 {user_id} 在服务器 {guild_id} 的身份组 {role_id}")
+        return True
+
+    async def _process_queue(self):
+        while True:
+            key = await self._queue.get()
+            op = self._pending.pop(key, None)
+            if op is None:
+                continue
+            try:
+                await self._apply(*key, op)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"处理镜像队列时发生错误: {e}", exc_info=True)
+
+    def _plan_pair(self, pair: Dict) -> Optional[List[Tuple[int, int, int, bool]]]:
+        """
+        比较一个身份组对两端的成员与基线，返回需要执行的 (服务器ID, 身份组ID, 用户ID, 操作)
+
+        某成员只在一端拥有身份组时：若基线中有他 (两端曾经都有)，说明另一端移除了它，
+        在允许从另一端同步过来的方向上移除；否则说明这一端新增了它，在允许同步过去的方向上添加。
+        同时把两端当前一致的状态写入基线。身份组无法解析时返回 None
+        """
+        guild_1 = self.bot.get_guild(pair['guild_1'])
+        guild_2 = self.bot.get_guild(pair['guild_2'])
+        role_1 = guild_1.get_role(pair['role_1']) if guild_1 else None
+        role_2 = guild_2.get_role(pair['role_2']) if guild_2 else None
+        if role_1 is None or role_2 is None:
+            return None
+
+        key = pair_key(pair)
+        baseline = self.baselines.get(key, IdSet())
+        members_1 = IdSet(member.id for member in role_1.members)
+        members_2 = IdSet(member.id for member in role_2.members)
+        direction = pair['direction']
+        ops = []
+        disputed = []
+        # (持有方, 缺少方, 持有方成员, 缺少方成员, 向缺少方同步的方向, 从缺少方同步回来的方向)
+        orientations = (
+            (guild_1, role_1, guild_2, role_2, members_1, members_2, "push", "pull"),
+            (guild_2, role_2, guild_1, role_1, members_2, members_1, "pull", "push"),
+        )
+        for holder_guild, holder_role, lacking_guild, lacking_role, held, lacking_held, outward, inward in orientations:
+            forward = direction in ("bidirectional", outward)
+            backward = direction in ("bidirectional", inward)
+            for user_id in held.difference(lacking_held):
+                if lacking_guild.get_member(user_id) is None:
+                    continue
+                disputed.append(user_id)
+                if backward and user_id in baseline:
+                    ops.append((holder_guild.id, holder_role.id, user_id, OP_REMOVE))
+                elif forward:
+                    ops.append((lacking_guild.id, lacking_role.id, user_id, OP_ADD))
+
+        # 两端一致的成员按当前状态记入基线；仍有分歧的成员保留原有的基线状态
+        self.baselines[key] = members_1.intersection(members_2).union(baseline.intersection(IdSet(disputed)))
+        self._dirty.add(key)
+        return ops
+
+    @tasks.loop(hours=1.0)
+    async def reconcile(self):
+        """低优先级的补偿对账：按基线补齐断线期间错过的添加与移除 (逐个执行)"""
+        ops = []
+        problems = []
+        for pair in self._mirror_pairs():
+            planned = self._plan_pair(pair)
+            if planned is None:
+                problems.append(pair_key(pair))
+            else:
+                ops.extend(planned)
+        if problems:
+            logger.warning(f"镜像对账时无法解析的身份组对: {problems}")
+        if not ops:
+            logger.debug("镜像身份组对已一致，无需对账")
+            await self._flush_baselines()
+            return
+
+        added = removed = 0
+        for guild_id, role_id, user_id, op in ops:
+            if await self._apply(guild_id, role_id, user_id, op, reason="身份组镜像补偿对账"):
+                if op == OP_ADD:
+                    added += 1
+                else:
+                    removed += 1
+        planned_adds = sum(1 for op in ops if op[3] == OP_ADD)
+        logger.info(f"镜像对账完成: 计划 {planned_adds} 次添加、{len(ops) - planned_adds} 次移除，成功添加 {added} 次、移除 {removed} 次")
+        await self._flush_baselines()
+
+    @reconcile.before_loop
+    async def before_reconcile(self):
+        """在任务循环开始前等待机器人准备就绪"""
+        await self.bot.wait_until_ready()
+
+    @reconcile.error
+    async def reconcile_error(self, error):
+        """处理任务循环中的错误"""
+        logger.error(f"任务错误: {error}", exc_info=True)
+
+    async def _flush_baselines(self):
+        """把有变更的基线写入磁盘 (复制后在线程中写入)"""
+        if not self._dirty:
+            return
+        snapshots = {key: IdSet(self.baselines[key]) for key in self._dirty if key in self.baselines}
+        self._dirty = set()
+        try:
+            await asyncio.to_thread(_save_baselines, snapshots)
+        except Exception as e:
+            self._dirty |= set(snapshots)
+            logger.error(f"保存镜像基线失败: {e}")
+
+    @tasks.loop(minutes=BASELINE_SAVE_INTERVAL_MINUTES)
+    async def save_baselines(self):
+        await self._flush_baselines()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # 首次就绪由任务循环负责对账；之后的重新连接 (非恢复会话) 可能错过了事件，立即补偿一次
+        if not self._ready_once:
+            self._ready_once = True
+            return
+        if self.reconcile.is_running():
+            self.reconcile.restart()
+
+
+async def setup(bot: commands.Bot):
+    """异步 setup 函数，用于加载 Cog"""
+    await bot.add_cog(RoleMirror(bot))
+    logger.info("RoleMirror Cog 已成功加载")
@@ -1,53 +1,72 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 import logging
-import json
 import os
-import time
-from datetime import datetime
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from utils.id_set import IdSet
 
 # 导入共享的日志加载/保存函数
 try:
     from ..mod.role_assigner_logic import _load_assignment_log
+    from .user_role_store import save_all_user_roles, store_exists, store_lock, STORE_DIR
     import config
 except ImportError:
     from cogs.mod.role_assigner_logic import _load_assignment_log
+    from cogs.tasks.user_role_store import save_all_user_roles, store_exists, store_lock, STORE_DIR
     import config
 
 # 设置日志记录器
 logger = logging.getLogger('discord_bot.cogs.tasks.user_role_formatter')
 logger.setLevel(logging.DEBUG)
 
-# 用户角色分配文件路径
-USER_ROLE_ASSIGNMENTS_FILE = "data/user_role_assignments.json"
-
 def _ensure_data_dir():
     """确保数据目录存在"""
     data_dir = "data"
     if not os.path.exists(data_dir):
         os.makedirs(data_dir)
 
-def _save_user_role_assignments(data):
-    """保存用户角色分配数据"""
+# 分片存储之前的单文件视图；其内容完全由分配日志派生，分片存储建立后改名保留，不再读取
+LEGACY_VIEW_FILE = os.path.join('data', 'user_role_assignments.json')
+
+def _retire_legacy_view():
+    """把旧版的单文件视图改名为 .migrated，避免与分片存储并存造成混淆"""
+    if not os.path.exists(LEGACY_VIEW_FILE):
+        return
+    try:
+        os.replace(LEGACY_VIEW_FILE, f"{LEGACY_VIEW_FILE}.migrated")
+        logger.info(f"分片存储已就绪，旧版视图 {LEGACY_VIEW_FILE} 已改名为 {LEGACY_VIEW_FILE}.migrated")
+    except OSError as e:
+        logger.warning(f"改名旧版视图 {LEGACY_VIEW_FILE} 失败: {e}")
+
+def _save_user_role_assignments(data) -> int:
+    """保存用户角色分配数据到按用户分片的存储，返回实际重写的分片数量"""
     _ensure_data_dir()
     try:
-        with open(USER_ROLE_ASSIGNMENTS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        logger.debug(f"已保存用户角色分配数据到 {USER_ROLE_ASSIGNMENTS_FILE}")
+        shard_count = save_all_user_roles(data)
+        logger.debug(f"已保存用户角色分配数据到 {STORE_DIR} (重写了 {shard_count} 个分片)")
+        return shard_count
     except Exception as e:
         logger.error(f"保存用户角色分配数据时出错: {e}", exc_info=True)
+        return 0
+
+def format_role_assignments(role_assignments: Optional[list] = None, user_ids: Optional[IdSet] = None) -> Dict[str, Dict[str, List[int]]]:
+    """
+    将角色分配数据从以角色为中心转换为以用户为中心
 
-def format_role_assignments():
-    """将角色分配数据从以角色为中心转换为以用户为中心"""
+    :param role_assignments: 分配日志，为 None 时从文件加载
+    :param user_ids: 只计算这些用户的数据，为 None 时计算全部用户
+    """
     try:
         # 加载角色分配日志
-        role_assignments = _load_assignment_log()
+        if role_assignments is None:
+            role_assignments = _load_assignment_log()
         if not isinstance(role_assignments, list):
             logger.error("角色分配日志格式不正确，应为列表")
             return {}
 
-        # 创建以用户为中心的数据结构
-        user_role_assignments = {}
+        # 创建以用户为中心的数据结构，构建过程中使用集合去重，避免 O(n²) 的列表查找
+        user_role_sets: Dict[str, Dict[str, Dict[int, None]]] = {}
 
         # 遍历所有操作
         for operation_entry in role_assignments:
@@ -74,78 +93,75 @@ def format_role_assignments():
                 if not all([guild_id, isinstance(role_ids, list), isinstance(assigned_user_ids, list)]):
                     continue
 
+                guild_id_str = str(guild_id)
+                # 同一条分配记录中的用户ID先去重，并在需要时只保留指定的用户
+                assignment_user_ids = IdSet(assigned_user_ids)
+                if user_ids is not None:
+                    assignment_user_ids = assignment_user_ids.intersection(user_ids)
+
                 # 为每个用户添加角色信息
-                for user_id in assigned_user_ids:
+                for user_id in assignment_user_ids:
                     user_id_str = str(user_id)
-                    
-                    # 如果用户不在字典中，初始化
-                    if user_id_str not in user_role_assignments:
-                        user_role_assignments[user_id_str] = {}
-                    
-                    # 如果服务器不在用户的字典中，初始化
-                    guild_id_str = str(guild_id)
-                    if guild_id_str not in user_role_assignments[user_id_str]:
-                        user_role_assignments[user_id_str][guild_id_str] = []
-                    
-                    # 添加角色ID到用户的服务器角色列表中
+
+                    # 使用 dict 作为有序集合，保持角色首次出现的顺序
+                    guild_roles = user_role_sets.setdefault(user_id_str, {}).setdefault(guild_id_str, {})
                     for role_id in role_ids:
-                        if role_id not in user_role_assignments[user_id_str][guild_id_str]:
-                            user_role_assignments[user_id_str][guild_id_str].append(role_id)
+                        guild_roles[role_id] = None
+
+        return {
+            user_id_str: {guild_id_str: list(roles) for guild_id_str, roles in guilds.items()}
+            for user_id_str, guilds in user_role_sets.items()
+        }
 
-        return user_role_assignments
-    
     except Exception as e:
         logger.error(f"格式化角色分配数据时出错: {e}", exc_info=True)
         return {}
 
 class UserRoleFormatter(commands.Cog):
     """
-    将角色分配数据从以角色为中心转换为以用户为中心的定时任务
+    维护以用户为中心的角色分配视图
+
+    日常的变更由分配、补充和过期流程增量写入；这里的全量重建仅作为按需的一致性检查，
+    以及首次启动 (尚无分片存储) 时的初始化
     """
     def __init__(self, bot):
         self.bot = bot
-        self.format_user_roles.start()
+        # 与增量更新共用同一把锁
+        self.lock = store_lock
+        self._bootstrap_task = None
+
+    async def cog_load(self):
+        if not store_exists():
+            # 在后台从分配日志初始化 (同时取代旧版的单文件视图)，避免阻塞启动流程
+            self._bootstrap_task = asyncio.create_task(self._bootstrap())
+        else:
+            _retire_legacy_view()
+
+    async def _bootstrap(self):
+        await self.format_user_roles()
+        if store_exists():
+            _retire_legacy_view()
 
     def cog_unload(self):
-        self.format_user_roles.cancel()
-
-    @tasks.loop(hours=1.0)
-    async def format_user_roles(self):
-        """定期将角色分配数据格式化为以用户为中心的结构"""
-        logger.debug("开始格式化用户角色分配数据...")
-        try:
-            # 格式化角色分配数据
-            user_role_assignments = format_role_assignments()
-            
-            # 保存格式化后的数据
-            if user_role_assignments:
-                _save_user_role_assignments(user_role_assignments)
-                logger.info(f"已成功格式化 {len(user_role_assignments)} 个用户的角色分配数据")
-            else:
-                logger.warning("未找到有效的角色分配数据")
-        
-        except Exception as e:
-            logger.error(f"格式化用户角色分配数据时出错: {e}", exc_info=True)
-
-    @format_user_roles.before_loop
-    async def before_format_user_roles(self):
-        """在任务循环开始前等待机器人准备就绪"""
-        await self.bot.wait_until_ready()
-
-    @format_user_roles.error
-    async def format_user_roles_error(self, error):
-        """处理任务循环中的错误"""
-        logger.error(f"任务错误: {error}", exc_info=True)
+        if self._bootstrap_task and not self._bootstrap_task.done():
+            self._bootstrap_task.cancel()
+
+    async def format_user_roles(self) -> Tuple[int, int]:
+        """
+        从完整的分配日志全量重建以用户为中心的数据，并只重写内容发生变化的分片
+
+        :return: (用户数, 重写的分片数)
+        """
+        async with self.lock:
+            logger.debug("开始全量重建用户角色分配数据...")
+            user_role_assignments = await asyncio.to_thread(format_role_assignments)
+            changed_shards = await asyncio.to_thread(_save_user_role_assignments, user_role_assignments)
+            logger.info(f"已完成 {len(user_role_assignments)} 个用户的角色分配数据一致性检查，修正了 {changed_shards} 个分片")
+            return len(user_role_assignments), changed_shards
 
 async def setup(bot):
     # 确保数据目录存在
     _ensure_data_dir()
-    
-    # 立即执行一次格式化
-    user_role_assignments = format_role_assignments()
-    if user_role_assignments:
-        _save_user_role_assignments(user_role_assignments)
-        logger.info(f"初始化时已格式化 {len(user_role_assignments)} 个用户的角色分配数据")
-    
+
     # 添加Cog
     await bot.add_cog(UserRoleFormatter(bot))
@@ -0,0 +1,266 @@
+import json
+import os
+import shutil
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+from utils.metrics import timed_file_io
+
+logger = logging.getLogger('discord_bot.cogs.tasks.user_role_store')
+
+# 以用户为中心的角色分配数据按用户ID分片存储，每个分片是一个独立的 JSON 文件
+# 查询单个用户时只需读取其所在的分片，而不必解析全部用户的数据
+STORE_DIR = os.path.join('data', 'user_role_assignments')
+# 初始分片数量；初始分片直接位于 STORE_DIR 下，扩容后的分片位于以分片数量命名的子目录中
+BASE_SHARD_COUNT = 256
+# 任一分片的用户数超过此值时分片数量翻倍 (直到平均每个分片不超过一半)，
+# 使单个分片的大小以及查询或更新单个用户的开销不随总用户数增长
+MAX_USERS_PER_SHARD = 4096
+# 记录当前分片数量，缺失时为 BASE_SHARD_COUNT
+META_FILE = os.path.join(STORE_DIR, 'meta.json')
+
+_shard_count: Optional[int] = None
+
+# 所有对分片的读改写 (全量重建与增量更新) 都在这把锁下进行，避免并发的写入互相覆盖
+store_lock = asyncio.Lock()
+
+
+async def run_locked(func, *args):
+    """在 store_lock 下于线程中执行一次分片读改写，不阻塞事件循环"""
+    async with store_lock:
+        return await asyncio.to_thread(func, *args)
+
+def _ensure_store_dir():
+    """确保分片目录存在"""
+    os.makedirs(STORE_DIR, exist_ok=True)
+
+def shard_count(refresh: bool = False) -> int:
+    """当前的分片数量 (缓存在内存中，refresh 时重新读取 meta 文件)"""
+    global _shard_count
+    if _shard_count is None or refresh:
+        try:
+            with open(META_FILE, 'r', encoding='utf-8') as f:
+                _shard_count = int(json.load(f)['shard_count'])
+        except FileNotFoundError:
+            _shard_count = BASE_SHARD_COUNT
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError, IOError) as e:
+            logger.error(f"读取用户角色分片元数据 {META_FILE} 失败: {e}")
+            _shard_count = BASE_SHARD_COUNT
+    return _shard_count
+
+def _write_meta(count: int):
+    _ensure_store_dir()
+    tmp_path = f"{META_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'shard_count': count}, f)
+    os.replace(tmp_path, META_FILE)
+
+def _shard_dir(count: int) -> str:
+    return STORE_DIR if count == BASE_SHARD_COUNT else os.path.join(STORE_DIR, str(count))
+
+def shard_index(user_id, count: Optional[int] = None) -> int:
+    """
+    计算用户所在的分片编号
+    使用雪花ID的时间戳部分 (高 42 位) 取模，分布比低位的自增序号更均匀
+    """
+    return (int(user_id) >> 22) % (count or shard_count())
+
+def _shard_path(index: int, count: Optional[int] = None) -> str:
+    return os.path.join(_shard_dir(count or shard_count()), f"{index:02x}.json")
+
+def _is_shard_file(name: str) -> bool:
+    stem, ext = os.path.splitext(name)
+    if ext != '.json':
+        return False
+    try:
+        int(stem, 16)
+    except ValueError:
+        return False
+    return True
+
+@timed_file_io('user_role_assignments/shard', 'read')
+def load_shard(index: int, count: Optional[int] = None) -> Dict[str, Dict[str, List[int]]]:
+    """加载一个分片的全部数据"""
+    path = _shard_path(index, count)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except (json.JSONDecodeError, IOError) as e:
+        logger.error(f"读取用户角色分片 {path} 失败: {e}")
+        return {}
+
+@timed_file_io('user_role_assignments/shard', 'write')
+def save_shard(index: int, data: Dict[str, Dict[str, List[int]]], count: Optional[int] = None):
+    """原子地写入一个分片，分片为空时删除对应文件"""
+    path = _shard_path(index, count)
+    if not data:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def load_user_roles(user_id) -> Dict[str, List[int]]:
+    """读取单个用户的 {guild_id: [role_id, ...]} 数据"""
+    return load_shard(shard_index(user_id)).get(str(user_id), {})
+
+def _group_by_shard(user_role_assignments: Dict[str, Dict[str, List[int]]], count: int):
+    shards: Dict[int, Dict[str, Dict[str, List[int]]]] = {}
+    for user_id_str, guilds in user_role_assignments.items():
+        shards.setdefault(shard_index(user_id_str, count), {})[user_id_str] = guilds
+    return shards
+
+def _required_shard_count(user_count: int, count: int) -> int:
+    while user_count > count * MAX_USERS_PER_SHARD // 2:
+        count *= 2
+    return count
+
+def _load_all(count: int) -> Dict[str, Dict[str, List[int]]]:
+    data: Dict[str, Dict[str, List[int]]] = {}
+    for index in range(count):
+        data.update(load_shard(index, count))
+    return data
+
+def _remove_generation(count: int):
+    """删除指定分片数量下的全部分片文件"""
+    directory = _shard_dir(count)
+    if directory != STORE_DIR:
+        shutil.rmtree(directory, ignore_errors=True)
+        return
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if _is_shard_file(name):
+            os.remove(os.path.join(directory, name))
+
+def _grow(user_role_assignments: Dict[str, Dict[str, List[int]]], new_count: int) -> int:
+    """
+    按新的分片数量重新分布全部数据：先完整写入新目录，再切换 meta 文件，最后删除旧分片
+    中途失败时 meta 仍指向旧分片，数据不受影响
+
+    :return: 写入的分片数量
+    """
+    global _shard_count
+    old_count = shard_count()
+    # 清理上次中断的扩容留下的残余
+    _remove_generation(new_count)
+    shards = _group_by_shard(user_role_assignments, new_count)
+    for index, data in shards.items():
+        save_shard(index, data, new_count)
+    _write_meta(new_count)
+    _shard_count = new_count
+    _remove_generation(old_count)
+    logger.info(f"用户角色分片数量已从 {old_count} 扩容到 {new_count} ({len(user_role_assignments)} 个用户)")
+    return len(shards)
+
+def _grow_if_needed(shards: Dict[int, Dict[str, Dict[str, List[int]]]], count: int) -> int:
+    """增量写入后，若有分片超出上限则扩容，返回扩容时写入的分片数量"""
+    if all(len(shard) <= MAX_USERS_PER_SHARD for shard in shards.values()):
+        return 0
+    data = _load_all(count)
+    return _grow(data, _required_shard_count(len(data), count * 2))
+
+def save_all_user_roles(user_role_assignments: Dict[str, Dict[str, List[int]]]) -> int:
+    """
+    将完整的以用户为中心的数据写入分片存储，内容未变化的分片不会被重写
+    用户数量超出当前分片数量的容量时先扩容
+
+    :return: 实际重写的分片数量
+    """
+    count = shard_count(refresh=True)
+    required = _required_shard_count(len(user_role_assignments), count)
+    if required != count:
+        return _grow(user_role_assignments, required)
+
+    shards = _group_by_shard(user_role_assignments, count)
+    changed = 0
+    for index in range(count):
+        new_data = shards.get(index, {})
+        if load_shard(index, count) != new_data:
+            save_shard(index, new_data, count)
+            changed += 1
+    return changed
+
+def store_exists() -> bool:
+    """分片存储是否已经初始化过 (当前分片目录中至少有一个分片文件)"""
+    try:
+        return any(_is_shard_file(name) for name in os.listdir(_shard_dir(shard_count(refresh=True))))
+    except FileNotFoundError:
+        return False
+
+def add_user_roles(guild_id, role_ids: Iterable[int], user_ids: Iterable[int]) -> int:
+    """
+    增量地为一批用户在指定服务器下追加身份组，只读写受影响的分片
+
+    :return: 实际重写的分片数量
+    """
+    role_ids = list(role_ids)
+    if not role_ids:
+        return 0
+    guild_id_str = str(guild_id)
+
+    count = shard_count()
+    users_by_shard: Dict[int, List[str]] = {}
+    for user_id in user_ids:
+        users_by_shard.setdefault(shard_index(user_id, count), []).append(str(user_id))
+
+    changed = 0
+    written: Dict[int, Dict[str, Dict[str, List[int]]]] = {}
+    for index, user_id_strs in users_by_shard.items():
+        shard = load_shard(index, count)
+        shard_changed = False
+        for user_id_str in user_id_strs:
+            guild_roles = shard.setdefault(user_id_str, {}).setdefault(guild_id_str, [])
+            existing = set(guild_roles)
+            for role_id in role_ids:
+                if role_id not in existing:
+                    guild_roles.append(role_id)
+                    existing.add(role_id)
+                    shard_changed = True
+        if shard_changed:
+            save_shard(index, shard, count)
+            written[index] = shard
+            changed += 1
+    return changed + _grow_if_needed(written, count)
+
+def replace_user_roles(user_ids: Iterable, entries: Dict[str, Dict[str, List[int]]]) -> int:
+    """
+    用重新计算的结果覆盖一批用户的数据；在 entries 中不存在的用户将被移除
+
+    :return: 实际重写的分片数量
+    """
+    count = shard_count()
+    users_by_shard: Dict[int, List[str]] = {}
+    for user_id in user_ids:
+        users_by_shard.setdefault(shard_index(user_id, count), []).append(str(user_id))
+
+    changed = 0
+    written: Dict[int, Dict[str, Dict[str, List[int]]]] = {}
+    for index, user_id_strs in users_by_shard.items():
+        shard = load_shard(index, count)
+        shard_changed = False
+        for user_id_str in user_id_strs:
+            new_entry = entries.get(user_id_str)
+            if new_entry:
+                if shard.get(user_id_str) != new_entry:
+                    shard[user_id_str] = new_entry
+                    shard_changed = True
+            elif user_id_str in shard:
+                del shard[user_id_str]
+                shard_changed = True
+        if shard_changed:
+            save_shard(index, shard, count)
+            written[index] = shard
+            changed += 1
+    return changed + _grow_if_needed(written, count)
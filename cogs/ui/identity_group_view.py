@@ -1,5 +1,7 @@
 import discord
 from discord.ui import View, Select
+from utils.interaction_guard import interaction_guard, respond, edit_response
+from utils.ack_budget import ack_budget
 
 class IdentityGroupView(View):
     def __init__(self):
@@ -15,10 +17,14 @@ class IdentityGroupView(View):
         return button
 
     async def button_callback(self, interaction: discord.Interaction):
+        # 同一用户重复点击同一按钮时合并为一次处理，并按令牌桶限流
+        await interaction_guard.run(interaction, interaction.data['custom_id'], self.handle_action)
+
+    async def handle_action(self, interaction: discord.Interaction):
         action = interaction.data['custom_id']
         cog = interaction.client.get_cog('IdentityGroupLogic')
         if not cog:
-            await interaction.response.send_message("逻辑处理模块未加载，请联系管理员", ephemeral=True)
+            await respond(interaction, "逻辑处理模块未加载，请联系管理员")
             return
 
         if action == "view_my_roles":
@@ -34,7 +40,7 @@ class IdentityGroupView(View):
                 description=f"您当前没有可 {action_text} 的身份组",
                 color=discord.Color.gold()
             )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+            await respond(interaction, embed=embed)
             return
 
         title, description, color = self.get_embed_details(action)
@@ -46,7 +52,7 @@ class IdentityGroupView(View):
         view = View(timeout=180)
         view.add_item(select)
         
-        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+        await respond(interaction, embed=embed, view=view)
 
     def get_embed_details(self, action):
         if action == "add_role":
@@ -69,14 +75,17 @@ class IdentityGroupView(View):
         return select
 
     async def select_callback(self, interaction: discord.Interaction):
+        await ack_budget.run(interaction, interaction.data['custom_id'], self.handle_select)
+
+    async def handle_select(self, interaction: discord.Interaction):
         if interaction.data['values'][0] == 'no_roles':
             embed = discord.Embed(title="提示", description="没有可操作的选项", color=discord.Color.gold())
-            await interaction.response.edit_message(embed=embed, view=None)
+            await edit_response(interaction, embed=embed, view=None)
             return
         
         cog = interaction.client.get_cog('IdentityGroupLogic')
         if not cog:
-            await interaction.response.edit_message(content="逻辑处理模块未加载，请联系管理员", view=None)
+            await edit_response(interaction, content="逻辑处理模块未加载，请联系管理员", view=None)
             return
 
         selected_role_id = int(interaction.data['values'][0])
@@ -1,9 +1,11 @@
 import discord
+from utils.interaction_guard import interaction_guard
 
 class RoleDistributorView(discord.ui.View):
     """
     一个持久化视图，包含“获取身份组”和“退出身份组”按钮
-    这个视图的按钮回调会将交互委托给 RoleDistributorLogic Cog 来处理
+    这个视图的按钮回调会将交互委托给 RoleDistributorLogic Cog 来处理，
+    并经过 interaction_guard 进行限流与重复点击合并
     """
     def __init__(self):
         super().__init__(timeout=None)
@@ -20,11 +22,11 @@ class RoleDistributorView(discord.ui.View):
         """处理获取身份组按钮的点击事件"""
         cog = await self._get_cog(interaction)
         if cog:
-            await cog.handle_role_acquisition(interaction)
+            await interaction_guard.run(interaction, "role_distributor:acquire", cog.handle_role_acquisition, interaction.channel_id)
 
     @discord.ui.button(label="退出身份组", style=discord.ButtonStyle.danger, custom_id="role_distributor:release")
     async def release_role(self, interaction: discord.Interaction, button: discord.ui.Button):
         """处理退出身份组按钮的点击事件"""
         cog = await self._get_cog(interaction)
         if cog:
-            await cog.handle_role_release(interaction)
\ No newline at end of file
+            await interaction_guard.run(interaction, "role_distributor:release", cog.handle_role_release, interaction.channel_id)
\ No newline at end of file
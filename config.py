@@ -28,6 +28,27 @@ if not AUTHORIZED_ROLE_IDS:
 # 日志频道配置
 LOG_CHANNEL_ID = os.getenv('LOG_CHANNEL_ID')  
 
+# 生成报告时并发解析用户名的请求上限
+try:
+    USER_RESOLVE_CONCURRENCY = max(1, int(os.getenv('USER_RESOLVE_CONCURRENCY', '8')))
+except ValueError:
+    logger.warning("环境变量 'USER_RESOLVE_CONCURRENCY' 不是有效的整数，将使用默认值 8")
+    USER_RESOLVE_CONCURRENCY = 8
+
+# 本地 Prometheus 指标端口 (仅监听 127.0.0.1)，设为 0 时不启动
+try:
+    METRICS_PORT = max(0, int(os.getenv('METRICS_PORT', '9108')))
+except ValueError:
+    logger.warning("环境变量 'METRICS_PORT' 不是有效的整数，将使用默认值 9108")
+    METRICS_PORT = 9108
+
+# 事件循环阻塞看门狗阈值 (毫秒)，事件循环超过此时间未响应时记录主线程调用栈；设为 0 时不启用
+try:
+    LOOP_WATCHDOG_MS = max(0, int(os.getenv('LOOP_WATCHDOG_MS', '0')))
+except ValueError:
+    logger.warning("环境变量 'LOOP_WATCHDOG_MS' 不是有效的整数，看门狗将不会启用")
+    LOOP_WATCHDOG_MS = 0
+
 # 处理服务器ID
 GUILD_IDS = []
 
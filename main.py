@@ -3,8 +3,7 @@ from discord.ext import commands
 import logging
 import config # 导入配置模块
 import os # 用于处理路径
-from cogs.mod.remove_role_logic import RemoveRoleSelectView
-from cogs.mod.remove_role_state import load_all_panel_states
+from cogs.mod.remove_role_state import load_panel_registry, flush_panel_states
 from cogs.ui.identity_group_view import IdentityGroupView
 from cogs.ui.role_distributor_view import RoleDistributorView
 from cogs.ui.role_auto_apply_view import RoleAutoApplyView
@@ -63,8 +62,16 @@ async def setup_hook():
         'cogs.logic.identity_group_logic',
         'cogs.logic.role_distributor_logic',
         'cogs.logic.role_mapping_logic',
+        'cogs.logic.removal_exclusion_logic',
+        'cogs.logic.forum_reaction_cache',
         'cogs.tasks.role_expiry',
         'cogs.tasks.user_role_formatter',
+        'cogs.tasks.remove_role_panel_reaper',
+        'cogs.tasks.forum_auto_grant',
+        'cogs.tasks.role_mirror',
+        'cogs.tasks.metrics_server',
+        'cogs.tasks.resource_sampler',
+        'cogs.tasks.loop_watchdog',
     ]
 
     for cog_name in cogs_to_load:
@@ -83,28 +90,10 @@ async def setup_hook():
             logger.error(f'加载 Cog "{cog_name}" 时发生未知错误: {e}', exc_info=True)
     
     # 在 cogs 加载后注册持久化视图
-    # 为自助移除角色面板重新注册视图
-    logger.info("正在重新注册 RemoveRoleSelectView 持久化视图...")
-    all_panels = load_all_panel_states()
-    if not all_panels:
-        # 即使没有已保存的面板，也注册一个空的，以防万一
-        bot.add_view(RemoveRoleSelectView(roles=[], persist_list=False, custom_id_suffix=""))
-    else:
-        for message_id, panel_data in all_panels.items():
-            # 我们将 message_id 作为 custom_id 的一部分，以确保唯一性。
-            role_ids = panel_data.get('role_ids', [])
-            persist_list = panel_data.get('persist_list', False)
-            
-            # 创建一个临时的 Role 对象列表，仅包含 ID，用于初始化
-            temp_roles = [discord.Object(id=rid) for rid in role_ids]
-
-            view = RemoveRoleSelectView(
-                roles=temp_roles,
-                persist_list=persist_list,
-                custom_id_suffix=f":{message_id}"
-            )
-            bot.add_view(view)
-            logger.info(f"已为消息 {message_id} 重新注册 RemoveRoleSelectView")
+    # 自助移除角色面板的交互由 RoleAssigner 中的监听器按 custom_id 统一路由，
+    # 这里只需加载一次面板状态，无需为每个面板注册视图
+    panel_count = load_panel_registry()
+    logger.info(f"已加载 {panel_count} 个自助移除角色面板的状态")
     
     bot.add_view(IdentityGroupView())
     logger.info("成功注册 IdentityGroupView 持久化视图")
@@ -129,3 +118,6 @@ if __name__ == "__main__":
         except Exception as e:
             # 捕获其他可能的启动时异常
             logger.critical(f"启动机器人时发生严重错误: {e}", exc_info=True)
+        finally:
+            # 写回尚未落盘的面板状态
+            flush_panel_states()
@@ -0,0 +1,133 @@
+import time
+import asyncio
+import logging
+import contextlib
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+import discord
+from utils.metrics import INTERACTION_ACK, INTERACTION_DURATION
+
+logger = logging.getLogger('discord_bot.utils.ack_budget')
+
+# Discord 要求在 3 秒内首次响应交互；超过此预算仍未响应时自动延迟响应 (defer)
+ACK_BUDGET_SECONDS = 2.0
+# 在 BREACH_WINDOW_SECONDS 内超出预算达到 BREACH_REPORT_COUNT 次的处理函数会被报告 (每个窗口最多报告一次)
+BREACH_REPORT_COUNT = 3
+BREACH_WINDOW_SECONDS = 10 * 60
+
+Handler = Callable[[discord.Interaction], Awaitable[Optional[str]]]
+
+
+class HandlerAckStats:
+    """单个处理函数的首次响应耗时统计"""
+    __slots__ = ('calls', 'total_seconds', 'worst_seconds', 'auto_deferred', 'breaches', 'reported_at')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.worst_seconds = 0.0
+        self.auto_deferred = 0
+        self.breaches = deque()
+        self.reported_at: Optional[float] = None
+
+    @property
+    def average_seconds(self) -> float:
+        return self.total_seconds / self.calls if self.calls else 0.0
+
+
+class AckBudget:
+    """
+    交互处理函数的首次响应 (ack) 预算
+
+    - 记录每个处理函数从交互创建到首次响应的耗时
+    - 处理函数在预算内仍未响应时自动 defer，之后的回复需通过 interaction_guard.respond / edit_response 发送
+    - 反复超出预算的处理函数会写入警告日志
+    """
+
+    def __init__(self, budget: float = ACK_BUDGET_SECONDS):
+        self.budget = budget
+        self.stats: Dict[str, HandlerAckStats] = {}
+        # 交互ID -> 首次响应锁，防止自动 defer 与处理函数的回复同时发出
+        self._locks: Dict[int, asyncio.Lock] = {}
+        # 交互ID -> 首次响应时的 time.monotonic()
+        self._acked_at: Dict[int, float] = {}
+
+    def ack_lock(self, interaction: discord.Interaction):
+        """返回交互的首次响应锁；不在预算监控下的交互返回空上下文"""
+        lock = self._locks.get(interaction.id)
+        return lock if lock is not None else contextlib.nullcontext()
+
+    def mark_acked(self, interaction: discord.Interaction):
+        if interaction.id in self._locks:
+            self._acked_at.setdefault(interaction.id, time.monotonic())
+
+    def _delivery_delay(self, interaction: discord.Interaction) -> float:
+        """
+        交互从创建到被处理已经过去的秒数 (包含网关投递延迟)
+        限制在 [0, 预算] 内：负值来自时钟偏差，超出预算时应立即 defer 而不是再等一个完整的预算
+        """
+        delay = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        return min(max(delay, 0.0), self.budget)
+
+    async def _auto_defer(self, interaction: discord.Interaction, deadline: float, name: str, thinking: bool, ephemeral: bool):
+        await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+        async with self._locks[interaction.id]:
+            if interaction.response.is_done():
+                return
+            try:
+                await interaction.response.defer(ephemeral=ephemeral, thinking=thinking)
+            except discord.HTTPException as e:
+                logger.debug(f"自动延迟响应交互 {interaction.id} ({name}) 失败: {e}")
+                return
+            self.mark_acked(interaction)
+        self.stats[name].auto_deferred += 1
+        logger.debug(f"处理函数 {name} 未在 {self.budget} 秒预算内响应，已自动延迟响应")
+
+    def _record(self, name: str, ack_seconds: float):
+        stats = self.stats[name]
+        stats.calls += 1
+        stats.total_seconds += ack_seconds
+        stats.worst_seconds = max(stats.worst_seconds, ack_seconds)
+        INTERACTION_ACK.observe(ack_seconds, name)
+        if ack_seconds < self.budget:
+            return
+
+        now = time.monotonic()
+        stats.breaches.append(now)
+        while stats.breaches and now - stats.breaches[0] > BREACH_WINDOW_SECONDS:
+            stats.breaches.popleft()
+        if len(stats.breaches) >= BREACH_REPORT_COUNT and (stats.reported_at is None or now - stats.reported_at > BREACH_WINDOW_SECONDS):
+            stats.reported_at = now
+            logger.warning(
+                f"处理函数 {name} 在最近 {BREACH_WINDOW_SECONDS // 60} 分钟内 {len(stats.breaches)} 次超出首次响应预算 "
+                f"({self.budget} 秒)，本次 {ack_seconds:.2f} 秒，最慢 {stats.worst_seconds:.2f} 秒，累计自动延迟 {stats.auto_deferred} 次"
+            )
+
+    async def run(self, interaction: discord.Interaction, name: str, handler: Handler, *, thinking: bool = False, ephemeral: bool = True):
+        """
+        在首次响应预算下执行处理函数
+
+        :param name: 处理函数名称，用于统计与报告
+        :param thinking: 自动 defer 时是否显示 "正在思考" (斜杠命令总是显示)
+        :param ephemeral: 自动 defer 时后续消息是否仅发起者可见
+        """
+        start = time.monotonic() - self._delivery_delay(interaction)
+        self.stats.setdefault(name, HandlerAckStats())
+        self._locks[interaction.id] = asyncio.Lock()
+        watchdog = asyncio.create_task(self._auto_defer(interaction, start + self.budget, name, thinking, ephemeral))
+        try:
+            return await handler(interaction)
+        finally:
+            INTERACTION_DURATION.observe(time.monotonic() - start, name)
+            watchdog.cancel()
+            acked_at = self._acked_at.pop(interaction.id, None)
+            del self._locks[interaction.id]
+            if acked_at is None and interaction.response.is_done():
+                # 处理函数直接通过 interaction.response 响应，只能以结束时间作为上限
+                acked_at = time.monotonic()
+            if acked_at is not None:
+                self._record(name, acked_at - start)
+
+
+# 全局共享的首次响应预算实例
+ack_budget = AckBudget()
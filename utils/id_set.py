@@ -0,0 +1,210 @@
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, Optional
+
+# Discord 雪花ID是 64 位无符号整数，使用 array('Q') 紧凑存储 (每个ID 8 字节)
+# 而 Python 的 int 对象加上 list/set 的开销每个ID需要 60 字节以上
+_TYPECODE = 'Q'
+
+
+class IdSet:
+    """
+    基于有序 array('Q') 的紧凑ID集合
+
+    - 成员判断为二分查找 O(log n)
+    - 并集、交集、差集为线性归并，两侧规模悬殊时改为对较大一侧二分查找
+    - 序列化格式为小端序 uint64 的有序序列，可直接映射回 array
+    """
+    __slots__ = ('_ids',)
+
+    def __init__(self, ids: Iterable = ()):
+        if isinstance(ids, IdSet):
+            self._ids = array(_TYPECODE, ids._ids)
+        else:
+            self._ids = array(_TYPECODE, sorted({int(i) for i in ids}))
+
+    @classmethod
+    def _from_sorted(cls, ids: array) -> "IdSet":
+        """从已排序且去重的 array 构建，不做校验"""
+        instance = cls.__new__(cls)
+        instance._ids = ids
+        return instance
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __bool__(self) -> bool:
+        return len(self._ids) > 0
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids)
+
+    def __getitem__(self, index):
+        """按排序位置访问，切片返回 int 列表 (用于分页)"""
+        if isinstance(index, slice):
+            return self._ids[index].tolist()
+        return self._ids[index]
+
+    def __contains__(self, value) -> bool:
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            return False
+        ids = self._ids
+        index = bisect_left(ids, value)
+        return index < len(ids) and ids[index] == value
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, IdSet):
+            return self._ids == other._ids
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"IdSet(size={len(self._ids)})"
+
+    def add(self, value) -> bool:
+        """添加一个ID，返回是否确实新增"""
+        value = int(value)
+        ids = self._ids
+        index = bisect_left(ids, value)
+        if index < len(ids) and ids[index] == value:
+            return False
+        ids.insert(index, value)
+        return True
+
+    def discard(self, value) -> bool:
+        """移除一个ID，返回是否确实移除"""
+        value = int(value)
+        ids = self._ids
+        index = bisect_left(ids, value)
+        if index < len(ids) and ids[index] == value:
+            del ids[index]
+            return True
+        return False
+
+    def union(self, other: "IdSet") -> "IdSet":
+        a, b = self._ids, _as_id_set(other)._ids
+        result = array(_TYPECODE)
+        i = j = 0
+        len_a, len_b = len(a), len(b)
+        while i < len_a and j < len_b:
+            x, y = a[i], b[j]
+            if x < y:
+                result.append(x)
+                i += 1
+            elif y < x:
+                result.append(y)
+                j += 1
+            else:
+                result.append(x)
+                i += 1
+                j += 1
+        result.extend(a[i:])
+        result.extend(b[j:])
+        return IdSet._from_sorted(result)
+
+    def intersection(self, other: "IdSet") -> "IdSet":
+        a, b = self._ids, _as_id_set(other)._ids
+        if len(a) > len(b):
+            a, b = b, a
+        result = array(_TYPECODE)
+        if len(a) * 16 < len(b):
+            # 规模悬殊时对较大一侧二分查找
+            len_b = len(b)
+            for x in a:
+                index = bisect_left(b, x)
+                if index < len_b and b[index] == x:
+                    result.append(x)
+            return IdSet._from_sorted(result)
+
+        i = j = 0
+        len_a, len_b = len(a), len(b)
+        while i < len_a and j < len_b:
+            x, y = a[i], b[j]
+            if x < y:
+                i += 1
+            elif y < x:
+                j += 1
+            else:
+                result.append(x)
+                i += 1
+                j += 1
+        return IdSet._from_sorted(result)
+
+    def difference(self, other: "IdSet") -> "IdSet":
+        a, b = self._ids, _as_id_set(other)._ids
+        if not b:
+            return IdSet._from_sorted(array(_TYPECODE, a))
+        result = array(_TYPECODE)
+        if len(a) * 16 < len(b):
+            len_b = len(b)
+            for x in a:
+                index = bisect_left(b, x)
+                if not (index < len_b and b[index] == x):
+                    result.append(x)
+            return IdSet._from_sorted(result)
+
+        i = j = 0
+        len_a, len_b = len(a), len(b)
+        while i < len_a and j < len_b:
+            x, y = a[i], b[j]
+            if x < y:
+                result.append(x)
+                i += 1
+            elif y < x:
+                j += 1
+            else:
+                i += 1
+                j += 1
+        result.extend(a[i:])
+        return IdSet._from_sorted(result)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def to_bytes(self) -> bytes:
+        """序列化为小端序 uint64 序列"""
+        if sys.byteorder == 'little':
+            return self._ids.tobytes()
+        swapped = array(_TYPECODE, self._ids)
+        swapped.byteswap()
+        return swapped.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, assume_sorted: bool = True) -> "IdSet":
+        """
+        从小端序 uint64 序列反序列化
+
+        :param assume_sorted: 数据由 to_bytes 写出时为有序去重的，可跳过排序；
+                              追加写入的日志等无序数据应传入 False
+        """
+        ids = array(_TYPECODE)
+        ids.frombytes(data[:len(data) - len(data) % ids.itemsize])
+        if sys.byteorder != 'little':
+            ids.byteswap()
+        if assume_sorted:
+            return cls._from_sorted(ids)
+        return cls(ids)
+
+    def save(self, path: str):
+        """原子地写入二进制文件"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IdSet"]:
+        """读取二进制文件，文件不存在时返回 None"""
+        try:
+            with open(path, 'rb') as f:
+                return cls.from_bytes(f.read())
+        except FileNotFoundError:
+            return None
+
+
+def _as_id_set(value) -> IdSet:
+    return value if isinstance(value, IdSet) else IdSet(value)
@@ -0,0 +1,176 @@
+import math
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import discord
+from utils.ack_budget import ack_budget
+from utils.token_bucket import TokenBucket
+
+logger = logging.getLogger('discord_bot.utils.interaction_guard')
+
+# 每个用户的令牌桶：最多连续点击 USER_BUCKET_CAPACITY 次，之后每秒恢复 USER_REFILL_PER_SECOND 次
+USER_BUCKET_CAPACITY = 5
+USER_REFILL_PER_SECOND = 0.5
+# 每个服务器的令牌桶，限制整个服务器在点击风暴中的 API 消耗
+GUILD_BUCKET_CAPACITY = 50
+GUILD_REFILL_PER_SECOND = 10.0
+# 重复请求等待进行中请求结果的时间，超过后先延迟响应以免交互过期
+DUPLICATE_RESPONSE_TIMEOUT = 2.0
+# 令牌桶数量超过此值时清理已回满 (即近期不活跃) 的桶
+BUCKET_SWEEP_THRESHOLD = 10000
+
+DUPLICATE_DONE_MESSAGE = "你的上一个相同请求已处理完成"
+DUPLICATE_FAILED_MESSAGE = "你的上一个相同请求处理失败，请稍后重试"
+
+Handler = Callable[[discord.Interaction], Awaitable[Optional[str]]]
+
+# 处于防护下的交互ID -> 处理函数最近一次通过 respond / edit_response 发出的回复 (内容与嵌入消息，不含视图)，
+# 处理函数没有返回文本时用于把原始结果转述给重复的请求
+_captured_replies: Dict[int, Dict] = {}
+
+
+def _capture_reply(interaction: discord.Interaction, content: Optional[str], kwargs: Dict):
+    reply = _captured_replies.get(interaction.id)
+    if reply is None:
+        return
+    reply.clear()
+    if content is not None:
+        reply['content'] = content
+    for name in ('embed', 'embeds'):
+        if kwargs.get(name) is not None:
+            reply[name] = kwargs[name]
+
+
+async def respond(interaction: discord.Interaction, message: Optional[str] = None, **kwargs) -> Optional[str]:
+    """发送一条临时消息 (根据交互是否已响应选择 response 或 followup)，返回消息内容"""
+    async with ack_budget.ack_lock(interaction):
+        if interaction.response.is_done():
+            await interaction.followup.send(message, ephemeral=True, **kwargs)
+        else:
+            await interaction.response.send_message(message, ephemeral=True, **kwargs)
+            ack_budget.mark_acked(interaction)
+    _capture_reply(interaction, message, kwargs)
+    return message
+
+
+async def edit_response(interaction: discord.Interaction, **kwargs):
+    """编辑触发交互的组件消息 (交互已被延迟响应时改为编辑原始响应)"""
+    async with ack_budget.ack_lock(interaction):
+        if interaction.response.is_done():
+            await interaction.edit_original_response(**kwargs)
+        else:
+            await interaction.response.edit_message(**kwargs)
+            ack_budget.mark_acked(interaction)
+    _capture_reply(interaction, kwargs.get('content'), kwargs)
+
+
+async def defer(interaction: discord.Interaction, **kwargs):
+    """延迟响应交互；已被响应 (例如已自动 defer) 时不做任何事"""
+    async with ack_budget.ack_lock(interaction):
+        if not interaction.response.is_done():
+            await interaction.response.defer(**kwargs)
+            ack_budget.mark_acked(interaction)
+
+
+class InteractionGuard:
+    """
+    持久化视图交互的共享防护层
+
+    - 同一用户的相同请求在处理中时，重复点击不会再次调用处理函数，而是等待进行中请求的结果并直接回复
+    - 每个用户和每个服务器各有一个令牌桶，超出频率的点击会被立即拒绝
+
+    处理函数负责回复自己的交互，并返回回复给用户的文本 (可为 None)；重复的请求会收到相同的文本，
+    处理函数返回 None 时则收到它最后一次通过 respond / edit_response 发出的回复 (包括失败提示)
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Tuple[Hashable, ...], asyncio.Future] = {}
+        self._user_buckets: Dict[int, TokenBucket] = {}
+        self._guild_buckets: Dict[int, TokenBucket] = {}
+
+    def _sweep(self, buckets: Dict[int, TokenBucket], now: float):
+        if len(buckets) < BUCKET_SWEEP_THRESHOLD:
+            return
+        for key in [key for key, bucket in buckets.items() if bucket.is_full(now)]:
+            del buckets[key]
+
+    def _acquire(self, user_id: int, guild_id: Optional[int]) -> float:
+        """尝试为一次请求扣除用户和服务器的令牌，返回需要等待的秒数 (0 表示已放行)"""
+        now = time.monotonic()
+        self._sweep(self._user_buckets, now)
+        self._sweep(self._guild_buckets, now)
+
+        user_bucket = self._user_buckets.get(user_id)
+        if user_bucket is None:
+            user_bucket = self._user_buckets[user_id] = TokenBucket(USER_BUCKET_CAPACITY, USER_REFILL_PER_SECOND, now)
+        guild_bucket = None
+        if guild_id is not None:
+            guild_bucket = self._guild_buckets.get(guild_id)
+            if guild_bucket is None:
+                guild_bucket = self._guild_buckets[guild_id] = TokenBucket(GUILD_BUCKET_CAPACITY, GUILD_REFILL_PER_SECOND, now)
+
+        retry_after = user_bucket.retry_after(now)
+        if guild_bucket is not None:
+            retry_after = max(retry_after, guild_bucket.retry_after(now))
+        if retry_after:
+            return retry_after
+
+        user_bucket.consume()
+        if guild_bucket is not None:
+            guild_bucket.consume()
+        return 0.0
+
+    async def _answer_duplicate(self, interaction: discord.Interaction, pending: asyncio.Future):
+        try:
+            ok, reply = await asyncio.wait_for(asyncio.shield(pending), DUPLICATE_RESPONSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            await defer(interaction, ephemeral=True)
+            ok, reply = await asyncio.shield(pending)
+
+        if not ok:
+            await respond(interaction, DUPLICATE_FAILED_MESSAGE)
+        elif reply:
+            reply = dict(reply)
+            await respond(interaction, reply.pop('content', None), **reply)
+        else:
+            await respond(interaction, DUPLICATE_DONE_MESSAGE)
+
+    async def run(self, interaction: discord.Interaction, action: str, handler: Handler, *key_parts: Hashable):
+        """
+        在防护与 ack_budget 首次响应预算下执行处理函数
+
+        :param action: 请求类型，通常为组件的 custom_id 前缀
+        :param handler: 实际的处理函数
+        :param key_parts: 区分 "相同请求" 的附加键，例如面板消息ID或所选身份组ID
+        """
+        key = (interaction.user.id, action, *key_parts)
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            logger.debug(f"用户 {interaction.user.id} 的请求 {key} 正在处理中，等待其结果")
+            await self._answer_duplicate(interaction, pending)
+            return
+
+        retry_after = self._acquire(interaction.user.id, interaction.guild_id)
+        if retry_after:
+            logger.debug(f"用户 {interaction.user.id} 的请求 {action} 被限流，需等待 {retry_after:.1f} 秒")
+            await respond(interaction, f"操作过于频繁，请在 {math.ceil(retry_after)} 秒后重试")
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        _captured_replies[interaction.id] = {}
+        try:
+            outcome = await ack_budget.run(interaction, action, handler)
+            reply = {'content': outcome} if outcome is not None else _captured_replies[interaction.id]
+            future.set_result((True, reply))
+        finally:
+            _captured_replies.pop(interaction.id, None)
+            if not future.done():
+                future.set_result((False, None))
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+
+# 全局共享的防护实例
+interaction_guard = InteractionGuard()
@@ -0,0 +1,203 @@
+import io
+import csv
+import gzip
+import json
+import asyncio
+import logging
+from typing import Iterable, List, Sequence, Tuple
+import discord
+
+logger = logging.getLogger('discord_bot.utils.member_export')
+
+EXPORT_FORMATS = ("csv", "jsonl")
+# 单条消息最多携带的附件数量
+MAX_FILES_PER_MESSAGE = 10
+# 为 gzip 结尾数据与请求开销预留的空间 (字节)
+SIZE_MARGIN_BYTES = 64 * 1024
+# 编码后的行累积到这么多字节再一次性写入缓冲 (字节)
+WRITE_BATCH_BYTES = 64 * 1024
+# 无法取得服务器上传限制时使用的默认值 (字节)
+DEFAULT_FILESIZE_LIMIT = 8 * 1024 * 1024
+
+MEMBER_COLUMNS = ['昵称', 'UserID', '用户名', '身份组ID', '身份组名称']
+
+
+def member_rows(members: Iterable[discord.Member]) -> List[Tuple]:
+    """
+    在事件循环中把成员对象快照为纯数据行，之后的编码在线程中进行
+
+    身份组列不包含 @everyone
+    """
+    rows = []
+    for member in members:
+        roles = [role for role in member.roles if not role.is_default()]
+        rows.append((
+            member.display_name,
+            member.id,
+            str(member),
+            [role.id for role in roles],
+            [role.name for role in roles],
+        ))
+    return rows
+
+
+def _json_value(value):
+    if isinstance(value, list):
+        return [_json_value(v) for v in value]
+    # ID 使用字符串，避免 JavaScript 等读取时丢失精度
+    return str(value) if isinstance(value, int) else value
+
+
+class _LineSink:
+    """csv.writer 的输出对象，使 writerow 直接返回格式化好的一行"""
+
+    @staticmethod
+    def write(line: str) -> str:
+        return line
+
+
+class _PartWriter:
+    """
+    把行流式写入内存缓冲，写入下一行会超过大小上限时先切换到新的分卷
+
+    压缩时尚未写入或仍在 gzip 内部的数据按未压缩大小计入，估算值超过上限时再刷新 gzip 取得实际大小，
+    因此每个分卷 (除单行就超过上限的情况外) 都不会超过 limit - SIZE_MARGIN_BYTES
+    """
+
+    def __init__(self, fmt: str, columns: Sequence[str], compress: bool, limit: int):
+        self.fmt = fmt
+        self.columns = list(columns)
+        self.compress = compress
+        self.limit = max(limit - SIZE_MARGIN_BYTES, SIZE_MARGIN_BYTES)
+        self.parts: List[bytes] = []
+        self._line_csv = csv.writer(_LineSink) if fmt == "csv" else None
+        self._open()
+
+    def _open(self):
+        self._raw = io.BytesIO()
+        self._binary = gzip.GzipFile(fileobj=self._raw, mode='wb') if self.compress else self._raw
+        # 已编码但尚未写入的行
+        self._batch: List[bytes] = []
+        self._batch_size = 0
+        # 已交给 gzip 但尚未刷新到 _raw 的未压缩字节数
+        self._pending = 0
+        self._rows = 0
+        if self._line_csv:
+            self._append(self._encode_csv(self.columns))
+
+    def _close(self) -> bytes:
+        self._drain()
+        if self.compress:
+            self._binary.close()
+        return self._raw.getvalue()
+
+    def _encode_csv(self, values: Sequence) -> bytes:
+        return self._line_csv.writerow(values).encode('utf-8')
+
+    def _encode(self, row: Sequence) -> bytes:
+        if self._line_csv:
+            return self._encode_csv([';'.join(map(str, value)) if isinstance(value, list) else value for value in row])
+        record = {column: _json_value(value) for column, value in zip(self.columns, row)}
+        return (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+
+    def _drain(self):
+        if not self._batch:
+            return
+        self._binary.write(b"".join(self._batch))
+        if self.compress:
+            self._pending += self._batch_size
+        self._batch.clear()
+        self._batch_size = 0
+
+    def _append(self, data: bytes):
+        self._batch.append(data)
+        self._batch_size += len(data)
+        if self._batch_size >= WRITE_BATCH_BYTES:
+            self._drain()
+
+    def _size_after(self, extra: int) -> int:
+        """再写入 extra 字节后分卷大小的上界 (不压缩时即为实际大小)"""
+        estimate = self._raw.tell() + self._pending + self._batch_size + extra
+        if self.compress and estimate > self.limit and (self._pending or self._batch):
+            # 刷新 gzip 的内部缓冲，用实际输出的大小代替估算值
+            self._drain()
+            self._binary.flush()
+            self._pending = 0
+            estimate = self._raw.tell() + extra
+        return estimate
+
+    def write(self, row: Sequence):
+        data = self._encode(row)
+        if self._rows and self._size_after(len(data)) > self.limit:
+            self.parts.append(self._close())
+            self._open()
+        self._append(data)
+        self._rows += 1
+
+    def finish(self) -> List[bytes]:
+        if self._rows or not self.parts:
+            self.parts.append(self._close())
+        return self.parts
+
+
+def encode_rows(rows: Iterable[Sequence], columns: Sequence[str], fmt: str = "csv", compress: bool = False, limit: int = DEFAULT_FILESIZE_LIMIT) -> List[bytes]:
+    """把数据行编码为一个或多个分卷，每个分卷不超过 limit 字节 (同步函数，应在线程中调用)"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    writer = _PartWriter(fmt, columns, compress, limit)
+    for row in rows:
+        writer.write(row)
+    return writer.finish()
+
+
+def part_filenames(basename: str, extension: str, count: int) -> List[str]:
+    """单个分卷时直接使用 basename.extension，多个分卷时文件名带序号"""
+    if count == 1:
+        return [f"{basename}.{extension}"]
+    return [f"{basename}.part{index}.{extension}" for index in range(1, count + 1)]
+
+
+async def build_export_files(basename: str, rows: Iterable[Sequence], columns: Sequence[str], fmt: str = "csv", compress: bool = False, limit: int = DEFAULT_FILESIZE_LIMIT) -> List[discord.File]:
+    """在线程中编码导出内容，返回可直接上传的附件列表 (多个分卷时文件名带序号)"""
+    parts = await asyncio.to_thread(encode_rows, rows, columns, fmt, compress, limit)
+    extension = fmt + (".gz" if compress else "")
+    names = part_filenames(basename, extension, len(parts))
+    logger.debug(f"导出 {basename}: {len(parts)} 个分卷，共 {sum(map(len, parts))} 字节")
+    return [discord.File(io.BytesIO(data), filename=name) for name, data in zip(names, parts)]
+
+
+def _file_size(file: discord.File) -> int:
+    position = file.fp.tell()
+    size = file.fp.seek(0, io.SEEK_END)
+    file.fp.seek(position)
+    return size
+
+
+def pack_messages(sizes: Sequence[int], limit: int) -> List[List[int]]:
+    """
+    按顺序把附件分组，每组不超过 MAX_FILES_PER_MESSAGE 个且总大小不超过 limit - SIZE_MARGIN_BYTES
+
+    上传限制针对整个请求而不是单个附件；单个附件本身超过预算时独占一组。返回每组附件的下标
+    """
+    budget = max(limit - SIZE_MARGIN_BYTES, SIZE_MARGIN_BYTES)
+    groups: List[List[int]] = []
+    total = 0
+    for index, size in enumerate(sizes):
+        if not groups or len(groups[-1]) >= MAX_FILES_PER_MESSAGE or total + size > budget:
+            groups.append([])
+            total = 0
+        groups[-1].append(index)
+        total += size
+    return groups
+
+
+async def send_export_files(interaction: discord.Interaction, content: str, files: List[discord.File], ephemeral: bool = False):
+    """通过 followup 发送附件，按服务器的上传限制与附件数量上限分多条消息发送"""
+    limit = interaction.guild.filesize_limit if interaction.guild else DEFAULT_FILESIZE_LIMIT
+    groups = pack_messages([_file_size(file) for file in files], limit)
+    for position, group in enumerate(groups):
+        await interaction.followup.send(
+            content if position == 0 else None,
+            files=[files[index] for index in group],
+            ephemeral=ephemeral
+        )
@@ -0,0 +1,166 @@
+import re
+import time
+import bisect
+import functools
+import contextlib
+from typing import Dict, List, Sequence, Tuple
+
+# Prometheus 文本格式的直方图默认桶 (秒)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_ID_PATTERN = re.compile(r'/\d{5,}')
+_API_PREFIX = re.compile(r'^https?://[^/]+/api/v\d+')
+# 反应路由中的表情 (URL 编码) 与 webhook / 交互回调中的令牌取值无限，必须归一化以限制标签数量
+_EMOJI_PATTERN = re.compile(r'(/reactions/)[^/]+')
+_TOKEN_PATTERN = re.compile(r'^(/(?:webhooks|interactions)/\{id\}/)[^/]+')
+
+
+def route_label(method: str, url: str) -> str:
+    """
+    把 REST 请求归一化为路由标签，例如 'PUT /guilds/{id}/members/{id}/roles/{id}'、
+    'PUT /channels/{id}/messages/{id}/reactions/{emoji}/@me'、'POST /interactions/{id}/{token}/callback'
+    """
+    path = _ID_PATTERN.sub('/{id}', _API_PREFIX.sub('', url.split('?', 1)[0]))
+    path = _EMOJI_PATTERN.sub(r'\1{emoji}', path)
+    path = _TOKEN_PATTERN.sub(r'\1{token}', path)
+    return f"{method} {path}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        registry.register(self)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    """只增不减的计数器；热路径上只是一次字典更新"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in list(self._values.items())]
+
+
+class Gauge(_Metric):
+    """可任意设置的瞬时值"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *label_values: str):
+        self._values[label_values] = value
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in list(self._values.items())]
+
+
+class Histogram(_Metric):
+    """按桶计数的直方图；每个标签组合保存各桶计数、总和与次数"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶计数 (不累计)..., +Inf 计数, 总和]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        data = self._values.get(label_values)
+        if data is None:
+            data = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        data[bisect.bisect_left(self.buckets, value)] += 1
+        data[-1] += value
+
+    @contextlib.contextmanager
+    def time(self, *label_values: str):
+        """以上下文管理器的形式记录代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, data in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), data):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {data[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """生成 Prometheus 文本格式 (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+COMMAND_LATENCY = Histogram('bot_command_latency_seconds', "斜杠命令从交互创建到执行完成的耗时", ['command'])
+INTERACTION_ACK = Histogram('bot_interaction_ack_seconds', "交互处理函数的首次响应耗时", ['handler'])
+INTERACTION_DURATION = Histogram('bot_interaction_duration_seconds', "交互处理函数的总耗时", ['handler'])
+REST_REQUESTS = Counter('bot_rest_requests_total', "发出的 REST 请求数", ['route'])
+REST_RATE_LIMITED = Counter('bot_rest_rate_limited_total', "收到 429 响应的 REST 请求数", ['route'])
+BULK_OPERATIONS = Counter('bot_bulk_operations_total', "批量任务处理的成员数", ['job', 'result'])
+EXPIRY_PASS_DURATION = Histogram('bot_expiry_pass_seconds', "一次身份组过期检查的耗时", buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+EXPIRY_BACKLOG = Gauge('bot_expiry_backlog_operations', "已过期但未能完全处理、等待下次重试的操作数")
+FILE_IO = Histogram('bot_file_io_seconds', "data 目录下文件的读写耗时", ['file', 'op'])
+GATEWAY_EVENTS = Counter('bot_gateway_events_total', "收到的网关事件数", ['event'])
+PROCESS_RSS = Gauge('bot_process_resident_memory_bytes', "机器人进程的常驻内存 (RSS)")
+PROCESS_CPU = Gauge('bot_process_cpu_percent', "机器人进程在上一个采样间隔内的 CPU 占用")
+EVENT_LOOP_LAG = Gauge('bot_event_loop_lag_seconds', "上一个采样间隔内观测到的最大事件循环延迟")
+ASYNCIO_TASKS = Gauge('bot_asyncio_tasks', "当前的 asyncio 任务数")
+
+
+def timed_file_io(file: str, op: str):
+    """装饰同步的加载/保存函数，记录其耗时到 bot_file_io_seconds"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with FILE_IO.time(file, op):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
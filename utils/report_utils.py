@@ -0,0 +1,19 @@
+import io
+from typing import Iterable
+import discord
+
+# Discord 普通消息的字符上限
+MESSAGE_LIMIT = 2000
+
+
+def text_attachment(filename: str, lines: Iterable[str]) -> discord.File:
+    """把多行文本直接在内存中打包为附件，不写入临时文件"""
+    data = "\n".join(lines).encode('utf-8')
+    return discord.File(io.BytesIO(data), filename=filename)
+
+
+def truncate(text: str, limit: int = MESSAGE_LIMIT, suffix: str = "\n... (完整内容见附件)") -> str:
+    """超过长度上限时截断文本并附加提示"""
+    if len(text) <= limit:
+        return text
+    return text[:limit - len(suffix)] + suffix
@@ -0,0 +1,104 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+import discord
+import config
+
+logger = logging.getLogger('discord_bot.utils.user_resolver')
+
+# 同时进行的 fetch_user 请求上限
+RESOLVE_CONCURRENCY = config.USER_RESOLVE_CONCURRENCY
+# LRU 缓存容量与有效期 (秒)
+CACHE_SIZE = 5000
+CACHE_TTL_SECONDS = 60 * 60
+
+UNKNOWN_USER_NAME = "未知用户"
+
+
+class UserNameResolver:
+    """
+    把用户ID解析为用户名，用于生成操作报告
+
+    依次尝试服务器成员缓存、客户端用户缓存和本地 LRU 缓存，
+    仍未命中的ID并发通过 fetch_user 获取 (并发数受 RESOLVE_CONCURRENCY 限制)
+    """
+
+    def __init__(self, concurrency: int = RESOLVE_CONCURRENCY, cache_size: int = CACHE_SIZE, ttl: float = CACHE_TTL_SECONDS):
+        self.concurrency = concurrency
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._cache: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+
+    def _cache_get(self, user_id: int) -> Optional[str]:
+        item = self._cache.get(user_id)
+        if item is None:
+            return None
+        name, expires_at = item
+        if expires_at < time.monotonic():
+            del self._cache[user_id]
+            return None
+        self._cache.move_to_end(user_id)
+        return name
+
+    def _cache_put(self, user_id: int, name: str):
+        self._cache[user_id] = (name, time.monotonic() + self.ttl)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _lookup_cached(self, client: discord.Client, user_id: int, guild: Optional[discord.Guild]) -> Optional[str]:
+        if guild is not None:
+            member = guild.get_member(user_id)
+            if member is not None:
+                return member.name
+        user = client.get_user(user_id)
+        if user is not None:
+            return user.name
+        return self._cache_get(user_id)
+
+    async def resolve(self, client: discord.Client, user_ids: Iterable[int], guild: Optional[discord.Guild] = None) -> Dict[int, str]:
+        """返回 {用户ID: 用户名}，无法解析的用户名为 UNKNOWN_USER_NAME"""
+        names: Dict[int, str] = {}
+        misses = []
+        for user_id in dict.fromkeys(int(uid) for uid in user_ids):
+            name = self._lookup_cached(client, user_id, guild)
+            if name is None:
+                misses.append(user_id)
+            else:
+                names[user_id] = name
+
+        if misses:
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def fetch(user_id: int):
+                async with semaphore:
+                    try:
+                        user = await client.fetch_user(user_id)
+                    except discord.NotFound:
+                        return user_id, UNKNOWN_USER_NAME
+                    except discord.HTTPException as e:
+                        logger.debug(f"获取用户 {user_id} 失败: {e}")
+                        return user_id, None
+                    return user_id, user.name
+
+            for user_id, name in await asyncio.gather(*(fetch(user_id) for user_id in misses)):
+                if name is None:
+                    names[user_id] = UNKNOWN_USER_NAME
+                else:
+                    # 不存在的用户同样缓存，避免重复请求
+                    self._cache_put(user_id, name)
+                    names[user_id] = name
+            logger.debug(f"解析 {len(names)} 个用户名，其中 {len(misses)} 个通过 API 获取")
+        return names
+
+    async def describe(self, client: discord.Client, user_ids: Iterable[int], guild: Optional[discord.Guild] = None) -> List[str]:
+        """返回 "用户名 (ID)" 格式的列表，顺序与输入一致"""
+        user_ids = [int(uid) for uid in user_ids]
+        names = await self.resolve(client, user_ids, guild)
+        return [f"{names[user_id]} ({user_id})" for user_id in user_ids]
+
+
+# 全局共享的解析器实例
+user_resolver = UserNameResolver()